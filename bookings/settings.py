@@ -26,6 +26,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework_simplejwt',
     'rest_framework_simplejwt.token_blacklist',
@@ -66,6 +67,11 @@ CORS_ALLOW_HEADERS = [
     'x-requested-with',
 ]
 
+CORS_EXPOSE_HEADERS = [
+    'x-data-freshness',
+    'x-data-last-refreshed',
+]
+
 CORS_ALLOW_METHODS = [
     'DELETE',
     'GET',
@@ -166,3 +172,26 @@ EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD')
 PAYSTACK_SECRET_KEY = config('PAYSTACK_SECRET_KEY')
 PAYSTACK_PUBLIC_KEY = config('PAYSTACK_PUBLIC_KEY')
 FRONTEND_URL = config('FRONTEND_URL')
+
+# Run the background place refresh worker inside web processes. Turn this off
+# when a dedicated `manage.py refresh_places --loop` process is used instead.
+PLACES_REFRESH_WORKER = config('PLACES_REFRESH_WORKER', default=True, cast=bool)
+
+# Geocoder used by `manage.py geocode_places` for places created without
+# coordinates; places.geocoding.StubGeocoder works offline.
+PLACES_GEOCODER = config('PLACES_GEOCODER', default='places.geocoding.NominatimGeocoder')
+
+# Disk budget for resized place image thumbnails under MEDIA_ROOT/thumbnails;
+# the least recently served ones are removed beyond it.
+PLACES_THUMBNAIL_CACHE_MB = config('PLACES_THUMBNAIL_CACHE_MB', default=512, cast=int)
+
+# Place listings and facets are cached with a generation counter that place
+# writes bump. The default cache is per process, so a bump only reaches the
+# process that made it; point CACHE_BACKEND/CACHE_LOCATION at a shared cache
+# (e.g. django.core.cache.backends.redis.RedisCache) when running several workers.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default=''),
+    }
+}
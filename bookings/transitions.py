@@ -0,0 +1,106 @@
+"""
+Status changes under optimistic concurrency.
+
+Bookings and payments change status from several places at once: admins,
+users, payment webhooks. Reading a row, setting its status and saving the
+whole row lets the last writer silently undo the others. Instead, each of
+these models mixes in VersionedStatus and carries a `version` column and a
+STATUS_TRANSITIONS map of the moves its state machine allows. change_status
+saves only the changed fields, and VersionedStatus makes that save's UPDATE
+conditional on the version that was read:
+
+    UPDATE ... SET status = ?, <changed fields>, version = ?
+    WHERE id = ? AND version = ?
+
+If another writer got there first the UPDATE matches no row and the caller
+gets a StatusConflict carrying the row's current state, to report (HTTP
+409) or retry after re-reading. No row locks are held, and since this is
+an ordinary save(update_fields=...), pre_save and post_save receivers see
+every status change.
+
+This lives in the project package rather than an app so flights, payments
+and paystack can share it without depending on each other.
+"""
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+
+
+class InvalidTransition(Exception):
+    pass
+
+
+class StatusConflict(Exception):
+    """The row changed since it was read.
+
+    `current` is its status and version now, or None if it was deleted.
+    """
+
+    def __init__(self, current):
+        super().__init__("The record was changed by someone else, reload it and try again")
+        self.current = current
+
+
+class VersionedStatus:
+    """Model mixin: a save made by change_status only applies to the version it read."""
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        expected = getattr(self, '_expected_version', None)
+        if expected is None:
+            return super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
+        if not super()._do_update(base_qs.filter(version=expected), using, pk_val, values, update_fields, forced_update):
+            raise StatusConflict(None)
+        return True
+
+
+def change_status(instance, status, expected_version=None, **fields):
+    """Move `instance` to `status`, also setting `fields`, in one conditional UPDATE.
+
+    Only the status, the given fields that actually change, auto_now columns
+    and the version are written. `expected_version` is the version the
+    client last saw, when it sent one. Returns False, without writing, if
+    nothing would change.
+
+    Raises InvalidTransition if the state machine forbids the move and
+    StatusConflict if the row no longer has the version it was read at.
+    """
+    model = type(instance)
+    version = instance.version
+    if expected_version is not None and expected_version != version:
+        raise StatusConflict({'status': instance.status, 'version': version})
+    previous = instance.status
+    changes = {name: value for name, value in fields.items() if getattr(instance, name) != value}
+    if status == previous and not changes:
+        return False
+    if status != previous and status not in model.STATUS_TRANSITIONS.get(previous, ()):
+        raise InvalidTransition(f"Can't change status from '{previous}' to '{status}'")
+
+    changes.update(status=status, version=version + 1)
+    originals = {name: getattr(instance, name) for name in changes}
+    update_fields = [*changes, *(
+        field.name for field in model._meta.concrete_fields if getattr(field, 'auto_now', False)
+    )]
+    for name, value in changes.items():
+        setattr(instance, name, value)
+    instance._expected_version = version
+    try:
+        # A savepoint, so a conflict leaves the caller's transaction usable
+        with transaction.atomic():
+            instance.save(update_fields=update_fields)
+    except StatusConflict:
+        for name, value in originals.items():
+            setattr(instance, name, value)
+        raise StatusConflict(model._base_manager.filter(pk=instance.pk).values('status', 'version').first())
+    finally:
+        del instance._expected_version
+    return True
+
+
+def requested_version(data):
+    """The `version` a client sent with a status change, if any."""
+    version = data.get('version')
+    if version in (None, ''):
+        return None
+    try:
+        return int(version)
+    except (TypeError, ValueError):
+        raise ValidationError({"version": "A valid integer is required."})
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 07:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flights', '0002_flight_updated_at_flight_flight_updated_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flightbooking',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2 on 2026-10-19 07:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flights', '0003_flightbooking_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flightbooking',
+            name='airline',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='flightbooking',
+            name='arrival_time',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='flightbooking',
+            name='currency',
+            field=models.CharField(default='KES', max_length=3),
+        ),
+        migrations.AddField(
+            model_name='flightbooking',
+            name='departure_time',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='flightbooking',
+            name='destination',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='flightbooking',
+            name='origin',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='flightbooking',
+            name='price',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+    ]
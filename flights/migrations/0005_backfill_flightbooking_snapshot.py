@@ -0,0 +1,41 @@
+# Generated by Django 5.2 on 2026-10-19 07:50
+
+from django.db import migrations
+
+BATCH_SIZE = 1000
+SNAPSHOT_FIELDS = ['airline', 'origin', 'destination', 'departure_time', 'arrival_time', 'price']
+
+
+def backfill_snapshots(apps, schema_editor):
+    """Copy each existing booking's flight details onto it, BATCH_SIZE bookings per write.
+
+    The fare a booking was actually made at isn't recorded anywhere, so
+    existing bookings take their flight's current price.
+    """
+    FlightBooking = apps.get_model('flights', 'FlightBooking')
+    last_pk = None
+    while True:
+        batch = FlightBooking.objects.order_by('pk').select_related('flight')
+        if last_pk is not None:
+            batch = batch.filter(pk__gt=last_pk)
+        batch = list(batch[:BATCH_SIZE])
+        if not batch:
+            break
+        for booking in batch:
+            for field in SNAPSHOT_FIELDS:
+                setattr(booking, field, getattr(booking.flight, field))
+        FlightBooking.objects.bulk_update(batch, SNAPSHOT_FIELDS)
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+    # Each batch commits on its own, so a large table isn't rewritten in one transaction
+    atomic = False
+
+    dependencies = [
+        ('flights', '0004_flightbooking_flight_snapshot'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_snapshots, migrations.RunPython.noop),
+    ]
@@ -3,9 +3,12 @@ from django.contrib.auth import get_user_model
 import uuid
 from django.utils import timezone
 from django.conf import settings
+from bookings.transitions import VersionedStatus
 
 User = get_user_model()
 
+DEFAULT_CURRENCY = 'KES'
+
 class Flight(models.Model):
     flight_number = models.CharField(primary_key=True, max_length=10, unique=True)
     airline = models.CharField(max_length=100)
@@ -15,11 +18,17 @@ class Flight(models.Model):
     arrival_time = models.DateTimeField(default=timezone.now)
     available_seats = models.IntegerField(default=100)  
     price = models.DecimalField(max_digits=10, decimal_places=2, default=200.00)  
+    updated_at = models.DateTimeField(auto_now=True)  # Drives the sync feed
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at', 'flight_number'], name='flight_updated_idx'),
+        ]
 
     def __str__(self):
         return f"{self.flight_number} - {self.airline}"
 
-class FlightBooking(models.Model):
+class FlightBooking(VersionedStatus, models.Model):
     STATUS_CHOICES = [
         ('confirmed', 'Confirmed'),
         ('pending', 'Pending'),
@@ -27,6 +36,12 @@ class FlightBooking(models.Model):
         ('cancelled', 'Cancelled'),
     ]
 
+    # Status moves allowed by bookings.transitions.change_status
+    STATUS_TRANSITIONS = {
+        'pending': {'confirmed', 'checked_in', 'cancelled'},
+        'confirmed': {'checked_in', 'cancelled'},
+    }
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     flight = models.ForeignKey(Flight, on_delete=models.CASCADE)
@@ -34,6 +49,24 @@ class FlightBooking(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     qr_code = models.ImageField(upload_to='qrcodes/', blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)  # ✅ Remove default=timezone.now
+    version = models.PositiveIntegerField(default=0)  # Bumped by every status change
+
+    # The flight as booked; later repricing or rescheduling doesn't change the booking
+    airline = models.CharField(max_length=100, blank=True)
+    origin = models.CharField(max_length=100, blank=True)
+    destination = models.CharField(max_length=100, blank=True)
+    departure_time = models.DateTimeField(blank=True, null=True)
+    arrival_time = models.DateTimeField(blank=True, null=True)
+    price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    currency = models.CharField(max_length=3, default=DEFAULT_CURRENCY)
+
+    SNAPSHOT_FIELDS = ['airline', 'origin', 'destination', 'departure_time', 'arrival_time', 'price']
+
+    def capture_flight(self, flight):
+        """Copy the fare and schedule from the flight being booked."""
+        for field in self.SNAPSHOT_FIELDS:
+            setattr(self, field, getattr(flight, field))
+        self.currency = DEFAULT_CURRENCY
 
     def __str__(self):
         return f"Booking {self.id} - {self.user.username} ({self.status})"
\ No newline at end of file
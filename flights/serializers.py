@@ -31,6 +31,16 @@ class FlightSerializer(serializers.ModelSerializer):
         
         return reservations
 
+class FlightSyncSerializer(serializers.ModelSerializer):
+    """Flights as sent by the sync feed; seat reservations are left to the seat map endpoint."""
+
+    class Meta:
+        model = Flight
+        fields = [
+            'flight_number', 'airline', 'origin', 'destination',
+            'departure_time', 'arrival_time', 'available_seats', 'price', 'updated_at',
+        ]
+
 class FlightBookingSerializer(serializers.ModelSerializer):
     # Add these fields to the serializer but also include price directly
     flight_number = serializers.SerializerMethodField()
@@ -45,32 +55,35 @@ class FlightBookingSerializer(serializers.ModelSerializer):
     class Meta:
         model = FlightBooking
         fields = [
-            'id', 'user', 'flight', 'seat_number', 'status', 'qr_code', 'created_at',
+            'id', 'user', 'flight', 'seat_number', 'status', 'version', 'qr_code', 'created_at',
             'flight_number', 'airline', 'origin', 'destination',
-            'departure_time', 'arrival_time', 'price', 'user_name'
+            'departure_time', 'arrival_time', 'price', 'currency', 'user_name'
         ]
+
+    # Flight details come from the booking's snapshot of the flight as booked,
+    # so listing bookings doesn't load flights
     
     def get_flight_number(self, obj):
-        return obj.flight.flight_number if obj.flight else None
+        return obj.flight_id
     
     def get_airline(self, obj):  # Renamed from get_flight_airline
-        return obj.flight.airline if obj.flight else None
+        return obj.airline or None
     
     def get_origin(self, obj):  # Renamed from get_flight_origin
-        return obj.flight.origin if obj.flight else None
+        return obj.origin or None
     
     def get_destination(self, obj):  # Renamed from get_flight_destination
-        return obj.flight.destination if obj.flight else None
+        return obj.destination or None
     
     def get_departure_time(self, obj):
-        return obj.flight.departure_time if obj.flight and obj.flight.departure_time else None
+        return obj.departure_time
     
     def get_arrival_time(self, obj):
-        return obj.flight.arrival_time if obj.flight and obj.flight.arrival_time else None
+        return obj.arrival_time
     
     def get_price(self, obj):  # Renamed from get_flight_price
         # Convert Decimal to float to ensure proper JSON serialization
-        return str(obj.flight.price) if obj.flight and obj.flight.price else '0.00'
+        return str(obj.price) if obj.price else '0.00'
     
     def get_user_name(self, obj):
         if not obj.user:
@@ -1,3 +1,71 @@
-from django.test import TestCase
+import tempfile
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from bookings.transitions import change_status
+
+from .models import Flight, FlightBooking
+
+
+class FareSnapshotTests(TestCase):
+    """A booking keeps the fare and schedule of the flight as it was booked."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.user = User.objects.create_user(username='traveller', email='traveller@example.com', password='x')
+        cls.admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='x')
+        cls.departure = datetime(2030, 6, 1, 8, 0, tzinfo=timezone.utc)
+        cls.flight = Flight.objects.create(
+            flight_number='KQ100', airline='Kenya Airways', origin='NBO', destination='MBA',
+            departure_time=cls.departure, arrival_time=cls.departure + timedelta(hours=1), price=Decimal('8500.00'),
+        )
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        # Booking writes a QR code image
+        media_root = override_settings(MEDIA_ROOT=media.name)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_repricing_leaves_booked_fares(self):
+        response = self.client.post('/api/flights/book-flight/', {'flight_number': 'KQ100', 'seat_number': '12'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['price'], '8500.00')
+
+        self.flight.price = Decimal('12000.00')
+        self.flight.departure_time = self.departure + timedelta(hours=3)
+        self.flight.save()
+
+        booking = FlightBooking.objects.get()
+        self.assertEqual((booking.price, booking.departure_time), (Decimal('8500.00'), self.departure))
+        listed = self.client.get('/api/flights/my-flight-bookings/').data['results']
+        self.assertEqual([(b['price'], b['currency'], b['departure_time']) for b in listed], [
+            ('8500.00', 'KES', self.departure),
+        ])
+
+        # Status changes write only the status, never the snapshot
+        change_status(booking, 'confirmed')
+        booking.refresh_from_db()
+        self.assertEqual((booking.status, booking.price), ('confirmed', Decimal('8500.00')))
+
+        self.client.force_authenticate(self.admin)
+        stats = self.client.get('/api/flights/admin/booking-stats/').data
+        self.assertEqual(stats['total_revenue'], Decimal('8500.00'))
+
+    def test_later_bookings_pay_the_new_fare(self):
+        self.client.post('/api/flights/book-flight/', {'flight_number': 'KQ100', 'seat_number': '1'})
+        self.flight.price = Decimal('9900.00')
+        self.flight.save()
+        self.client.post('/api/flights/book-flight/', {'flight_number': 'KQ100', 'seat_number': '2'})
+        self.assertEqual(
+            list(FlightBooking.objects.order_by('seat_number').values_list('seat_number', 'price')),
+            [('1', Decimal('8500.00')), ('2', Decimal('9900.00'))],
+        )
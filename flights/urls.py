@@ -1,6 +1,7 @@
 from django.urls import path
 from .views import (
     FlightListView,
+    FlightSyncView,
     book_flight,
     verify_qr_code,
     check_in_flight,
@@ -29,6 +30,7 @@ urlpatterns = [
 
     # === Public flight user routes ===
     path('flights/', FlightListView.as_view(), name='flight-list'),
+    path('flights/sync/', FlightSyncView.as_view(), name='flight-sync'),
     path('book-flight/', book_flight, name='book-flight'),
     path('verify-qr-code/<uuid:booking_id>/', verify_qr_code, name='verify-qr-code'),
     path('check-in-flight/<uuid:booking_id>/', check_in_flight, name='check-in-flight'),
@@ -11,7 +11,9 @@ from rest_framework.decorators import api_view, permission_classes, renderer_cla
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from .models import Flight, FlightBooking
-from .serializers import FlightSerializer, FlightBookingSerializer
+from .serializers import FlightSerializer, FlightBookingSerializer, FlightSyncSerializer
+from places.sync import sync_response
+from bookings.transitions import InvalidTransition, StatusConflict, change_status, requested_version
 from django.contrib.auth.models import AnonymousUser
 from rest_framework.exceptions import AuthenticationFailed
 import random 
@@ -34,6 +36,11 @@ class FlightListView(generics.ListAPIView):
     queryset = Flight.objects.all()
     serializer_class = FlightSerializer
 
+# 🔄 Flights changed or deleted since a sync cursor
+class FlightSyncView(generics.GenericAPIView):
+    def get(self, request, *args, **kwargs):
+        return sync_response(request, Flight.objects.all(), 'flight', FlightSyncSerializer)
+
 # ✈️ Fetch Flights from Aviationstack API and Save to Database
 @api_view(['GET'])
 def fetch_flights(request):
@@ -116,12 +123,14 @@ def book_flight(request):
         return Response({"error": "Seat already booked"}, status=status.HTTP_400_BAD_REQUEST)
 
     # Create booking
-    booking = FlightBooking.objects.create(
+    booking = FlightBooking(
         user=request.user,  # Now we are sure request.user is authenticated
         flight=flight,
         seat_number=seat_number,
         status="pending"
     )
+    booking.capture_flight(flight)
+    booking.save()
 
     # Reduce available seats
     flight.available_seats -= 1
@@ -159,7 +168,7 @@ def verify_qr_code(request, booking_id):
     return Response({
         "message": "Valid QR Code",
         "booking_id": booking.id,
-        "flight_number": booking.flight.flight_number,
+        "flight_number": booking.flight_id,
         "passenger": booking.user.username,
         "seat": booking.seat_number,
         "status": booking.status
@@ -173,8 +182,12 @@ def check_in_flight(request, booking_id):
     if booking.status == 'checked_in':
         return Response({"message": "Passenger already checked in."}, status=status.HTTP_400_BAD_REQUEST)
 
-    booking.status = 'checked_in'
-    booking.save()
+    try:
+        change_status(booking, 'checked_in')
+    except InvalidTransition as e:
+        return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except StatusConflict as e:
+        return Response({"message": str(e), "current": e.current}, status=status.HTTP_409_CONFLICT)
 
     return Response({
         "message": "Check-in successful!",
@@ -201,7 +214,7 @@ def get_booking_details(request, booking_id):
     booking = get_object_or_404(FlightBooking, id=booking_id)
     return Response({
         "id": booking.id,
-        "flight": booking.flight.flight_number,
+        "flight": booking.flight_id,
         "seat": booking.seat_number,
         "status": booking.status,
         "qr_code_url": booking.qr_code.url if booking.qr_code else None
@@ -210,7 +223,7 @@ def get_booking_details(request, booking_id):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def my_flight_bookings(request):
-    bookings = FlightBooking.objects.filter(user=request.user)
+    bookings = FlightBooking.objects.filter(user=request.user).select_related('user')
     serializer = FlightBookingSerializer(bookings, many=True)
     return Response({'results': serializer.data})
 
@@ -294,7 +307,7 @@ def get_flight_details(request, flight_number):
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from django.utils import timezone
-from django.db.models import Count
+from django.db.models import Count, Q, Sum
 from .models import Flight
 from .serializers import FlightSerializer
 
@@ -393,7 +406,7 @@ class AdminFlightBookingListView(generics.ListAPIView):
         """
         Optionally filter flight bookings by query parameters
         """
-        queryset = FlightBooking.objects.all().order_by('-created_at')
+        queryset = FlightBooking.objects.select_related('user').order_by('-created_at')
         status = self.request.query_params.get('status')
         flight_number = self.request.query_params.get('flight_number')
         user_id = self.request.query_params.get('user_id')
@@ -401,7 +414,7 @@ class AdminFlightBookingListView(generics.ListAPIView):
         if status:
             queryset = queryset.filter(status=status)
         if flight_number:
-            queryset = queryset.filter(flight__flight_number=flight_number)
+            queryset = queryset.filter(flight_id=flight_number)
         if user_id:
             queryset = queryset.filter(user__id=user_id)
             
@@ -425,8 +438,12 @@ def admin_update_flight_booking(request, booking_id):
     
     # Only update specific fields
     if 'status' in request.data:
-        booking.status = request.data['status']
-        booking.save()
+        try:
+            change_status(booking, request.data['status'], requested_version(request.data))
+        except InvalidTransition as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except StatusConflict as e:
+            return Response({"error": str(e), "current": e.current}, status=status.HTTP_409_CONFLICT)
     
     serializer = FlightBookingSerializer(booking)
     return Response(serializer.data)
@@ -435,13 +452,13 @@ def admin_update_flight_booking(request, booking_id):
 @permission_classes([IsAuthenticated])
 def cancel_flight_booking(request, booking_id):
     print(f"DEBUG: Reached cancel view for {booking_id}, user: {request.user}")
+    version = requested_version(request.data)
     try:
         # Get the booking object
         booking = FlightBooking.objects.get(id=booking_id, user=request.user)
 
-        # Update the booking status to 'canceled'
-        booking.status = 'canceled'
-        booking.save()
+        # Update the booking status to 'cancelled'
+        change_status(booking, 'cancelled', version)
 
         # Serialize the booking data to return in the response
         serializer = FlightBookingSerializer(booking)
@@ -452,6 +469,12 @@ def cancel_flight_booking(request, booking_id):
         return Response({"error": "Booking not found or you don't have permission to cancel this booking."},
                         status=status.HTTP_404_NOT_FOUND)
 
+    except InvalidTransition as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    except StatusConflict as e:
+        return Response({"error": str(e), "current": e.current}, status=status.HTTP_409_CONFLICT)
+
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -463,25 +486,19 @@ class AdminFlightBookingStatsView(generics.GenericAPIView):
     permission_classes = [permissions.IsAdminUser]
     
     def get(self, request, *args, **kwargs):
-        total_bookings = FlightBooking.objects.count()
-        confirmed_bookings = FlightBooking.objects.filter(status='confirmed').count()
-        pending_bookings = FlightBooking.objects.filter(status='pending').count()
-        checked_in_bookings = FlightBooking.objects.filter(status='checked_in').count()
-        cancelled_bookings = FlightBooking.objects.filter(status='cancelled').count()
+        # One pass over the bookings; revenue sums the fares as booked,
+        # so repricing a flight doesn't rewrite it
+        stats = FlightBooking.objects.aggregate(
+            total_bookings=Count('id'),
+            confirmed_bookings=Count('id', filter=Q(status='confirmed')),
+            pending_bookings=Count('id', filter=Q(status='pending')),
+            checked_in_bookings=Count('id', filter=Q(status='checked_in')),
+            cancelled_bookings=Count('id', filter=Q(status='cancelled')),
+            total_revenue=Sum('price', filter=Q(status__in=['confirmed', 'checked_in'])),
+        )
+        stats['total_revenue'] = stats['total_revenue'] or 0
         
-        # Calculate total revenue from confirmed bookings
-        total_revenue = 0
-        for booking in FlightBooking.objects.filter(status__in=['confirmed', 'checked_in']):
-            total_revenue += booking.flight.price
-        
-        return Response({
-            'total_bookings': total_bookings,
-            'confirmed_bookings': confirmed_bookings,
-            'pending_bookings': pending_bookings,
-            'checked_in_bookings': checked_in_bookings,
-            'cancelled_bookings': cancelled_bookings,
-            'total_revenue': total_revenue
-        })    
+        return Response(stats)    
     
 from rest_framework.renderers import BaseRenderer
 from rest_framework.decorators import api_view, permission_classes, renderer_classes
@@ -526,14 +543,14 @@ def download_booking_pdf(request, booking_id):
     # Add content to PDF
     p.drawString(100, 800, f"Flight Booking Confirmation")
     p.drawString(100, 770, f"Booking ID: {booking.id}")
-    p.drawString(100, 750, f"Flight Number: {booking.flight.flight_number}")
+    p.drawString(100, 750, f"Flight Number: {booking.flight_id}")
     p.drawString(100, 730, f"Passenger: {booking.user.get_full_name() or booking.user.username}")
     p.drawString(100, 710, f"Seat Number: {booking.seat_number}")
     p.drawString(100, 690, f"Status: {booking.status}")
-    p.drawString(100, 670, f"Departure: {booking.flight.origin}")
-    p.drawString(100, 650, f"Arrival: {booking.flight.destination}")
-    p.drawString(100, 630, f"Departure Time: {booking.flight.departure_time}")
-    p.drawString(100, 610, f"Arrival Time: {booking.flight.arrival_time}")
+    p.drawString(100, 670, f"Departure: {booking.origin}")
+    p.drawString(100, 650, f"Arrival: {booking.destination}")
+    p.drawString(100, 630, f"Departure Time: {booking.departure_time}")
+    p.drawString(100, 610, f"Arrival Time: {booking.arrival_time}")
     
     # Add QR code if available
     if booking.qr_code:
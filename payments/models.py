@@ -1,10 +1,11 @@
 from django.db import models
 from places.models import Place, Booking  # Import Booking from places app
 from django.contrib.auth import get_user_model
+from bookings.transitions import VersionedStatus
 
 User = get_user_model()
 
-class Payment(models.Model):
+class Payment(VersionedStatus, models.Model):
     PAYMENT_METHODS = [
         ('mpesa', 'M-Pesa'),
         ('card', 'Card'),
@@ -17,6 +18,12 @@ class Payment(models.Model):
         ('success', 'Success'),
         ('failed', 'Failed'),
     ]
+
+    # Status moves allowed by bookings.transitions.change_status
+    STATUS_TRANSITIONS = {
+        'pending': {'success', 'failed'},
+        'failed': {'success'},  # a late confirmation; success is final
+    }
     
     # Fields that match the serializer and frontend
     reference = models.CharField(max_length=100, unique=True)
@@ -25,6 +32,7 @@ class Payment(models.Model):
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHODS)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     timestamp = models.DateTimeField(auto_now_add=True)
+    version = models.PositiveIntegerField(default=0)  # Bumped by every status change
     
     # Foreign keys
     place = models.ForeignKey(Place, on_delete=models.SET_NULL, null=True, blank=True)
@@ -8,9 +8,9 @@ class PaymentSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Payment
-        fields = ['id', 'reference', 'email', 'amount', 'payment_method', 'status', 
+        fields = ['id', 'reference', 'email', 'amount', 'payment_method', 'status', 'version',
                   'timestamp', 'place', 'place_name', 'user', 'user_email', 'booking', 'booking_id']
-        read_only_fields = ['id', 'timestamp']
+        read_only_fields = ['id', 'timestamp', 'version']
     
     def get_place_name(self, obj):
         return obj.place.name if obj.place else None
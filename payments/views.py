@@ -9,6 +9,7 @@ from django.core.mail import send_mail
 from django.conf import settings
 import uuid
 from places.models import Place, Booking
+from bookings.transitions import InvalidTransition, StatusConflict, change_status, requested_version
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -150,6 +151,7 @@ class PaymentStatusUpdateView(APIView):
     permission_classes = [IsAdminUser]
     
     def patch(self, request, payment_id):
+        version = requested_version(request.data)
         try:
             payment = Payment.objects.get(id=payment_id)
             new_status = request.data.get('status')
@@ -157,11 +159,10 @@ class PaymentStatusUpdateView(APIView):
             if new_status not in ['pending', 'success', 'failed']:
                 return Response({"error": "Invalid status value"}, status=status.HTTP_400_BAD_REQUEST)
                 
-            payment.status = new_status
-            payment.save()
+            changed = change_status(payment, new_status, version)
             
             # If payment is marked as successful, send confirmation email
-            if new_status == 'success':
+            if changed and new_status == 'success':
                 booking_info = {
                     'id': payment.id,
                     'place_name': payment.place.name if payment.place else 'N/A',
@@ -175,6 +176,10 @@ class PaymentStatusUpdateView(APIView):
             
         except Payment.DoesNotExist:
             return Response({"error": "Payment not found"}, status=status.HTTP_404_NOT_FOUND)
+        except InvalidTransition as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except StatusConflict as e:
+            return Response({"error": str(e), "current": e.current}, status=status.HTTP_409_CONFLICT)
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
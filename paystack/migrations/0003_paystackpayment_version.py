@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 07:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paystack', '0002_paystackpayment_email_paystackpayment_place_id_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paystackpayment',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
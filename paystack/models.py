@@ -1,10 +1,17 @@
 # models.py
 from django.db import models
 from django.contrib.auth import get_user_model
+from bookings.transitions import VersionedStatus
 
 User = get_user_model()
 
-class PaystackPayment(models.Model):
+class PaystackPayment(VersionedStatus, models.Model):
+    # Status moves allowed by bookings.transitions.change_status
+    STATUS_TRANSITIONS = {
+        'pending': {'success', 'failed'},
+        'failed': {'success'},  # a late confirmation; success is final
+    }
+
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='paystack_payments')
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     reference = models.CharField(max_length=100, unique=True)
@@ -15,6 +22,7 @@ class PaystackPayment(models.Model):
     place_id = models.CharField(max_length=100, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    version = models.PositiveIntegerField(default=0)  # Bumped by every status change
 
     def __str__(self):
         return f"{self.user.username} - {self.amount} - {self.status}"
\ No newline at end of file
@@ -8,11 +8,15 @@ from django.conf import settings
 from rest_framework import generics
 from .models import PaystackPayment
 from .serializers import PaystackPaymentSerializer
+from bookings.transitions import InvalidTransition, StatusConflict, change_status
 from django.views.decorators.csrf import csrf_exempt
 from django.http import JsonResponse
 import json
+import logging
 import uuid
 
+logger = logging.getLogger(__name__)
+
 class PaystackInitializeView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
@@ -162,9 +166,17 @@ class PaymentStatusView(APIView):
                 # Update existing or create new payment record
                 try:
                     payment = PaystackPayment.objects.get(reference=reference)
-                    for key, value in payment_data.items():
-                        setattr(payment, key, value)
-                    payment.save()
+                    new_status = payment_data.pop("status")
+                    try:
+                        change_status(payment, new_status, **payment_data)
+                    except InvalidTransition:
+                        # A final status isn't undone by a later "still processing" answer
+                        pass
+                    except StatusConflict as e:
+                        return Response({
+                            "status": "error",
+                            "message": str(e)
+                        }, status=409)
                 except PaystackPayment.DoesNotExist:
                     # Get user from metadata if possible
                     user_id = metadata.get("user_id") or request.user.id
@@ -236,9 +248,20 @@ def paystack_webhook(request):
             
             try:
                 payment = PaystackPayment.objects.get(reference=reference)
-                payment.status = status
-                payment.verified = True
-                payment.save()
+                # Paystack is the authority on the charge, so a write that
+                # raced this one is re-read and overridden once
+                for attempt in range(2):
+                    try:
+                        change_status(payment, status, verified=True)
+                        break
+                    except StatusConflict:
+                        if attempt:
+                            # Paystack retries webhooks that don't get a 200
+                            return JsonResponse({"status": "error", "message": "Conflicting update"}, status=409)
+                        payment.refresh_from_db()
+                    except InvalidTransition as e:
+                        logger.warning("Ignoring Paystack webhook for %s: %s", reference, e)
+                        break
                 
                 # Here you could create a ticket or process other business logic
                 
@@ -1,6 +1,11 @@
 from django.contrib import admin
-from .models import Place,Booking
+from .models import Place, Booking, CityBundle, GeocodeResult, PlaceSegment, Review, RoomInventory
 
 # Register your models here.
 admin.site.register(Booking)
 admin.site.register(Place)
+admin.site.register(PlaceSegment)
+admin.site.register(RoomInventory)
+admin.site.register(Review)
+admin.site.register(CityBundle)
+admin.site.register(GeocodeResult)
@@ -1,6 +1,48 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_save
 
 
 class PlacesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'places'
+
+    def ready(self):
+        from .search import install_sqlite_search
+        from .baskets import confirm_basket
+        from .cache import invalidate_places
+        from .clusters import remember_grid_position, update_grid_on_delete, update_grid_on_save
+        from .popularity import booking_created, payment_saved, place_deleted, remember_payment_status
+        from .reviews import remember_review, review_deleted, review_saved
+        from .sync import clear_tombstone, record_tombstone
+        post_migrate.connect(install_sqlite_search, sender=self)
+
+        # Any place write makes cached listings and facets stale
+        Place = self.get_model('Place')
+        post_save.connect(invalidate_places, sender=Place, dispatch_uid='places_invalidate_save')
+        post_delete.connect(invalidate_places, sender=Place, dispatch_uid='places_invalidate_delete')
+
+        # Keep the map clustering grid in step with single-place writes
+        pre_save.connect(remember_grid_position, sender=Place, dispatch_uid='places_grid_pre_save')
+        post_save.connect(update_grid_on_save, sender=Place, dispatch_uid='places_grid_save')
+        post_delete.connect(update_grid_on_delete, sender=Place, dispatch_uid='places_grid_delete')
+
+        # Bookings and successful payments feed place popularity
+        post_save.connect(booking_created, sender=self.get_model('Booking'), dispatch_uid='places_popularity_booking')
+        post_delete.connect(place_deleted, sender=Place, dispatch_uid='places_popularity_delete')
+        for payment_model in ('payments.Payment', 'paystack.PaystackPayment'):
+            pre_save.connect(remember_payment_status, sender=payment_model, dispatch_uid=f'{payment_model}_popularity_pre')
+            post_save.connect(payment_saved, sender=payment_model, dispatch_uid=f'{payment_model}_popularity')
+
+        # A paid basket payment confirms the bookings it covers
+        post_save.connect(confirm_basket, sender='payments.Payment', dispatch_uid='places_basket_payment')
+
+        # Reviews keep their place's rating totals current
+        Review = self.get_model('Review')
+        pre_save.connect(remember_review, sender=Review, dispatch_uid='places_review_pre_save')
+        post_save.connect(review_saved, sender=Review, dispatch_uid='places_review_save')
+        post_delete.connect(review_deleted, sender=Review, dispatch_uid='places_review_delete')
+
+        # Deletions are kept as tombstones for the sync feeds
+        post_delete.connect(record_tombstone('place'), sender=Place, weak=False, dispatch_uid='places_sync_delete')
+        post_delete.connect(record_tombstone('flight'), sender='flights.Flight', weak=False, dispatch_uid='flights_sync_delete')
+        post_save.connect(clear_tombstone('flight'), sender='flights.Flight', weak=False, dispatch_uid='flights_sync_save')
@@ -0,0 +1,84 @@
+"""
+Booking baskets: several bookings, e.g. a group trip's hotel, restaurants
+and attractions, created in one request.
+
+The view loads every place the basket references with one query and
+validates all items against those rows. create_basket then takes hotel
+rooms and inserts the bookings with a single bulk_create in one
+transaction, so either the whole basket is booked or none of it is.
+
+A basket can also start one combined payment: a pending Payment for the
+summed price whose reference is stored on each booking. When that payment
+succeeds, every booking in the basket is marked paid.
+"""
+import uuid
+
+from django.db import transaction
+
+from payments.models import Payment
+
+from .inventory import RoomsUnavailable, reserve_rooms
+from .models import Booking
+from .popularity import BOOKING_WEIGHT, boost_on_commit
+
+MAX_BASKET_SIZE = 20
+
+# Booking payment methods as recorded on payments
+PAYMENT_METHODS = {'mpesa': 'mpesa', 'visa': 'card'}
+
+
+class BasketUnavailable(Exception):
+    """Some hotel items had no free rooms; `errors` holds one dict per item."""
+
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def create_basket(user, items, payment_method=None):
+    """Book every validated item for `user`; returns (bookings, payment or None).
+
+    Raises BasketUnavailable, with nothing booked, if any hotel item can't
+    get its rooms.
+    """
+    reference = f"basket-{uuid.uuid4().hex[:16]}" if payment_method else None
+    with transaction.atomic():
+        bookings, errors = [], []
+        for item in items:
+            place = item['place']
+            held = False
+            error = {}
+            if place.place_type == 'hotel':
+                try:
+                    held = reserve_rooms(place, item.get('room_type'), item['check_in'], item['check_out'])
+                except RoomsUnavailable:
+                    error = {"room_type": ["No rooms of this type are free for the selected dates."]}
+            errors.append(error)
+            bookings.append(Booking(user=user, inventory_held=held, payment_reference=reference, **item))
+        if any(errors):
+            # Raising inside the transaction gives back the rooms taken for the other items
+            raise BasketUnavailable(errors)
+
+        bookings = Booking.objects.bulk_create(bookings)
+        # bulk_create sends no post_save, so count the bookings here
+        for booking in bookings:
+            boost_on_commit(booking.place_id, BOOKING_WEIGHT)
+
+        payment = None
+        if payment_method:
+            payment = Payment.objects.create(
+                user=user,
+                email=user.email,
+                amount=sum(booking.total_price for booking in bookings),
+                payment_method=PAYMENT_METHODS[payment_method],
+                reference=reference,
+                status='pending',
+            )
+    return bookings, payment
+
+
+def confirm_basket(sender, instance, raw=False, **kwargs):
+    """post_save: a successful basket payment confirms all of its bookings."""
+    if raw or instance.status != 'success' or not instance.reference.startswith('basket-'):
+        return
+    Booking.objects.filter(payment_reference=instance.reference, payment_confirmed=False).update(payment_confirmed=True)
@@ -0,0 +1,174 @@
+"""
+Offline city bundles.
+
+A bundle is one gzip-compressed JSON snapshot of every place in a city,
+plus the distinct images they use so an app can prefetch them, written to
+MEDIA_ROOT/bundles/<city>/. Each build that changes the content gets a new
+version and file name; a small pointer file names the current version and its ETag
+(the SHA-256 of the compressed bytes). Serving a bundle reads the pointer
+and streams the file, without touching the database.
+
+Bundles are rebuilt per city: refreshing a city rebuilds its bundle, and
+build_stale_bundles compares each city's place count and newest updated_at
+with the bundle's to find the cities whose places changed since. Builds
+are deterministic, so a rebuild with unchanged content keeps its version.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Max
+from django.db.models.functions import Lower
+from django.utils.text import slugify
+
+from .models import CityBundle, Place
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_DIR = 'bundles'
+BUNDLE_FORMAT = 1
+
+BUNDLE_FIELDS = [
+    'id', 'name', 'description', 'location', 'address', 'city', 'place_type', 'cuisine',
+    'rating', 'review_count', 'price', 'latitude', 'longitude', 'image_url', 'updated_at',
+]
+
+
+def bundle_root():
+    return Path(settings.MEDIA_ROOT) / BUNDLE_DIR
+
+
+def city_slug(city):
+    return slugify(city.strip(), allow_unicode=True)
+
+
+def city_dir(slug):
+    return bundle_root() / slug
+
+
+def pointer_path(slug):
+    return city_dir(slug) / 'current.json'
+
+
+def read_pointer(city):
+    """The current bundle of a city as {'version', 'etag', 'file', ...}, or None."""
+    slug = city_slug(city)
+    if not slug:
+        return None
+    try:
+        with open(pointer_path(slug)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_atomic(path, data):
+    # A temp file of its own per write, so concurrent rebuilds of a city can't
+    # write into each other's file before it is renamed into place
+    f = tempfile.NamedTemporaryFile(dir=path.parent, prefix=f'.{path.name}.', suffix='.tmp', delete=False)
+    try:
+        with f:
+            f.write(data)
+        # mkstemp files are private to the owner; bundles are served from MEDIA_ROOT
+        os.chmod(f.name, 0o644)
+        os.replace(f.name, path)
+    except BaseException:
+        Path(f.name).unlink(missing_ok=True)
+        raise
+
+
+def render_bundle(city_key):
+    """The compressed bundle body for a city and the stats recorded with it."""
+    rows = list(
+        Place.objects.annotate(city_key=Lower('city')).filter(city_key=city_key)
+        .order_by('id').values(*BUNDLE_FIELDS)
+    )
+    images = {}
+    for row in rows:
+        if row['image_url']:
+            images.setdefault(row['image_url'], []).append(row['id'])
+    payload = {
+        'format': BUNDLE_FORMAT,
+        'city': rows[0]['city'] if rows else city_key,
+        'places': rows,
+        'images': [{'url': url, 'places': ids} for url, ids in images.items()],
+    }
+    body = json.dumps(payload, cls=DjangoJSONEncoder, separators=(',', ':'), sort_keys=True).encode()
+    # A fixed mtime keeps the output byte-identical for identical content
+    compressed = gzip.compress(body, compresslevel=9, mtime=0)
+    latest = max((row['updated_at'] for row in rows), default=None)
+    return compressed, len(rows), latest
+
+
+def build_city_bundle(city):
+    """Rebuild one city's bundle; returns its CityBundle row, or None if the city has no places."""
+    city_key = city.strip().lower()
+    slug = city_slug(city_key)
+    if not slug:
+        return None
+    compressed, count, latest = render_bundle(city_key)
+    bundle = CityBundle.objects.filter(city=city_key).first()
+    if not count:
+        if bundle:
+            remove_bundle(bundle)
+        return None
+
+    etag = hashlib.sha256(compressed).hexdigest()
+    if bundle is None:
+        bundle = CityBundle(city=city_key)
+    root = city_dir(slug)
+    root.mkdir(parents=True, exist_ok=True)
+    if etag != bundle.etag or not pointer_path(slug).exists():
+        previous = bundle.version
+        bundle.version += 1
+        name = f'v{bundle.version}.json.gz'
+        _write_atomic(root / name, compressed)
+        pointer = {'city': city_key, 'version': bundle.version, 'etag': etag, 'file': name, 'size': len(compressed)}
+        _write_atomic(pointer_path(slug), json.dumps(pointer).encode())
+        # Keep the previous version for downloads that read the old pointer
+        for old in root.glob('v*.json.gz'):
+            if old.name not in (name, f'v{previous}.json.gz'):
+                old.unlink(missing_ok=True)
+        logger.info("Built %s bundle v%d: %d places, %d bytes", city_key, bundle.version, count, len(compressed))
+
+    bundle.etag, bundle.size, bundle.place_count, bundle.latest_change = etag, len(compressed), count, latest
+    bundle.save()
+    return bundle
+
+
+def remove_bundle(bundle):
+    root = city_dir(city_slug(bundle.city))
+    for old in root.glob('*.json*'):
+        old.unlink(missing_ok=True)
+    if root.exists():
+        root.rmdir()
+    bundle.delete()
+
+
+def stale_bundle_cities():
+    """City keys whose places changed since their bundle was built, or that have none yet."""
+    current = {
+        row['city_key']: (row['count'], row['latest'])
+        for row in Place.objects.annotate(city_key=Lower('city'))
+        .values('city_key').annotate(count=Count('id'), latest=Max('updated_at')).order_by()
+    }
+    built = {
+        bundle.city: (bundle.place_count, bundle.latest_change)
+        for bundle in CityBundle.objects.all()
+    }
+    # Cities left without places are included so their bundles get removed
+    return sorted(city for city in current.keys() | built.keys() if current.get(city) != built.get(city))
+
+
+def build_stale_bundles():
+    """Rebuild every stale city bundle; returns the number rebuilt."""
+    cities = stale_bundle_cities()
+    for city in cities:
+        build_city_bundle(city)
+    return len(cities)
@@ -0,0 +1,67 @@
+"""
+Caching helpers for place read endpoints.
+
+Responses are cached under a signature of the query parameters that affect
+them, so equivalent requests (same filters in any order) share an entry.
+Every key also embeds the places generation, a counter bumped whenever
+place data changes; bumping it orphans all cached responses at once, and
+the stale entries simply expire.
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.db import transaction
+
+GENERATION_KEY = 'places:generation'
+
+# Safety net for caches that don't see every bump (e.g. per-process LocMemCache)
+LISTING_CACHE_SECONDS = 600
+
+# Parameters that never change what a read endpoint returns
+IGNORED_PARAMS = {'refresh'}
+
+
+def query_signature(params, ignore=()):
+    """Stable hash of a QueryDict, independent of parameter order."""
+    items = sorted(
+        (key, value)
+        for key in params
+        if key not in IGNORED_PARAMS and key not in ignore
+        for value in params.getlist(key)
+    )
+    return hashlib.sha1(repr(items).encode()).hexdigest()
+
+
+def places_generation():
+    """Current places generation, starting at 1."""
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, 1, timeout=None)
+        generation = cache.get(GENERATION_KEY, 1)
+    return generation
+
+
+def bump_places_generation():
+    """Invalidate every cached place response once the current transaction commits.
+
+    Bumping after commit keeps a concurrent request from caching pre-commit
+    rows under the new generation.
+    """
+    transaction.on_commit(_bump)
+
+
+def _bump():
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        # Key missing or evicted; any fresh value differs from cached keys'
+        cache.set(GENERATION_KEY, places_generation() + 1, timeout=None)
+
+
+def cache_key(prefix, params, ignore=()):
+    return f"places:{prefix}:{places_generation()}:{query_signature(params, ignore)}"
+
+
+def invalidate_places(sender, **kwargs):
+    """post_save/post_delete receiver for Place."""
+    bump_places_generation()
@@ -0,0 +1,211 @@
+"""
+Server-side map clustering.
+
+Places are counted into a fixed multi-resolution grid (PlaceGridCell): level L
+splits the world into square cells of 360 / 2**L degrees, with one row per
+cell and place type. A cluster request reads the cells of a single level
+inside the viewport, so its cost and response size are bounded by the number
+of screen cells, not the number of places.
+
+The grid is maintained incrementally: bulk ingestion (upsert_places) calls
+add_to_grid for the places it creates, and single saves and deletes are
+picked up by the signal receivers below. rebuild_grid recomputes it from
+scratch (see the rebuild_place_grid command).
+"""
+import math
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Floor, Least
+
+from .models import Place, PlaceGridCell
+from .osm import chunked
+
+MAX_LEVEL = 16  # ~600m cells at the equator
+
+# A zoom-z web map tile is 256px wide; 2**2 cells per tile gives ~64px clusters
+ZOOM_LEVEL_OFFSET = 2
+
+# Coarsen the level until the viewport fits in this many cells
+MAX_CLUSTER_CELLS = 2048
+
+GRID_WRITE_BATCH = 500
+
+
+def cell_size(level):
+    return 360.0 / (1 << level)
+
+
+def cell_of(latitude, longitude, level):
+    """Grid coordinates of the cell containing a point at `level`."""
+    size = cell_size(level)
+    last = (1 << level) - 1
+    x = min(math.floor((longitude + 180.0) / size), last)
+    y = min(math.floor((latitude + 90.0) / size), last)
+    return x, y
+
+
+def has_position(latitude, longitude):
+    # Places created without coordinates sit at the (0, 0) default
+    return not (latitude == 0 and longitude == 0)
+
+
+def collect_deltas(positions, sign, deltas=None):
+    """Accumulate per-cell changes for (latitude, longitude, place_type) tuples.
+
+    `sign` is 1 for places added to the grid and -1 for places removed.
+    """
+    if deltas is None:
+        deltas = defaultdict(lambda: [0, 0.0, 0.0])
+    for latitude, longitude, place_type in positions:
+        latitude, longitude = float(latitude), float(longitude)
+        if not has_position(latitude, longitude):
+            continue
+        for level in range(MAX_LEVEL + 1):
+            x, y = cell_of(latitude, longitude, level)
+            delta = deltas[(level, x, y, place_type)]
+            delta[0] += sign
+            delta[1] += sign * latitude
+            delta[2] += sign * longitude
+    return deltas
+
+
+def apply_deltas(deltas):
+    """Add per-cell changes to the grid with upserts that increment in place.
+
+    ON CONFLICT ... DO UPDATE is atomic per row on PostgreSQL and SQLite, so
+    concurrent writers never lose each other's counts. Rows are written in
+    key order to keep lock acquisition consistent between writers. Cells
+    that drop to zero are left in place and skipped when reading.
+    """
+    rows = [(*key, *delta) for key, delta in sorted(deltas.items()) if any(delta)]
+    if not rows:
+        return
+    table = connection.ops.quote_name(PlaceGridCell._meta.db_table)
+    with transaction.atomic(), connection.cursor() as cursor:
+        for batch in chunked(rows, GRID_WRITE_BATCH):
+            placeholders = ", ".join(["(%s, %s, %s, %s, %s, %s, %s)"] * len(batch))
+            cursor.execute(
+                f"INSERT INTO {table} (level, x, y, place_type, count, lat_sum, lon_sum) "
+                f"VALUES {placeholders} "
+                f"ON CONFLICT (level, x, y, place_type) DO UPDATE SET "
+                f"count = {table}.count + excluded.count, "
+                f"lat_sum = {table}.lat_sum + excluded.lat_sum, "
+                f"lon_sum = {table}.lon_sum + excluded.lon_sum",
+                [value for row in batch for value in row],
+            )
+
+
+def add_to_grid(places):
+    apply_deltas(collect_deltas(((p.latitude, p.longitude, p.place_type) for p in places), 1))
+
+
+def remove_from_grid(places):
+    apply_deltas(collect_deltas(((p.latitude, p.longitude, p.place_type) for p in places), -1))
+
+
+def rebuild_grid():
+    """Recompute every grid level from the places table, one grouped query per level."""
+    placed = Place.objects.exclude(latitude=0, longitude=0)
+    with transaction.atomic():
+        PlaceGridCell.objects.all().delete()
+        for level in range(MAX_LEVEL + 1):
+            size, last = cell_size(level), (1 << level) - 1
+            cells = (
+                placed.annotate(
+                    cell_x=Least(Floor((F('longitude') + 180.0) / size), Value(float(last))),
+                    cell_y=Least(Floor((F('latitude') + 90.0) / size), Value(float(last))),
+                )
+                .values('cell_x', 'cell_y', 'place_type')
+                .annotate(n=Count('id'), lats=Sum('latitude'), lons=Sum('longitude'))
+                .order_by()
+            )
+            for batch in chunked(cells.iterator(chunk_size=2000), 2000):
+                PlaceGridCell.objects.bulk_create([
+                    PlaceGridCell(
+                        level=level, x=int(cell['cell_x']), y=int(cell['cell_y']),
+                        place_type=cell['place_type'], count=cell['n'],
+                        lat_sum=cell['lats'], lon_sum=cell['lons'],
+                    )
+                    for cell in batch
+                ])
+
+
+def cluster_level(zoom, south, west, north, east):
+    """Grid level for a map zoom, coarsened until the viewport fits MAX_CLUSTER_CELLS."""
+    level = max(0, min(zoom + ZOOM_LEVEL_OFFSET, MAX_LEVEL))
+    width = east - west if east >= west else east + 360.0 - west
+    while level > 0:
+        size = cell_size(level)
+        if (width / size + 1) * ((north - south) / size + 1) <= MAX_CLUSTER_CELLS:
+            break
+        level -= 1
+    return level
+
+
+def clusters_in_bbox(south, west, north, east, zoom, place_types=None):
+    """Clusters for a viewport: one per non-empty grid cell, with its place
+    count, centroid, per-type breakdown and cell bounds.
+    A west edge greater than the east edge crosses the antimeridian.
+    """
+    level = cluster_level(zoom, south, west, north, east)
+    x0, y0 = cell_of(south, west, level)
+    x1, y1 = cell_of(north, east, level)
+
+    cells = PlaceGridCell.objects.filter(level=level, y__range=(y0, y1), count__gt=0)
+    if x0 <= x1:
+        cells = cells.filter(x__range=(x0, x1))
+    else:
+        cells = cells.filter(x__gte=x0) | cells.filter(x__lte=x1)
+    if place_types:
+        cells = cells.filter(place_type__in=place_types)
+
+    merged = {}
+    for x, y, place_type, count, lat_sum, lon_sum in cells.values_list(
+        'x', 'y', 'place_type', 'count', 'lat_sum', 'lon_sum'
+    ):
+        cluster = merged.setdefault((x, y), {'count': 0, 'lat_sum': 0.0, 'lon_sum': 0.0, 'types': {}})
+        cluster['count'] += count
+        cluster['lat_sum'] += lat_sum
+        cluster['lon_sum'] += lon_sum
+        cluster['types'][place_type] = count
+
+    size = cell_size(level)
+    clusters = []
+    for (x, y), cluster in sorted(merged.items()):
+        south_edge, west_edge = y * size - 90.0, x * size - 180.0
+        clusters.append({
+            'latitude': round(cluster['lat_sum'] / cluster['count'], 6),
+            'longitude': round(cluster['lon_sum'] / cluster['count'], 6),
+            'count': cluster['count'],
+            'types': cluster['types'],
+            'bounds': [south_edge, west_edge, south_edge + size, west_edge + size],
+        })
+    return {'level': level, 'cell_size': size, 'clusters': clusters}
+
+
+# Signal receivers for single-place writes; bulk writes call add_to_grid directly
+
+def remember_grid_position(sender, instance, raw=False, **kwargs):
+    """pre_save: note where an existing place was counted before it changes."""
+    if instance.pk and not raw:
+        instance._grid_position = (
+            sender.objects.filter(pk=instance.pk).values_list('latitude', 'longitude', 'place_type').first()
+        )
+
+
+def update_grid_on_save(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_grid_position', None)
+    current = (instance.latitude, instance.longitude, instance.place_type)
+    if previous == current:
+        return
+    deltas = collect_deltas([previous], -1) if previous else None
+    apply_deltas(collect_deltas([current], 1, deltas))
+    instance._grid_position = current
+
+
+def update_grid_on_delete(sender, instance, **kwargs):
+    remove_from_grid([instance])
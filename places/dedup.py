@@ -0,0 +1,221 @@
+"""
+Duplicate place detection and merging.
+
+Refreshes only match places within MATCH_TOLERANCE of each other, and admin
+and bulk-imported places aren't matched at all, so the same POI can end up
+stored several times with slightly different positions or names.
+
+find_duplicates scans the whole table once. Positions are projected to
+metres and hashed into cells DEDUP_RADIUS_METERS wide, so every place
+within the radius of another lies in its cell or one of the eight
+neighbours; only those pairs, of the same type, have their names compared,
+by the Jaccard similarity of their character trigrams. Runtime grows with
+the number of places times the local density, not with the square of the
+table. Duplicates are grouped with union-find. Two places are never merged
+when both carry different OSM ids or external keys, since a later refresh
+or import would recreate the one merged away.
+
+merge_duplicates keeps the oldest place of each group and folds the others
+into it: bookings, payments, reviews and room inventory are repointed in
+bulk, review totals and popularity are added up, missing details and
+identifiers are copied over, and the duplicates are deleted (which records
+their sync tombstones and takes them off the map grid).
+"""
+import math
+import re
+import unicodedata
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, CharField, IntegerField, Value, When
+from django.utils import timezone
+
+from payments.models import Payment
+from paystack.models import PaystackPayment
+
+from .cache import bump_places_generation
+from .models import Booking, Place, Review, RoomInventory
+from .osm import chunked
+from .popularity import rebuild_leaderboard
+from .sync import stamp_on_commit
+
+DEDUP_RADIUS_METERS = 50
+NAME_SIMILARITY = 0.6  # Trigram Jaccard similarity for names to count as the same
+MERGE_BATCH_SIZE = 200  # Duplicate groups merged per transaction
+
+METERS_PER_DEGREE = 111320
+
+# Copied from a duplicate when the kept place has none
+FILLABLE_FIELDS = ['description', 'location', 'address', 'image_url', 'cuisine', 'osm_id', 'external_key']
+
+
+def normalize_name(name):
+    """Lower-case a name and strip accents and punctuation."""
+    decomposed = unicodedata.normalize('NFKD', name or '')
+    stripped = ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+    return ' '.join(re.sub(r'[\W_]+', ' ', stripped).split())
+
+
+def trigrams(name):
+    padded = f'  {name} '
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def name_similarity(a, b):
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+class _Groups:
+    """Union-find over place ids that refuses to join conflicting identifiers."""
+
+    def __init__(self):
+        self.parent = {}
+        self.keys = {}  # root -> (osm_id, external_key)
+
+    def add(self, place_id, osm_id, external_key):
+        self.parent[place_id] = place_id
+        self.keys[place_id] = (osm_id, external_key)
+
+    def find(self, place_id):
+        root = place_id
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[place_id] != root:
+            self.parent[place_id], place_id = root, self.parent[place_id]
+        return root
+
+    def union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return
+        merged = []
+        for mine, theirs in zip(self.keys[a], self.keys[b]):
+            if mine and theirs and mine != theirs:
+                return
+            merged.append(mine or theirs)
+        # The lower id stays the root, so it's the place that is kept
+        a, b = min(a, b), max(a, b)
+        self.parent[b] = a
+        self.keys[a] = tuple(merged)
+        del self.keys[b]
+
+    def groups(self):
+        members = defaultdict(list)
+        for place_id in self.parent:
+            members[self.find(place_id)].append(place_id)
+        return sorted(sorted(ids) for ids in members.values() if len(ids) > 1)
+
+
+def find_duplicates(radius=DEDUP_RADIUS_METERS, threshold=NAME_SIMILARITY, queryset=None):
+    """Groups of ids of places that look like the same POI, lowest (kept) id first."""
+    queryset = Place.objects.all() if queryset is None else queryset
+    rows = (
+        queryset.exclude(latitude=0, longitude=0)
+        .order_by('id')
+        .values_list('id', 'place_type', 'latitude', 'longitude', 'name', 'osm_id', 'external_key')
+    )
+    cells = defaultdict(list)
+    groups = _Groups()
+    for place_id, place_type, latitude, longitude, name, osm_id, external_key in rows.iterator(chunk_size=5000):
+        name = normalize_name(name)
+        if not name or name == 'unnamed':
+            continue
+        # Equirectangular projection; exact enough over a few cells
+        x = longitude * METERS_PER_DEGREE * math.cos(math.radians(latitude))
+        y = latitude * METERS_PER_DEGREE
+        cell_x, cell_y = math.floor(x / radius), math.floor(y / radius)
+        grams = trigrams(name)
+        groups.add(place_id, osm_id, external_key)
+        # Rows arrive in id order, so each pair is compared once, against the earlier place
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for other_id, other_x, other_y, other_grams in cells.get((place_type, cell_x + dx, cell_y + dy), ()):
+                    if (x - other_x) ** 2 + (y - other_y) ** 2 > radius ** 2:
+                        continue
+                    if name_similarity(grams, other_grams) >= threshold:
+                        groups.union(other_id, place_id)
+        cells[(place_type, cell_x, cell_y)].append((place_id, x, y, grams))
+    return groups.groups()
+
+
+def _repoint(queryset, field, mapping, cast=int):
+    """Point `field` of every row at a duplicate to the place it's merged into, in one UPDATE."""
+    output = IntegerField() if cast is int else CharField()
+    return queryset.filter(**{f'{field}__in': [cast(old) for old in mapping]}).update(**{field: Case(
+        *[When(**{field: cast(old)}, then=Value(cast(new))) for old, new in mapping.items()],
+        output_field=output,
+    )})
+
+
+def _merge_inventory(mapping):
+    """Move duplicates' room inventory to the kept hotel.
+
+    Where both have a row for the same night, the kept row also carries the
+    rooms booked on the duplicate's, since those bookings now point at it.
+    """
+    kept = defaultdict(dict)
+    for row in RoomInventory.objects.filter(place_id__in=set(mapping.values())):
+        kept[row.place_id][(row.room_type, row.night)] = row
+    moved, merged = {}, {}
+    for row in RoomInventory.objects.filter(place_id__in=list(mapping)).order_by('id'):
+        target = kept[mapping[row.place_id]].get((row.room_type, row.night))
+        if target is None:
+            row.place_id = mapping[row.place_id]
+            kept[row.place_id][(row.room_type, row.night)] = row
+            moved[row.pk] = row
+        else:
+            target.available = max(target.available - (row.total - row.available), 0)
+            merged[target.pk] = target
+    RoomInventory.objects.bulk_update(moved.values(), ['place', 'available'])
+    RoomInventory.objects.bulk_update(merged.values(), ['available'])
+
+
+def merge_group(survivor, duplicates):
+    """Fold `duplicates` into `survivor` in memory; returns the fields that changed."""
+    for duplicate in duplicates:
+        survivor.rating_sum += duplicate.rating_sum
+        survivor.review_count += duplicate.review_count
+        survivor.popularity += duplicate.popularity  # Stored scores share one scale
+        for field in FILLABLE_FIELDS:
+            if not getattr(survivor, field) and getattr(duplicate, field):
+                setattr(survivor, field, getattr(duplicate, field))
+    if survivor.review_count:
+        survivor.rating = survivor.rating_sum / survivor.review_count
+    survivor.updated_at = timezone.now()
+    return ['rating_sum', 'review_count', 'rating', 'popularity', 'updated_at', *FILLABLE_FIELDS]
+
+
+def merge_duplicates(groups):
+    """Merge each group of place ids into its first id; returns the number of places removed."""
+    removed = 0
+    boards = set()
+    for batch in chunked(groups, MERGE_BATCH_SIZE):
+        with transaction.atomic():
+            places = Place.objects.select_for_update().in_bulk([place_id for group in batch for place_id in group])
+            # A group whose kept place was deleted meanwhile has nothing to merge into
+            batch = [group for group in batch if group[0] in places]
+            mapping = {duplicate: group[0] for group in batch for duplicate in group[1:]}
+            _repoint(Booking.objects.all(), 'place_id', mapping)
+            _repoint(Review.objects.all(), 'place_id', mapping)
+            _repoint(Payment.objects.all(), 'place_id', mapping)
+            _repoint(PaystackPayment.objects.all(), 'place_id', mapping, cast=str)
+            _merge_inventory(mapping)
+
+            survivors, fields = [], []
+            for group in batch:
+                survivor = places[group[0]]
+                fields = merge_group(survivor, [places[place_id] for place_id in group[1:] if place_id in places])
+                survivors.append(survivor)
+                boards.add((survivor.city.lower(), survivor.place_type))
+
+            # Delete first so identifiers copied from the duplicates stay unique;
+            # the delete signals record tombstones and update the map grid
+            removed += Place.objects.filter(pk__in=list(mapping)).delete()[1].get(Place._meta.label, 0)
+            if survivors:
+                Place.objects.bulk_update(survivors, fields)
+                stamp_on_commit(Place, [survivor.pk for survivor in survivors])
+        bump_places_generation()
+
+    for city, place_type in sorted(boards):
+        rebuild_leaderboard(city, place_type)
+    return removed
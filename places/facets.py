@@ -0,0 +1,57 @@
+"""
+Facet counts for place browsing.
+
+All facets come from a single GROUP BY over (place_type, city, price bucket,
+rating bucket); the per-facet totals are folded together in Python.
+"""
+from collections import Counter
+
+from django.db.models import Count, F, IntegerField
+from django.db.models.functions import Cast, Floor
+
+DEFAULT_PRICE_BUCKET = 500  # KES
+MIN_PRICE_BUCKET = 50       # Keeps the histogram to a sensible number of bars
+
+
+def compute_facets(queryset, price_bucket=DEFAULT_PRICE_BUCKET):
+    """Return type and city counts, a price histogram and rating buckets."""
+    rows = (
+        queryset.order_by()
+        .annotate(
+            price_bucket=Cast(Floor(F('price') / price_bucket), IntegerField()),
+            rating_bucket=Cast(Floor('rating'), IntegerField()),
+        )
+        .values('place_type', 'city', 'price_bucket', 'rating_bucket')
+        .annotate(count=Count('id'))
+    )
+
+    total = 0
+    place_types, cities, prices, ratings = Counter(), Counter(), Counter(), Counter()
+    for row in rows:
+        count = row['count']
+        total += count
+        place_types[row['place_type']] += count
+        cities[row['city']] += count
+        prices[row['price_bucket']] += count
+        ratings[min(row['rating_bucket'], 4)] += count  # 5.0 belongs to the 4-5 bucket
+
+    return {
+        'total': total,
+        'place_types': [{'value': value, 'count': count} for value, count in place_types.most_common()],
+        'cities': [{'value': value, 'count': count} for value, count in cities.most_common()],
+        'price_histogram': {
+            'bucket_size': price_bucket,
+            'buckets': [
+                {
+                    'min': bucket * price_bucket,
+                    'max': (bucket + 1) * price_bucket,
+                    'count': prices[bucket],
+                }
+                for bucket in sorted(prices)
+            ],
+        },
+        'ratings': [
+            {'min': bucket, 'max': bucket + 1, 'count': ratings[bucket]}
+            for bucket in sorted(ratings)
+        ],
+    }
@@ -0,0 +1,202 @@
+"""
+Batch geocoding for places without coordinates.
+
+Places created without a position sit at the (0, 0) default. The geocoding
+job collects them, builds one lookup query per place from its address (or
+location, or name) and city, and resolves each distinct query once: first
+from GeocodeResult, a persistent cache that also remembers failed lookups,
+then through the configured geocoder under its rate limit. Coordinates are
+written back with bulk_update and the places are added to the map grid.
+
+The geocoder is a class named by the PLACES_GEOCODER setting. Nominatim's
+public service allows one request per second; StubGeocoder answers
+instantly with made-up coordinates for development and tests.
+"""
+import abc
+import hashlib
+import logging
+import threading
+import time
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .cache import bump_places_generation
+from .clusters import add_to_grid
+from .models import GeocodeResult, Place
+from .osm import chunked
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GEOCODER = 'places.geocoding.NominatimGeocoder'
+MISS_RETRY_DAYS = 30  # Failed lookups are cached this long before being tried again
+GEOCODE_WRITE_BATCH = 500
+CACHE_WRITE_BATCH = 100
+
+
+class RateLimiter:
+    """Spaces calls at least 1 / per_second seconds apart, across threads."""
+
+    def __init__(self, per_second):
+        self.interval = 1.0 / per_second if per_second else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._next > now:
+                time.sleep(self._next - now)
+                now = self._next
+            self._next = now + self.interval
+
+
+class Geocoder(abc.ABC):
+    """Resolves a free-text address to (latitude, longitude), or None if unknown."""
+    name = 'base'
+    requests_per_second = None  # No limit
+
+    def __init__(self):
+        self.limiter = RateLimiter(self.requests_per_second)
+
+    def lookup(self, query):
+        self.limiter.wait()
+        return self.geocode(query)
+
+    @abc.abstractmethod
+    def geocode(self, query):
+        """Look one query up with the provider; raise on provider errors."""
+
+
+class NominatimGeocoder(Geocoder):
+    name = 'nominatim'
+    requests_per_second = 1  # Nominatim usage policy
+
+    def geocode(self, query):
+        res = requests.get("https://nominatim.openstreetmap.org/search", params={
+            "q": query,
+            "format": "json",
+            "limit": 1
+        }, headers={"User-Agent": "TravelCompanionApp/1.0"}, timeout=10)
+        res.raise_for_status()
+        data = res.json()
+        if not data:
+            return None
+        return float(data[0]["lat"]), float(data[0]["lon"])
+
+
+class StubGeocoder(Geocoder):
+    """Offline geocoder: a stable point derived from the query's hash.
+
+    Queries containing "nowhere" resolve to nothing, to exercise misses.
+    """
+    name = 'stub'
+
+    def geocode(self, query):
+        if 'nowhere' in query:
+            return None
+        digest = hashlib.sha256(query.encode()).digest()
+        latitude = int.from_bytes(digest[:4], 'big') / 2**32 * 170 - 85
+        longitude = int.from_bytes(digest[4:8], 'big') / 2**32 * 358 - 179
+        return round(latitude, 6), round(longitude, 6)
+
+
+def get_geocoder(path=None):
+    return import_string(path or getattr(settings, 'PLACES_GEOCODER', DEFAULT_GEOCODER))()
+
+
+def geocode_query(place):
+    """The normalized lookup query for a place, or None if there's nothing to look up."""
+    street = (place.address or place.location or place.name or '').strip()
+    if not street:
+        return None
+    parts = [street, place.city.strip()] if place.city.strip() else [street]
+    return ' '.join(', '.join(parts).casefold().split())[:255]
+
+
+def resolve(queries, geocoder):
+    """Coordinates for each query, from the cache or the geocoder; None for misses.
+
+    Every lookup made is stored in the cache, misses included.
+    """
+    retry_before = timezone.now() - timedelta(days=MISS_RETRY_DAYS)
+    results = {}
+    for batch in chunked(queries, 500):
+        for query, latitude, longitude, resolved_at in GeocodeResult.objects.filter(query__in=batch).values_list(
+            'query', 'latitude', 'longitude', 'resolved_at'
+        ):
+            if latitude is not None or resolved_at >= retry_before:
+                results[query] = None if latitude is None else (latitude, longitude)
+
+    missing = [query for query in queries if query not in results]
+    if missing:
+        logger.info("Geocoding %d addresses with %s", len(missing), geocoder.name)
+    pending = []
+    for query in missing:
+        try:
+            position = geocoder.lookup(query)
+        except Exception:
+            # Leave it uncached so the next run tries again
+            logger.exception("Geocoding %r failed", query)
+            continue
+        results[query] = position
+        pending.append(GeocodeResult(
+            query=query,
+            latitude=position[0] if position else None,
+            longitude=position[1] if position else None,
+            geocoder=geocoder.name,
+            resolved_at=timezone.now(),
+        ))
+        # Save as we go so an interrupted run keeps its paid-for lookups
+        if len(pending) >= CACHE_WRITE_BATCH:
+            _save_results(pending)
+            pending = []
+    _save_results(pending)
+    return results
+
+
+def _save_results(results):
+    GeocodeResult.objects.bulk_create(
+        results, update_conflicts=True, unique_fields=['query'],
+        update_fields=['latitude', 'longitude', 'geocoder', 'resolved_at'],
+    )
+
+
+def geocode_missing_places(limit=None, geocoder=None):
+    """Give coordinates to places still at (0, 0); returns (located, unresolved) counts."""
+    geocoder = geocoder or get_geocoder()
+    places = Place.objects.filter(latitude=0, longitude=0).only(
+        'id', 'name', 'address', 'location', 'city', 'place_type', 'latitude', 'longitude',
+    ).order_by('id')
+    if limit:
+        places = places[:limit]
+
+    by_query = {}
+    for place in places:
+        query = geocode_query(place)
+        if query:
+            by_query.setdefault(query, []).append(place)
+    results = resolve(list(by_query), geocoder)
+
+    now = timezone.now()
+    located = []
+    for query, position in results.items():
+        if position is None or position == (0, 0):
+            continue
+        for place in by_query[query]:
+            place.latitude, place.longitude = position
+            place.updated_at = now
+            located.append(place)
+
+    for batch in chunked(located, GEOCODE_WRITE_BATCH):
+        with transaction.atomic():
+            Place.objects.bulk_update(batch, ['latitude', 'longitude', 'updated_at'])
+            add_to_grid(batch)
+    if located:
+        bump_places_generation()
+    unresolved = sum(len(group) for group in by_query.values()) - len(located)
+    return len(located), unresolved
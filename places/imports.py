@@ -0,0 +1,329 @@
+"""
+Bulk place imports from CSV or JSON Lines files.
+
+Rows are streamed from the file and handled IMPORT_CHUNK_SIZE at a time:
+each chunk is validated a column at a time (numeric columns are parsed and
+range-checked as NumPy arrays), rows whose external_key already exists are skipped, and the
+rest are written with one bulk_create. Problems are reported per row and
+field instead of failing the whole file.
+
+Every file is tracked by a PlaceImport keyed by its SHA-256. The row
+position is committed with each chunk, so importing the same file again
+resumes where an interrupted run stopped, and a finished file is a no-op.
+Since rows are keyed by external_key, even an edited file never creates a
+place twice, and rows another import stores first count as skipped.
+"""
+import bz2
+import codecs
+import csv
+import gzip
+import hashlib
+import json
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+import numpy as np
+from django.core.exceptions import ValidationError
+from django.core.validators import URLValidator
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .cache import bump_places_generation
+from .clusters import add_to_grid
+from .models import Place, PlaceImport
+from .osm import chunked
+from .sync import stamp_on_commit
+
+IMPORT_CHUNK_SIZE = 5000
+MAX_REPORTED_ERRORS = 1000
+
+IMPORT_FORMATS = ('csv', 'jsonl')
+REQUIRED_COLUMNS = ('external_key', 'name', 'city', 'place_type')
+COMPRESSED_SUFFIXES = ('.gz', '.bz2')
+
+
+class ImportFormatError(Exception):
+    """The file can't be read as an import at all, as opposed to individual bad rows."""
+
+
+def _strip_compression(file_name):
+    name = file_name.lower()
+    for suffix in COMPRESSED_SUFFIXES:
+        name = name.removesuffix(suffix)
+    return name
+
+
+def detect_format(file_name, fmt=None):
+    if fmt:
+        fmt = fmt.lower()
+    elif _strip_compression(file_name).endswith('.csv'):
+        fmt = 'csv'
+    elif _strip_compression(file_name).endswith(('.jsonl', '.ndjson')):
+        fmt = 'jsonl'
+    if fmt not in IMPORT_FORMATS:
+        raise ImportFormatError("Unknown import format, expected a .csv or .jsonl file")
+    return fmt
+
+
+def open_upload(upload):
+    """A binary handle on an uploaded file's contents, decompressing .gz and .bz2 uploads."""
+    name = upload.name.lower()
+    if name.endswith('.gz'):
+        return gzip.GzipFile(fileobj=upload, mode='rb')
+    if name.endswith('.bz2'):
+        return bz2.BZ2File(upload, mode='rb')
+    return upload
+
+
+def file_checksum(handle):
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: handle.read(1 << 20), b''):
+        digest.update(chunk)
+    handle.seek(0)
+    return digest.hexdigest()
+
+
+def iter_rows(handle, fmt):
+    """Yield (row dict, error) for each record of a binary file handle.
+
+    Blank JSONL lines yield (None, None) so row numbers stay line numbers.
+    """
+    lines = codecs.iterdecode(handle, 'utf-8-sig')
+    if fmt == 'csv':
+        reader = csv.DictReader(lines)
+        missing = [column for column in REQUIRED_COLUMNS if column not in (reader.fieldnames or ())]
+        if missing:
+            raise ImportFormatError(f"Missing required columns: {', '.join(missing)}")
+        return ((row, None) for row in reader)
+    return (_parse_json_line(line) for line in lines)
+
+
+def _parse_json_line(line):
+    if not line.strip():
+        return None, None
+    try:
+        row = json.loads(line)
+    except ValueError:
+        return None, "Invalid JSON"
+    if not isinstance(row, dict):
+        return None, "Expected a JSON object"
+    return row, None
+
+
+# Column checks: each takes a chunk's values for one column and returns the
+# cleaned values plus {index: error} for the rows that failed.
+
+def _as_text(value):
+    return '' if value is None else str(value).strip()
+
+
+def _text(max_length, required=False, blank_as_none=False):
+    def check(values):
+        cleaned, errors = [], {}
+        for i, value in enumerate(values):
+            value = _as_text(value)
+            if not value and required:
+                errors[i] = "This field is required"
+            elif len(value) > max_length:
+                errors[i] = f"Longer than {max_length} characters"
+            cleaned.append(value or (None if blank_as_none else ''))
+        return cleaned, errors
+    return check
+
+
+def _choice(choices):
+    def check(values):
+        cleaned = [_as_text(value).lower() for value in values]
+        errors = {i: f"Must be one of {', '.join(choices)}" for i, value in enumerate(cleaned) if value not in choices}
+        return cleaned, errors
+    return check
+
+
+def _url(values):
+    validate = URLValidator()
+    cleaned, errors = [], {}
+    for i, value in enumerate(values):
+        value = _as_text(value)
+        if value:
+            try:
+                validate(value)
+            except ValidationError:
+                errors[i] = "Not a valid URL"
+            if len(value) > 200:
+                errors[i] = "Longer than 200 characters"
+        cleaned.append(value)
+    return cleaned, errors
+
+
+def _parse_floats(values):
+    """Parse a column as floats; returns (array with NaN where unparsed, blank mask, {index: error})."""
+    empty = [value is None or value == '' for value in values]
+    try:
+        # The whole column in one conversion; only a column with a bad value
+        # falls back to finding it row by row
+        parsed = np.asarray([0.0 if blank else value for blank, value in zip(empty, values)], dtype=float)
+        return parsed, np.array(empty, dtype=bool), {}
+    except (TypeError, ValueError):
+        pass
+    blank = np.array([value is None or _as_text(value) == '' for value in values], dtype=bool)
+    parsed = np.full(len(values), np.nan)
+    errors = {}
+    for i in np.flatnonzero(~blank):
+        try:
+            parsed[i] = float(values[i])
+        except (TypeError, ValueError):
+            errors[int(i)] = "Not a number"
+    return parsed, blank, errors
+
+
+def _number(low, high, default):
+    def check(values):
+        parsed, blank, errors = _parse_floats(values)
+        parsed[blank] = default
+        # NaN fails both comparisons, so unparsed values, nan and inf all land here
+        for i in np.flatnonzero(~((parsed >= low) & (parsed <= high))):
+            errors.setdefault(int(i), f"Must be between {low} and {high}")
+        return parsed.tolist(), errors
+    return check
+
+
+def _price(values):
+    _, errors = _number(0, 999999.99, 0)(values)
+    prices = []
+    for i, value in enumerate(values):
+        price = None
+        if i not in errors:
+            # Parse the original text so prices aren't rounded through floats
+            try:
+                price = Decimal(_as_text(value) or '0').quantize(Decimal('0.01'))
+            except InvalidOperation:
+                errors[i] = "Not a number"
+        prices.append(price)
+    return prices, errors
+
+
+COLUMNS = {
+    'external_key': _text(100, required=True),
+    'name': _text(200, required=True),
+    'city': _text(100, required=True),
+    'place_type': _choice([value for value, _ in Place.PLACE_TYPES]),
+    'description': _text(10000),
+    'location': _text(255),
+    'address': _text(255),
+    'cuisine': _text(100, blank_as_none=True),
+    'image_url': _url,
+    'price': _price,
+    'rating': _number(0, 5, 4.0),
+    'latitude': _number(-90, 90, 0.0),
+    'longitude': _number(-180, 180, 0.0),
+}
+
+
+def prepare_chunk(rows, first_row, user=None):
+    """Validate a chunk of (row, error) pairs.
+
+    Returns (places to create, row errors, number of rows skipped because
+    their external_key is already stored). Row numbers count from first_row.
+    """
+    errors = []
+    records = []
+    for offset, (row, error) in enumerate(rows):
+        if error:
+            errors.append({'row': first_row + offset, 'field': None, 'error': error})
+        elif row is not None:
+            records.append((first_row + offset, row))
+    if not records:
+        return [], errors, 0
+
+    failed = {}
+    columns = {}
+    for field, check in COLUMNS.items():
+        columns[field], column_errors = check([row.get(field) for _, row in records])
+        for i, message in column_errors.items():
+            failed.setdefault(i, []).append({'row': records[i][0], 'field': field, 'error': message})
+
+    keys = columns['external_key']
+    existing = set(Place.objects.filter(external_key__in=keys).values_list('external_key', flat=True))
+    places, seen, skipped = [], set(), 0
+    for i, (number, _) in enumerate(records):
+        if i in failed:
+            errors.extend(failed[i])
+            continue
+        key = keys[i]
+        if key in existing:
+            skipped += 1
+            continue
+        if key in seen:
+            errors.append({'row': number, 'field': 'external_key', 'error': "Duplicate external_key in this file"})
+            continue
+        seen.add(key)
+        places.append(Place(created_by=user, **{field: values[i] for field, values in columns.items()}))
+    errors.sort(key=lambda error: error['row'])
+    return places, errors, skipped
+
+
+def create_places(places):
+    """bulk_create `places`, leaving out any whose external_key was stored meanwhile.
+
+    Another import of an overlapping file may commit the same keys between
+    prepare_chunk's check and this insert. Returns (created places, number
+    of places left out).
+    """
+    left_out = 0
+    while places:
+        try:
+            with transaction.atomic():
+                return Place.objects.bulk_create(places, batch_size=1000), left_out
+        except IntegrityError:
+            keys = [place.external_key for place in places]
+            taken = set(Place.objects.filter(external_key__in=keys).values_list('external_key', flat=True))
+            if not taken:
+                raise
+            remaining = [place for place in places if place.external_key not in taken]
+            left_out += len(places) - len(remaining)
+            places = remaining
+    return [], left_out
+
+
+def import_places(handle, file_name, fmt=None, user=None, chunk_size=IMPORT_CHUNK_SIZE):
+    """Import places from a binary file handle; returns the PlaceImport.
+
+    Raises ImportFormatError if the file isn't a readable CSV or JSONL
+    import. Rows committed before such an error stay imported.
+    """
+    fmt = detect_format(file_name, fmt)
+    try:
+        checksum = file_checksum(handle)
+    except (OSError, EOFError) as e:
+        raise ImportFormatError(f"Unreadable file: {e}")
+    job = PlaceImport.objects.filter(checksum=checksum).order_by('-started_at').first()
+    if job is not None and job.status == PlaceImport.DONE:
+        return job
+    position = job.rows_done if job else 0
+    try:
+        rows = iter_rows(handle, fmt)
+        if job is None:
+            job = PlaceImport.objects.create(file_name=file_name[:255], checksum=checksum, created_by=user)
+        for chunk in chunked(islice(rows, position, None), chunk_size):
+            places, errors, skipped = prepare_chunk(chunk, position + 1, user)
+            position += len(chunk)
+            with transaction.atomic():
+                created, raced = create_places(places)
+                add_to_grid(created)
+                stamp_on_commit(Place, [place.pk for place in created])
+                job.rows_done = position
+                job.created += len(created)
+                job.skipped += skipped + raced
+                job.error_count += len(errors)
+                job.errors.extend(errors[:max(MAX_REPORTED_ERRORS - len(job.errors), 0)])
+                job.save()
+                if created:
+                    bump_places_generation()
+    except (UnicodeDecodeError, csv.Error, OSError, EOFError) as e:
+        # OSError and EOFError come from corrupt or truncated compressed files
+        raise ImportFormatError(f"Unreadable file after row {position}: {e}")
+
+    job.status = PlaceImport.DONE
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'finished_at'])
+    return job
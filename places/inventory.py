@@ -0,0 +1,112 @@
+"""
+Hotel room inventory.
+
+RoomInventory holds one row per hotel, room type and night. Booking a stay
+decrements every night of the range in a single conditional UPDATE
+(available >= rooms), so concurrent bookings can't oversell: the database
+re-checks the condition on each row after waiting for competing writers,
+and a stay that can't get every night is rolled back whole.
+
+Hotels with no inventory rows at all are untracked and keep accepting
+bookings as before.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Min
+
+from .models import RoomInventory
+
+DEFAULT_ROOM_TYPE = 'standard'
+
+
+class RoomsUnavailable(Exception):
+    pass
+
+
+def normalize_room_type(room_type):
+    return (room_type or DEFAULT_ROOM_TYPE).strip().lower()
+
+
+def stay_nights(check_in, check_out):
+    return [check_in + timedelta(days=offset) for offset in range((check_out - check_in).days)]
+
+
+def set_inventory(place, room_type, rooms, start, end):
+    """Offer `rooms` rooms of a type for each night from `start` up to `end`.
+
+    Existing nights keep their bookings: availability moves by the change in
+    total. Returns the number of nights written.
+    """
+    room_type = normalize_room_type(room_type)
+    nights = stay_nights(start, end)
+    with transaction.atomic():
+        existing = RoomInventory.objects.filter(place=place, room_type=room_type, night__gte=start, night__lt=end)
+        existing.update(available=F('available') + rooms - F('total'), total=rooms)
+        RoomInventory.objects.bulk_create(
+            [RoomInventory(place=place, room_type=room_type, night=night, total=rooms, available=rooms) for night in nights],
+            ignore_conflicts=True,
+        )
+    return len(nights)
+
+
+def reserve_rooms(place, room_type, check_in, check_out, rooms=1):
+    """Take `rooms` rooms for every night of a stay.
+
+    Returns True if the rooms were taken from inventory and False if the
+    hotel is untracked. Raises RoomsUnavailable if any night is short.
+    Call inside the transaction that creates the booking.
+    """
+    nights = (check_out - check_in).days
+    taken = 0
+    try:
+        with transaction.atomic():
+            taken = RoomInventory.objects.filter(
+                place=place, room_type=normalize_room_type(room_type),
+                night__gte=check_in, night__lt=check_out, available__gte=rooms,
+            ).update(available=F('available') - rooms)
+            if taken != nights:
+                raise RoomsUnavailable
+    except RoomsUnavailable:
+        if taken == 0 and not RoomInventory.objects.filter(place=place).exists():
+            return False
+        raise
+    return True
+
+
+def release_rooms(booking, rooms=1):
+    """Return a booking's rooms to inventory, once."""
+    if not booking.inventory_held:
+        return
+    with transaction.atomic():
+        RoomInventory.objects.filter(
+            place_id=booking.place_id, room_type=normalize_room_type(booking.room_type),
+            night__gte=booking.check_in, night__lt=booking.check_out,
+        ).update(available=F('available') + rooms)
+        booking.inventory_held = False
+        type(booking).objects.filter(pk=booking.pk).update(inventory_held=False)
+
+
+def available_hotels(city, check_in, check_out, room_type=None, rooms=1):
+    """Hotels in a city with `rooms` rooms free on every night of a stay.
+
+    One grouped query: a (hotel, room type) qualifies when it has an
+    inventory row with enough rooms for each night. Each result carries the
+    fewest rooms free on any night.
+    """
+    nights = (check_out - check_in).days
+    inventory = RoomInventory.objects.filter(
+        place__city__iexact=city, place__place_type='hotel',
+        night__gte=check_in, night__lt=check_out, available__gte=rooms,
+    )
+    if room_type:
+        inventory = inventory.filter(room_type=normalize_room_type(room_type))
+    return (
+        inventory.values(
+            'place_id', 'place__name', 'place__address', 'place__image_url',
+            'place__price', 'place__rating', 'room_type',
+        )
+        .annotate(nights=Count('id'), available=Min('available'))
+        .filter(nights=nights)
+        .order_by('place__price', 'place_id', 'room_type')
+    )
@@ -0,0 +1,53 @@
+import random
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from places.itinerary import Itinerary, Stop, haversine
+
+
+class Command(BaseCommand):
+    help = "Benchmark the itinerary optimiser on random stops spread over a city."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stops', type=int, default=200)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--windows', action='store_true',
+                            help="Give half the stops random opening windows")
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        stops = []
+        for _ in range(options['stops']):
+            stop = Stop(-1.45 + rng.random() * 0.3, 36.65 + rng.random() * 0.45, duration=rng.choice([30, 45, 60]))
+            if options['windows'] and rng.random() < 0.5:
+                stop.opens = rng.choice([8, 9, 10, 12]) * 60
+                stop.closes = stop.opens + rng.choice([4, 6, 8, 10]) * 60
+            stops.append(stop)
+
+        timings = []
+        for _ in range(options['repeat']):
+            started = time.perf_counter()
+            itinerary = Itinerary(stops)
+            matrix_done = time.perf_counter()
+            greedy = itinerary.nearest_neighbour()
+            greedy_done = time.perf_counter()
+            route = itinerary.two_opt(greedy)
+            finished = time.perf_counter()
+            timings.append((matrix_done - started, greedy_done - matrix_done, finished - greedy_done, finished - started))
+
+        # Spot-check the broadcast matrix against the scalar formula
+        a, b = stops[0], stops[-1]
+        assert np.isclose(itinerary.distances[0, len(stops) - 1], haversine(a.latitude, a.longitude, b.latitude, b.longitude))
+
+        length = lambda r: sum(itinerary.distances[x, y] for x, y in zip(r[:-1], r[1:]))
+        best = min(timings, key=lambda t: t[3])
+        self.stdout.write(
+            f"{len(stops)} stops: matrix {best[0] * 1000:.1f} ms, nearest neighbour {best[1] * 1000:.1f} ms, "
+            f"2-opt {best[2] * 1000:.1f} ms, total {best[3] * 1000:.1f} ms (best of {options['repeat']})"
+        )
+        self.stdout.write(
+            f"Route length {length(greedy):.1f} km greedy -> {length(route):.1f} km after 2-opt; "
+            f"{itinerary.timeline(route)[1][-1]:.0f} late minutes"
+        )
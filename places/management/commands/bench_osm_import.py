@@ -0,0 +1,80 @@
+import os
+import random
+import tempfile
+import time
+import uuid
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from places.models import Place, PlaceSegment, Tombstone
+from places.osm import chunked
+from places.refresh import CATEGORY_TAGS, segment_key
+
+# Synthetic nodes get ids far above real OSM ones and sit in an empty
+# stretch of the South Pacific, so the import can't match real places
+NODE_ID_OFFSET = 10 ** 15
+BENCH_BOX = (-60.0, -140.0, -59.7, -139.55)
+
+
+class Command(BaseCommand):
+    help = ("Benchmark import_osm_extract on a synthetic OSM XML extract, committing per batch "
+            "as real imports do. The benchmark's places are deleted afterwards.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--nodes', type=int, default=2_000_000,
+                            help="Total nodes in the extract (about 80 bytes each)")
+        parser.add_argument('--poi-ratio', type=float, default=0.05,
+                            help="Share of nodes tagged as hotels, restaurants or attractions")
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        tags = [tag for pairs in CATEGORY_TAGS.values() for tag in pairs]
+        rng = random.Random(42)
+        city = f'Benchmark {uuid.uuid4().hex[:8]}'
+        south, west, north, east = BENCH_BOX
+        fd, path = tempfile.mkstemp(suffix='.osm')
+        try:
+            with os.fdopen(fd, 'w') as out:
+                out.write('<?xml version="1.0" encoding="UTF-8"?>\n<osm version="0.6">\n')
+                for node_id in range(NODE_ID_OFFSET + 1, NODE_ID_OFFSET + options['nodes'] + 1):
+                    lat = south + rng.random() * (north - south)
+                    lon = west + rng.random() * (east - west)
+                    if rng.random() < options['poi_ratio']:
+                        key, value = rng.choice(tags)
+                        out.write(
+                            f' <node id="{node_id}" lat="{lat:.7f}" lon="{lon:.7f}">'
+                            f'<tag k="{key}" v="{value}"/><tag k="name" v="Place {node_id}"/></node>\n'
+                        )
+                    else:
+                        out.write(f' <node id="{node_id}" lat="{lat:.7f}" lon="{lon:.7f}"/>\n')
+                out.write('</osm>\n')
+
+            size_mb = os.path.getsize(path) / 1e6
+            self.stdout.write(f"Synthetic extract: {options['nodes']:,} nodes, {size_mb:,.0f} MB")
+
+            started = time.monotonic()
+            call_command(
+                'import_osm_extract', path,
+                city=[(city, BENCH_BOX)],
+                batch_size=options['batch_size'],
+                stdout=self.stdout,
+            )
+            elapsed = time.monotonic() - started
+            self.stdout.write(self.style.SUCCESS(
+                f"Read {size_mb / elapsed:,.1f} MB/s end to end ({elapsed:.1f}s)"
+            ))
+        finally:
+            os.remove(path)
+            self.cleanup(city)
+
+    def cleanup(self, city):
+        places = Place.objects.filter(city=city)
+        with transaction.atomic():
+            ids = [str(place_id) for place_id in places.values_list('id', flat=True)]
+            places.delete()
+            # The benchmark's places were never real, so sync clients needn't hear of them
+            for batch in chunked(ids, 5000):
+                Tombstone.objects.filter(kind='place', object_id__in=batch).delete()
+            PlaceSegment.objects.filter(city=segment_key(city, '')[0]).delete()
@@ -0,0 +1,77 @@
+import csv
+import os
+import random
+import tempfile
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from places.imports import COLUMNS, IMPORT_CHUNK_SIZE, import_places, iter_rows
+from places.models import Place, PlaceImport, Tombstone
+from places.osm import chunked
+
+
+class Command(BaseCommand):
+    help = ("Benchmark import_places on a synthetic CSV file, committing per chunk as real "
+            "imports do. The benchmark's places and import record are deleted afterwards.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=200_000)
+        parser.add_argument('--error-ratio', type=float, default=0.01,
+                            help="Share of rows with an invalid rating or coordinate")
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        prefix = f'bench-{uuid.uuid4().hex[:8]}-'
+        place_types = ['hotel', 'restaurant', 'attraction']
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        try:
+            with os.fdopen(fd, 'w', newline='') as out:
+                writer = csv.writer(out)
+                writer.writerow(['external_key', 'name', 'city', 'place_type', 'price', 'rating', 'latitude', 'longitude'])
+                for n in range(options['rows']):
+                    rating = f'{rng.uniform(1, 5):.1f}'
+                    if rng.random() < options['error_ratio']:
+                        rating = rng.choice(['excellent', '9', ''])
+                    writer.writerow([
+                        f'{prefix}{n}', f'Place {n}', 'Benchmark', rng.choice(place_types),
+                        f'{rng.uniform(500, 50000):.2f}', rating,
+                        f'{-1.45 + rng.random() * 0.3:.6f}', f'{36.65 + rng.random() * 0.45:.6f}',
+                    ])
+            size_mb = os.path.getsize(path) / 1e6
+            self.stdout.write(f"Synthetic import: {options['rows']:,} rows, {size_mb:,.1f} MB")
+
+            # Column validation alone, without the database
+            with open(path, 'rb') as handle:
+                records = [row for row, _ in iter_rows(handle, 'csv')]
+            started = time.monotonic()
+            for chunk in chunked(records, options['chunk_size']):
+                for field, check in COLUMNS.items():
+                    check([row.get(field) for row in chunk])
+            validated = time.monotonic() - started
+            self.stdout.write(f"Validated {len(records) / validated:,.0f} rows/s ({validated:.2f}s)")
+
+            started = time.monotonic()
+            with open(path, 'rb') as handle:
+                job = import_places(handle, f'{prefix}.csv', chunk_size=options['chunk_size'])
+            elapsed = time.monotonic() - started
+            self.stdout.write(self.style.SUCCESS(
+                f"Imported {job.rows_done / elapsed:,.0f} rows/s end to end ({elapsed:.1f}s): "
+                f"created {job.created:,}, {job.error_count:,} errors"
+            ))
+        finally:
+            os.remove(path)
+            self.cleanup(prefix)
+
+    def cleanup(self, prefix):
+        places = Place.objects.filter(external_key__startswith=prefix)
+        with transaction.atomic():
+            ids = [str(place_id) for place_id in places.values_list('id', flat=True)]
+            places.delete()
+            # The benchmark's places were never real, so sync clients needn't hear of them
+            for batch in chunked(ids, 5000):
+                Tombstone.objects.filter(kind='place', object_id__in=batch).delete()
+            PlaceImport.objects.filter(file_name=f'{prefix}.csv').delete()
@@ -0,0 +1,79 @@
+import threading
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections, connection, transaction
+
+from places.inventory import RoomsUnavailable, reserve_rooms, set_inventory
+from places.models import Place, RoomInventory
+
+
+class Command(BaseCommand):
+    help = ("Benchmark concurrent hotel bookings against one hotel's inventory and check "
+            "nothing is oversold. The benchmark hotel is deleted afterwards.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--attempts', type=int, default=50, help="Bookings tried per thread")
+        parser.add_argument('--rooms', type=int, default=100, help="Rooms offered per night")
+        parser.add_argument('--nights', type=int, default=30, help="Nights of inventory")
+        parser.add_argument('--stay', type=int, default=3, help="Nights per booking")
+
+    def handle(self, *args, **options):
+        start = date.today() + timedelta(days=30)
+        hotel = Place.objects.create(name="Contention benchmark hotel", city="Benchmark", place_type='hotel')
+        try:
+            set_inventory(hotel, 'standard', options['rooms'], start, start + timedelta(days=options['nights']))
+            results = {'booked': 0, 'full': 0, 'errors': 0}
+            lock = threading.Lock()
+            latencies = []
+
+            def worker(seed):
+                close_old_connections()
+                try:
+                    for attempt in range(options['attempts']):
+                        # Overlapping stays spread over the inventory window
+                        offset = (seed * 7 + attempt * 3) % (options['nights'] - options['stay'] + 1)
+                        check_in = start + timedelta(days=offset)
+                        began = time.perf_counter()
+                        try:
+                            with transaction.atomic():
+                                reserve_rooms(hotel, 'standard', check_in, check_in + timedelta(days=options['stay']))
+                            outcome = 'booked'
+                        except RoomsUnavailable:
+                            outcome = 'full'
+                        except OperationalError:
+                            outcome = 'errors'
+                        with lock:
+                            results[outcome] += 1
+                            latencies.append(time.perf_counter() - began)
+                finally:
+                    connection.close()
+
+            threads = [threading.Thread(target=worker, args=(i,)) for i in range(options['threads'])]
+            began = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - began
+
+            inventory = RoomInventory.objects.filter(place=hotel)
+            sold = sum(row.total - row.available for row in inventory)
+            oversold = inventory.filter(available__lt=0).count()
+            latencies.sort()
+            attempts = sum(results.values())
+            self.stdout.write(
+                f"{attempts} attempts from {options['threads']} threads in {elapsed:.2f}s "
+                f"({attempts / elapsed:,.0f}/s, p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+                f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms)"
+            )
+            self.stdout.write(f"booked {results['booked']}, rejected as full {results['full']}, errors {results['errors']}")
+            consistent = sold == results['booked'] * options['stay'] and not oversold
+            style = self.style.SUCCESS if consistent else self.style.ERROR
+            self.stdout.write(style(
+                f"room-nights sold {sold}, expected {results['booked'] * options['stay']}, oversold nights {oversold}"
+            ))
+        finally:
+            hotel.delete()
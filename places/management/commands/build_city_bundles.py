@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from places.bundles import build_city_bundle, stale_bundle_cities
+
+
+class Command(BaseCommand):
+    help = ("Rebuild the offline bundles of cities whose places changed since their last "
+            "build. The refresh worker does this on its own every few minutes; run it from "
+            "cron where the worker is disabled.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--city', action='append', help="Rebuild only this city (repeatable)")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        cities = options['city'] or stale_bundle_cities()
+        for city in cities:
+            bundle = build_city_bundle(city)
+            if bundle is None:
+                self.stdout.write(f"{city}: no places, bundle removed")
+            else:
+                self.stdout.write(f"{city}: v{bundle.version}, {bundle.place_count} places, {bundle.size} bytes")
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {len(cities)} city bundles in {time.monotonic() - started:.1f}s"
+        ))
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from places.dedup import DEDUP_RADIUS_METERS, NAME_SIMILARITY, find_duplicates, merge_duplicates
+from places.models import Place
+
+
+class Command(BaseCommand):
+    help = ("Find places stored more than once (same type, nearby, similar names) and merge "
+            "each group into its oldest place, moving bookings, payments and reviews over.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--radius', type=float, default=DEDUP_RADIUS_METERS,
+                            help="Maximum distance between duplicates, in metres")
+        parser.add_argument('--threshold', type=float, default=NAME_SIMILARITY,
+                            help="Minimum name similarity (0-1)")
+        parser.add_argument('--city', help="Only look at places in this city")
+        parser.add_argument('--dry-run', action='store_true', help="Report duplicates without merging")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        queryset = Place.objects.filter(city__iexact=options['city']) if options['city'] else None
+        groups = find_duplicates(options['radius'], options['threshold'], queryset)
+        found = time.monotonic() - started
+        self.stdout.write(f"Found {len(groups)} duplicate groups ({sum(len(g) - 1 for g in groups)} places) in {found:.1f}s")
+
+        if options['dry_run']:
+            names = Place.objects.in_bulk([place_id for group in groups[:20] for place_id in group])
+            for group in groups[:20]:
+                self.stdout.write("  " + " = ".join(f"{names[i].name} (#{i})" for i in group if i in names))
+            return
+
+        removed = merge_duplicates(groups)
+        self.stdout.write(self.style.SUCCESS(
+            f"Merged away {removed} duplicate places in {time.monotonic() - started:.1f}s"
+        ))
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from places.geocoding import geocode_missing_places, get_geocoder
+
+
+class Command(BaseCommand):
+    help = ("Look up coordinates for places still at the (0, 0) default, such as places "
+            "created by admins, and add them to the map. Safe to run repeatedly, e.g. from cron.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, help="Geocode at most this many places")
+        parser.add_argument('--geocoder',
+                            help="Geocoder class path, overriding PLACES_GEOCODER "
+                                 "(e.g. places.geocoding.StubGeocoder)")
+
+    def handle(self, *args, **options):
+        try:
+            geocoder = get_geocoder(options['geocoder'])
+        except ImportError as e:
+            raise CommandError(str(e))
+
+        started = time.monotonic()
+        located, unresolved = geocode_missing_places(options['limit'], geocoder)
+        self.stdout.write(self.style.SUCCESS(
+            f"Located {located} places, {unresolved} unresolved, in {time.monotonic() - started:.1f}s"
+        ))
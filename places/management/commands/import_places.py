@@ -0,0 +1,45 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from places.imports import IMPORT_CHUNK_SIZE, IMPORT_FORMATS, ImportFormatError, import_places
+from places.osm import open_extract
+
+
+class Command(BaseCommand):
+    help = ("Bulk-import places from a CSV or JSONL file (optionally .gz/.bz2), keyed by "
+            "their external_key. Re-running a file resumes an interrupted import.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Path to the file")
+        parser.add_argument('--format', choices=IMPORT_FORMATS,
+                            help="File format; guessed from the file name by default")
+        parser.add_argument('--user', help="Username recorded as the places' creator")
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE,
+                            help="Rows validated and written per transaction")
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            user = get_user_model().objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f"No user named '{options['user']}'")
+
+        path = options['path']
+        started = time.monotonic()
+        try:
+            with open_extract(path) as handle:
+                job = import_places(handle, path.rsplit('/', 1)[-1], options['format'], user, options['chunk_size'])
+        except (OSError, ImportFormatError) as e:
+            raise CommandError(str(e))
+
+        elapsed = time.monotonic() - started
+        for error in job.errors[:20]:
+            self.stdout.write(f"row {error['row']}: {error['field'] or 'record'}: {error['error']}")
+        if job.error_count > 20:
+            self.stdout.write(f"... and {job.error_count - 20} more errors")
+        self.stdout.write(self.style.SUCCESS(
+            f"{job.rows_done} rows: created {job.created}, skipped {job.skipped} existing, "
+            f"{job.error_count} errors in {elapsed:.1f}s ({job.rows_done / max(elapsed, 1e-6):.0f} rows/s)"
+        ))
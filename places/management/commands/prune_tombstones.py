@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from places.sync import TOMBSTONE_RETENTION_DAYS, prune_tombstones
+
+
+class Command(BaseCommand):
+    help = ("Delete sync tombstones older than the retention window. Clients with older "
+            "cursors are told to run a full sync. Meant to run daily, e.g. from cron.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=TOMBSTONE_RETENTION_DAYS)
+
+    def handle(self, *args, **options):
+        deleted = prune_tombstones(options['days'])
+        self.stdout.write(self.style.SUCCESS(f"Pruned {deleted} tombstones"))
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from places.clusters import MAX_LEVEL, rebuild_grid
+from places.models import PlaceGridCell
+
+
+class Command(BaseCommand):
+    help = ("Recompute the map clustering grid from the places table. Run once after "
+            "migrating; afterwards the grid is maintained as places are written.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        rebuild_grid()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {PlaceGridCell.objects.count()} grid cells over {MAX_LEVEL + 1} levels "
+            f"in {time.monotonic() - started:.1f}s"
+        ))
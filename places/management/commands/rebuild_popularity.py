@@ -0,0 +1,55 @@
+from collections import defaultdict
+from datetime import datetime, time, timezone
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from payments.models import Payment
+from paystack.models import PaystackPayment
+from places.cache import bump_places_generation
+from places.models import Booking, Place
+from places.osm import chunked
+from places.popularity import BOOKING_WEIGHT, PAYMENT_WEIGHT, growth, rebuild_all_leaderboards
+
+
+class Command(BaseCommand):
+    help = ("Recompute every place's popularity from booking and payment history and rebuild "
+            "the top-places leaderboards. Run once after migrating; afterwards both are kept "
+            "current as bookings and payments are written.")
+
+    def handle(self, *args, **options):
+        scores = defaultdict(float)
+        for place_id, booking_date in Booking.objects.values_list('place_id', 'booking_date').iterator():
+            scores[place_id] += BOOKING_WEIGHT * growth(_as_datetime(booking_date))
+
+        for place_id, booking_place_id, timestamp in Payment.objects.filter(status='success').values_list(
+            'place_id', 'booking__place_id', 'timestamp'
+        ).iterator():
+            if place_id or booking_place_id:
+                scores[place_id or booking_place_id] += PAYMENT_WEIGHT * growth(timestamp)
+
+        known = set(Place.objects.values_list('id', flat=True))
+        for place_id, created_at in PaystackPayment.objects.filter(status='success').values_list(
+            'place_id', 'created_at'
+        ).iterator():
+            try:
+                place_id = int(place_id)
+            except (TypeError, ValueError):
+                continue
+            if place_id in known:
+                scores[place_id] += PAYMENT_WEIGHT * growth(created_at)
+
+        with transaction.atomic():
+            Place.objects.exclude(popularity=0).update(popularity=0)
+            for batch in chunked(scores.items(), 1000):
+                places = [Place(pk=place_id, popularity=score) for place_id, score in batch if place_id in known]
+                Place.objects.bulk_update(places, ['popularity'])
+            rebuild_all_leaderboards()
+            bump_places_generation()
+
+        self.stdout.write(self.style.SUCCESS(f"Scored {len(scores)} places and rebuilt leaderboards"))
+
+
+def _as_datetime(day):
+    # Bookings only record a date; count them from the start of the day
+    return datetime.combine(day, time(0), tzinfo=timezone.utc)
@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from places.models import PlaceSegment
+from places.refresh import (
+    CATEGORY_TAGS,
+    REFRESH_POLL_SECONDS,
+    city_name,
+    claim_segment,
+    refresh_segments,
+    run_stale_refreshes,
+    segment_key,
+)
+
+
+class Command(BaseCommand):
+    help = "Refresh stale place segments from OpenStreetMap, or one city on demand."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--city', help="Refresh this city now instead of the stale queue")
+        parser.add_argument('--type', dest='place_type', choices=list(CATEGORY_TAGS),
+                            help="Limit a --city refresh to one place type")
+        parser.add_argument('--loop', action='store_true',
+                            help="Keep polling for stale segments (dedicated worker process)")
+
+    def handle(self, *args, **options):
+        city = options['city']
+        if city:
+            place_types = [options['place_type']] if options['place_type'] else list(CATEGORY_TAGS)
+            segments = []
+            for place_type in place_types:
+                city_key, type_key = segment_key(city, place_type)
+                segment, _ = PlaceSegment.objects.get_or_create(
+                    city=city_key, place_type=type_key, defaults={'name': city_name(city)},
+                )
+                if not claim_segment(segment, owner=segments[0].lease_owner if segments else None):
+                    PlaceSegment.objects.filter(pk__in=[s.pk for s in segments]).update(
+                        status=PlaceSegment.IDLE, lease_owner='', lease_expires=None,
+                    )
+                    raise CommandError(f"{segment} is already being refreshed")
+                segments.append(segment)
+            ok = refresh_segments(segments)
+            self.stdout.write(f"{city}: {'refreshed' if ok else 'failed'}")
+            return
+
+        while True:
+            count = run_stale_refreshes()
+            self.stdout.write(f"Refreshed {count} stale segment(s)")
+            if not options['loop']:
+                return
+            time.sleep(REFRESH_POLL_SECONDS)
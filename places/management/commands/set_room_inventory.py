@@ -0,0 +1,36 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from places.inventory import DEFAULT_ROOM_TYPE, set_inventory
+from places.models import Place
+
+
+class Command(BaseCommand):
+    help = "Set how many rooms of a type a hotel offers per night over a date range."
+
+    def add_arguments(self, parser):
+        parser.add_argument('place_id', type=int)
+        parser.add_argument('rooms', type=int, help="Rooms offered each night")
+        parser.add_argument('--room-type', default=DEFAULT_ROOM_TYPE)
+        parser.add_argument('--from', dest='start', type=date.fromisoformat, required=True,
+                            help="First night (YYYY-MM-DD)")
+        parser.add_argument('--to', dest='end', type=date.fromisoformat, required=True,
+                            help="Day after the last night (YYYY-MM-DD)")
+
+    def handle(self, *args, **options):
+        try:
+            place = Place.objects.get(pk=options['place_id'], place_type='hotel')
+        except Place.DoesNotExist:
+            raise CommandError(f"No hotel with id {options['place_id']}")
+        if options['end'] <= options['start'] or options['rooms'] < 0:
+            raise CommandError("--to must be after --from and rooms can't be negative")
+
+        try:
+            nights = set_inventory(place, options['room_type'], options['rooms'], options['start'], options['end'])
+        except IntegrityError:
+            raise CommandError("Some nights already have more rooms booked than that")
+        self.stdout.write(self.style.SUCCESS(
+            f"{place.name}: {options['rooms']} {options['room_type']} rooms on {nights} nights"
+        ))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from places.reviews import verify_ratings
+
+
+class Command(BaseCommand):
+    help = ("Recompute place rating totals from reviews and correct any drift. "
+            "Meant to run nightly, e.g. from cron.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report drift without fixing it")
+
+    def handle(self, *args, **options):
+        drifted = verify_ratings(fix=not options['dry_run'])
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS("All place ratings match their reviews"))
+            return
+        action = "found" if options['dry_run'] else "corrected"
+        preview = ", ".join(str(place_id) for place_id in drifted[:20])
+        more = f" and {len(drifted) - 20} more" if len(drifted) > 20 else ""
+        self.stdout.write(self.style.WARNING(f"Drift {action} on {len(drifted)} places: {preview}{more}"))
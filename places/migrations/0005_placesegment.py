@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-19 06:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('places', '0004_alter_place_created_by'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlaceSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('city', models.CharField(max_length=100)),
+                ('place_type', models.CharField(choices=[('restaurant', 'Restaurant'), ('hotel', 'Hotel'), ('attraction', 'Attraction')], max_length=20)),
+                ('demand', models.PositiveIntegerField(default=0)),
+                ('status', models.CharField(choices=[('idle', 'Idle'), ('running', 'Running')], default='idle', max_length=10)),
+                ('refresh_requested', models.BooleanField(default=False)),
+                ('last_requested', models.DateTimeField(blank=True, null=True)),
+                ('last_refreshed', models.DateTimeField(blank=True, null=True)),
+                ('last_attempt', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'unique_together': {('city', 'place_type')},
+            },
+        ),
+    ]
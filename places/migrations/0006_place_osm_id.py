@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 06:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('places', '0005_placesegment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='place',
+            name='osm_id',
+            field=models.CharField(blank=True, max_length=32, null=True, unique=True),
+        ),
+    ]
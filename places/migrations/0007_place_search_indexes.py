@@ -0,0 +1,44 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.operations import TrigramExtension
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models.functions import Upper
+
+
+def search_indexes():
+    # The expressions must stay identical to the ones in places/search.py
+    # and to Django's icontains SQL, or the planner won't use the indexes.
+    return [
+        GinIndex(SearchVector('name', 'city', 'place_type', config='simple'), name='place_search_vector_idx'),
+        GinIndex(OpClass(Upper('name'), name='gin_trgm_ops'), name='place_name_trgm_idx'),
+        GinIndex(OpClass(Upper('city'), name='gin_trgm_ops'), name='place_city_trgm_idx'),
+    ]
+
+
+def create_search_indexes(apps, schema_editor):
+    # SQLite's FTS5 index is installed by places.search.install_sqlite_search
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Place = apps.get_model('places', 'Place')
+    for index in search_indexes():
+        schema_editor.add_index(Place, index)
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Place = apps.get_model('places', 'Place')
+    for index in search_indexes():
+        schema_editor.remove_index(Place, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('places', '0006_place_osm_id'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-19 06:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('places', '0007_place_search_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='place',
+            index=models.Index(fields=['city', 'place_type', 'price'], name='place_city_type_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='place',
+            index=models.Index(fields=['city', 'place_type', 'rating'], name='place_city_type_rating_idx'),
+        ),
+    ]
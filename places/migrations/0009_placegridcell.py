@@ -0,0 +1,29 @@
+# Generated by Django 5.2 on 2026-10-19 06:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('places', '0008_place_facet_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlaceGridCell',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.PositiveSmallIntegerField()),
+                ('x', models.IntegerField()),
+                ('y', models.IntegerField()),
+                ('place_type', models.CharField(choices=[('restaurant', 'Restaurant'), ('hotel', 'Hotel'), ('attraction', 'Attraction')], max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('lat_sum', models.FloatField(default=0.0)),
+                ('lon_sum', models.FloatField(default=0.0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('level', 'x', 'y', 'place_type'), name='place_grid_cell_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-19 06:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('places', '0009_placegridcell'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='inventory_held',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='RoomInventory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('room_type', models.CharField(max_length=50)),
+                ('night', models.DateField()),
+                ('total', models.PositiveIntegerField()),
+                ('available', models.IntegerField()),
+                ('place', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='room_inventory', to='places.place')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('place', 'room_type', 'night'), name='room_inventory_unique'), models.CheckConstraint(condition=models.Q(('available__gte', 0)), name='room_inventory_available_gte_0')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2 on 2026-10-19 06:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('places', '0010_room_inventory'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlaceLeaderboard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('city', models.CharField(max_length=100)),
+                ('place_type', models.CharField(choices=[('restaurant', 'Restaurant'), ('hotel', 'Hotel'), ('attraction', 'Attraction')], max_length=20)),
+                ('entries', models.JSONField(default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='place',
+            name='popularity',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddIndex(
+            model_name='place',
+            index=models.Index(fields=['city', 'place_type', '-popularity'], name='place_city_type_pop_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='placeleaderboard',
+            unique_together={('city', 'place_type')},
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2 on 2026-10-19 07:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('places', '0013_tombstone_place_updated_at_place_place_updated_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CityBundle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('city', models.CharField(max_length=100, unique=True)),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('etag', models.CharField(blank=True, max_length=64)),
+                ('size', models.PositiveIntegerField(default=0)),
+                ('place_count', models.PositiveIntegerField(default=0)),
+                ('latest_change', models.DateTimeField(blank=True, null=True)),
+                ('built_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
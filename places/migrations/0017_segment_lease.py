@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-19 07:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('places', '0016_geocode_result'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='placesegment',
+            name='lease_expires',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='placesegment',
+            name='lease_owner',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-19 07:31
+
+from django.db import migrations, models
+from django.db.models.functions import Lower
+
+
+def name_segments(apps, schema_editor):
+    """Name existing segments after their city's places, or title-case the key as refreshes used to."""
+    Place = apps.get_model('places', 'Place')
+    PlaceSegment = apps.get_model('places', 'PlaceSegment')
+    segments = list(PlaceSegment.objects.all())
+    names = dict(
+        Place.objects.annotate(city_key=Lower('city'))
+        .filter(city_key__in={segment.city for segment in segments})
+        .values_list('city_key', 'city')
+    )
+    for segment in segments:
+        segment.name = names.get(segment.city, segment.city.title())
+    PlaceSegment.objects.bulk_update(segments, ['name'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('places', '0020_booking_created_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='placesegment',
+            name='name',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.RunPython(name_segments, migrations.RunPython.noop),
+    ]
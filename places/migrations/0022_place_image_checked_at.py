@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-19 07:32
+
+from django.db import migrations, models
+from django.utils import timezone
+
+DEFAULT_PLACE_IMAGE = 'https://images.pexels.com/photos/6267/menu-restaurant-vintage-table.jpg'
+
+
+def default_missing_images(apps, schema_editor):
+    """Give OSM places stored without an image the default one, as they had before."""
+    Place = apps.get_model('places', 'Place')
+    Place.objects.filter(image_url='', osm_id__isnull=False).update(
+        image_url=DEFAULT_PLACE_IMAGE, updated_at=timezone.now(),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('places', '0021_placesegment_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='place',
+            name='image_checked_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(default_missing_images, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.utils import timezone
 
 User = get_user_model()
@@ -17,19 +18,36 @@ class Place(models.Model):
     address = models.CharField(max_length=255, blank=True)
     city = models.CharField(max_length=100)
     image_url = models.URLField(blank=True)
+    image_checked_at = models.DateTimeField(blank=True, null=True)  # Last Pexels lookup, see refresh.backfill_place_details
     place_type = models.CharField(max_length=20, choices=PLACE_TYPES)
     cuisine = models.CharField(max_length=100, blank=True, null=True)  # For restaurants
-    rating = models.FloatField(default=4.0)
+    rating = models.FloatField(default=4.0)  # Average review rating once the place has reviews
+    rating_sum = models.PositiveIntegerField(default=0)
+    review_count = models.PositiveIntegerField(default=0)
     price = models.DecimalField(max_digits=8, decimal_places=2, default=0.00)
     latitude = models.FloatField(default=0.0)
     longitude = models.FloatField(default=0.0)
     last_updated = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)  # Any content change; drives the sync feed
+    osm_id = models.CharField(max_length=32, unique=True, blank=True, null=True)  # e.g. "node/123", unset for admin-created places
+    external_key = models.CharField(max_length=100, unique=True, blank=True, null=True)  # Partner catalogue id, set by bulk imports
+    popularity = models.FloatField(default=0.0)  # Decayed booking/payment score, see places.popularity
     created_by = models.ForeignKey(
         User,
         on_delete=models.SET_NULL,
         null=True,
         default=1 
     )
+
+    class Meta:
+        indexes = [
+            # Serve facet counts and price/rating filtering within a city
+            models.Index(fields=['city', 'place_type', 'price'], name='place_city_type_price_idx'),
+            models.Index(fields=['city', 'place_type', 'rating'], name='place_city_type_rating_idx'),
+            models.Index(fields=['city', 'place_type', '-popularity'], name='place_city_type_pop_idx'),
+            models.Index(fields=['-rating', 'id'], name='place_rating_idx'),
+            models.Index(fields=['updated_at', 'id'], name='place_updated_idx'),
+        ]
     
     def __str__(self):
         return self.name
@@ -59,6 +77,193 @@ class Booking(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     payment_method = models.CharField(max_length=10, choices=PAYMENT_METHODS)
     payment_confirmed = models.BooleanField(default=False)
+    inventory_held = models.BooleanField(default=False)  # Hotel rooms taken from RoomInventory
+    payment_reference = models.CharField(max_length=100, blank=True, null=True, db_index=True)  # Combined basket payment, see places.baskets
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Newest-first booking pages for admins and for each user
+            models.Index(fields=['-booking_date', '-id'], name='booking_date_idx'),
+            models.Index(fields=['user', '-booking_date', '-id'], name='booking_user_date_idx'),
+            # The activity timeline, see places.timeline
+            models.Index(fields=['user', '-created_at', '-id'], name='booking_user_created_idx'),
+        ]
     
     def __str__(self):
-        return f"{self.place.name} - {self.user.username}"
\ No newline at end of file
+        return f"{self.place.name} - {self.user.username}"
+
+class PlaceSegment(models.Model):
+    """Refresh bookkeeping for the places of one type in one city."""
+    IDLE = 'idle'
+    RUNNING = 'running'
+    STATUS_CHOICES = [
+        (IDLE, 'Idle'),
+        (RUNNING, 'Running'),
+    ]
+
+    city = models.CharField(max_length=100)  # Stored lower-cased
+    name = models.CharField(max_length=100, blank=True)  # The city as its places spell it, used for refreshes
+    place_type = models.CharField(max_length=20, choices=Place.PLACE_TYPES)
+    demand = models.PositiveIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=IDLE)
+    refresh_requested = models.BooleanField(default=False)
+    last_requested = models.DateTimeField(blank=True, null=True)
+    last_refreshed = models.DateTimeField(blank=True, null=True)
+    last_attempt = models.DateTimeField(blank=True, null=True)
+    # Lease held by the refresh running this segment; renewed while it makes progress
+    lease_owner = models.CharField(max_length=32, blank=True)
+    lease_expires = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        unique_together = ('city', 'place_type')
+
+    def __str__(self):
+        return f"{self.city} - {self.place_type}"
+
+class PlaceGridCell(models.Model):
+    """
+    Place counts for one cell of the map clustering grid.
+
+    Level L splits the world into square cells of 360 / 2**L degrees;
+    x counts cells east from -180 longitude and y north from -90 latitude.
+    Coordinate sums let clusters report their centroid.
+    """
+    level = models.PositiveSmallIntegerField()
+    x = models.IntegerField()
+    y = models.IntegerField()
+    place_type = models.CharField(max_length=20, choices=Place.PLACE_TYPES)
+    count = models.IntegerField(default=0)
+    lat_sum = models.FloatField(default=0.0)
+    lon_sum = models.FloatField(default=0.0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['level', 'x', 'y', 'place_type'], name='place_grid_cell_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.level}/{self.x}/{self.y} {self.place_type}: {self.count}"
+
+
+class RoomInventory(models.Model):
+    """Rooms of one type at a hotel for a single night."""
+    place = models.ForeignKey(Place, on_delete=models.CASCADE, related_name='room_inventory')
+    room_type = models.CharField(max_length=50)  # Stored lower-cased
+    night = models.DateField()
+    total = models.PositiveIntegerField()
+    available = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['place', 'room_type', 'night'], name='room_inventory_unique'),
+            models.CheckConstraint(condition=models.Q(available__gte=0), name='room_inventory_available_gte_0'),
+        ]
+
+    def __str__(self):
+        return f"{self.place.name} {self.room_type} {self.night}: {self.available}/{self.total}"
+
+
+class PlaceLeaderboard(models.Model):
+    """The most popular places of one type in one city, kept current on write."""
+    city = models.CharField(max_length=100)  # Stored lower-cased
+    place_type = models.CharField(max_length=20, choices=Place.PLACE_TYPES)
+    entries = models.JSONField(default=list)  # [[place_id, popularity], ...], most popular first
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('city', 'place_type')
+
+    def __str__(self):
+        return f"{self.city} - {self.place_type}: {len(self.entries)} places"
+
+
+class Review(models.Model):
+    """A user's review of a place, one per completed booking."""
+    booking = models.OneToOneField(Booking, on_delete=models.CASCADE, related_name='review')
+    place = models.ForeignKey(Place, on_delete=models.CASCADE, related_name='reviews')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reviews')
+    rating = models.PositiveSmallIntegerField(validators=[MinValueValidator(1), MaxValueValidator(5)])
+    comment = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['place', '-created_at'], name='review_place_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.place.name} - {self.user.username}: {self.rating}"
+
+
+class Tombstone(models.Model):
+    """Records a deleted place or flight so sync clients can drop it."""
+    KIND_CHOICES = [
+        ('place', 'Place'),
+        ('flight', 'Flight'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.CharField(max_length=32)
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'deleted_at', 'id'], name='tombstone_kind_deleted_idx'),
+            models.Index(fields=['kind', 'object_id'], name='tombstone_kind_object_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} deleted {self.deleted_at:%Y-%m-%d %H:%M}"
+
+
+class CityBundle(models.Model):
+    """Bookkeeping for a city's offline bundle file, see places.bundles."""
+    city = models.CharField(max_length=100, unique=True)  # Lower-case city key
+    version = models.PositiveIntegerField(default=0)
+    etag = models.CharField(max_length=64, blank=True)
+    size = models.PositiveIntegerField(default=0)  # Compressed bytes
+    place_count = models.PositiveIntegerField(default=0)
+    latest_change = models.DateTimeField(null=True, blank=True)  # Newest place updated_at in the bundle
+    built_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.city} v{self.version} ({self.place_count} places)"
+
+
+class PlaceImport(models.Model):
+    """A bulk place import, see places.imports. Re-uploading the same file resumes it."""
+    RUNNING = 'running'
+    DONE = 'done'
+    STATUS_CHOICES = [
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+    ]
+
+    file_name = models.CharField(max_length=255)
+    checksum = models.CharField(max_length=64, db_index=True)  # SHA-256 of the file
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=RUNNING)
+    rows_done = models.PositiveIntegerField(default=0)  # Rows committed, where a resumed import picks up
+    created = models.PositiveIntegerField(default=0)
+    skipped = models.PositiveIntegerField(default=0)  # Rows whose external key already exists
+    error_count = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list)  # The first MAX_REPORTED_ERRORS row errors
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.file_name} ({self.status}, {self.rows_done} rows)"
+
+
+class GeocodeResult(models.Model):
+    """Cached geocoder answer for a normalized address query; null coordinates mean not found."""
+    query = models.CharField(max_length=255, unique=True)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    geocoder = models.CharField(max_length=50)
+    resolved_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return self.query
@@ -0,0 +1,216 @@
+"""
+Streaming readers for OpenStreetMap data.
+
+Overpass responses and OSM extracts can run to hundreds of megabytes, so these
+helpers yield one element at a time instead of loading a whole document.
+"""
+import json
+
+# Drop consumed text from the buffer once this much has been parsed
+_COMPACT_AFTER = 1 << 16
+# Whitespace and the characters that can continue a number
+_NUMBER_TAIL = frozenset(' \t\r\n0123456789.eE+-')
+
+
+def iter_json_array(chunks, key):
+    """Yield the items of the JSON array stored under `key`, one at a time.
+
+    `chunks` is an iterable of text pieces (e.g. a response's iter_content).
+    Only the text of the item being decoded is held in memory. The first
+    occurrence of `"key"` in the document must be the array's key, which holds
+    for Overpass ("elements") and GeoJSON ("features") output.
+    """
+    decoder = json.JSONDecoder()
+    chunks = iter(chunks)
+    marker = f'"{key}"'
+    buffer = ''
+
+    # Skip ahead to the opening bracket of the array
+    while True:
+        index = buffer.find(marker)
+        if index != -1:
+            bracket = buffer.find('[', index + len(marker))
+            if bracket != -1:
+                buffer = buffer[bracket + 1:]
+                break
+        else:
+            buffer = buffer[-len(marker):]
+        chunk = next(chunks, None)
+        if chunk is None:
+            return
+        buffer += chunk
+
+    pos = 0
+    while True:
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == ']':
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+            # A number cut at a chunk boundary ("12|3", "1.|5") decodes as a
+            # shorter one, so only trust an item once text beyond it is in
+            rest = end
+            while rest < len(buffer) and buffer[rest] in _NUMBER_TAIL:
+                rest += 1
+        except json.JSONDecodeError:
+            rest = None
+        if rest is None or rest == len(buffer):
+            # The next item is incomplete; pull in more text and retry
+            chunk = next(chunks, None)
+            if chunk is None:
+                raise ValueError(f"Truncated JSON while reading '{key}'")
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        pos = end
+        yield item
+        if pos > _COMPACT_AFTER:
+            buffer = buffer[pos:]
+            pos = 0
+
+
+def chunked(iterable, size):
+    """Group an iterable into lists of at most `size` items."""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def open_extract(path, mode='rb'):
+    """Open a possibly gzip- or bzip2-compressed extract file."""
+    if path.endswith('.gz'):
+        import gzip
+        return gzip.open(path, mode)
+    if path.endswith('.bz2'):
+        import bz2
+        return bz2.open(path, mode)
+    return open(path, mode)
+
+
+def _read_chunks(handle, size=1 << 20):
+    while True:
+        chunk = handle.read(size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _geojson_osm_id(feature):
+    """Normalize the OSM id conventions of common exporters to "node/123"."""
+    properties = feature.get('properties') or {}
+    raw = str(feature.get('id') or properties.get('@id') or properties.get('osm_id') or '')
+    if '/' in raw:
+        return raw
+    prefixes = {'n': 'node', 'w': 'way', 'r': 'relation'}
+    if raw[:1] in prefixes and raw[1:].isdigit():
+        return f"{prefixes[raw[0]]}/{raw[1:]}"
+    return None
+
+
+def _centroid(coordinates):
+    """Average of every position in a (possibly nested) GeoJSON coordinate array."""
+    lat_total = lon_total = 0.0
+    count = 0
+    stack = [coordinates]
+    while stack:
+        item = stack.pop()
+        if item and isinstance(item[0], (int, float)):
+            lon_total += item[0]
+            lat_total += item[1]
+            count += 1
+        else:
+            stack.extend(item)
+    return (lat_total / count, lon_total / count) if count else (None, None)
+
+
+def iter_geojson_elements(path):
+    """Yield Overpass-style elements from a GeoJSON FeatureCollection extract."""
+    with open_extract(path, 'rt') as handle:
+        for feature in iter_json_array(_read_chunks(handle), 'features'):
+            geometry = feature.get('geometry') or {}
+            coordinates = geometry.get('coordinates')
+            if not coordinates:
+                continue
+            if geometry.get('type') == 'Point':
+                lon, lat = coordinates[0], coordinates[1]
+            else:
+                lat, lon = _centroid(coordinates)
+            osm_id = _geojson_osm_id(feature)
+            element_type, _, element_id = osm_id.partition('/') if osm_id else (None, None, None)
+            yield {
+                'type': element_type,
+                'id': element_id,
+                'lat': lat,
+                'lon': lon,
+                'tags': {k: v for k, v in (feature.get('properties') or {}).items() if isinstance(v, str)},
+            }
+
+
+def _iter_xml(path, tags):
+    """Yield fully parsed top-level OSM XML elements, freeing each afterwards."""
+    from xml.etree.ElementTree import iterparse
+
+    with open_extract(path, 'rb') as handle:
+        context = iterparse(handle, events=('start', 'end'))
+        _, root = next(context)
+        for event, elem in context:
+            if event == 'end' and elem.tag in ('node', 'way', 'relation'):
+                if elem.tag in tags:
+                    yield elem
+                root.clear()
+
+
+def _xml_tags(elem):
+    return {tag.get('k'): tag.get('v') for tag in elem.iter('tag')}
+
+
+def iter_osm_xml_elements(path, keep):
+    """Yield Overpass-style elements from an OSM XML extract.
+
+    Only elements for which `keep(tags)` is true are emitted. Ways are
+    located at the centroid of their nodes, which takes two passes over the
+    file: the first collects the matching ways and the node ids they use,
+    the second emits matching nodes while recording just those node
+    positions. Memory grows with the matching ways, not the extract.
+    """
+    ways = []
+    needed_nodes = set()
+    for elem in _iter_xml(path, ('way',)):
+        tags = _xml_tags(elem)
+        if keep(tags):
+            refs = [int(nd.get('ref')) for nd in elem.iter('nd')]
+            ways.append((elem.get('id'), tags, refs))
+            needed_nodes.update(refs)
+
+    positions = {}
+    for elem in _iter_xml(path, ('node', 'way')):
+        if elem.tag == 'way':
+            break  # Nodes precede ways in OSM files
+        node_id = int(elem.get('id'))
+        lat, lon = float(elem.get('lat')), float(elem.get('lon'))
+        if node_id in needed_nodes:
+            positions[node_id] = (lat, lon)
+        if len(elem):
+            tags = _xml_tags(elem)
+            if keep(tags):
+                yield {'type': 'node', 'id': node_id, 'lat': lat, 'lon': lon, 'tags': tags}
+
+    for way_id, tags, refs in ways:
+        points = [positions[ref] for ref in refs if ref in positions]
+        if not points:
+            continue
+        yield {
+            'type': 'way',
+            'id': way_id,
+            'center': {
+                'lat': sum(p[0] for p in points) / len(points),
+                'lon': sum(p[1] for p in points) / len(points),
+            },
+            'tags': tags,
+        }
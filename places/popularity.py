@@ -0,0 +1,139 @@
+"""
+Place popularity.
+
+Every booking and successful payment adds to its place's popularity, and
+older activity counts for less: a boost halves in weight every
+HALF_LIFE_DAYS. Rather than decaying every score over time, boosts are
+stored scaled up by 2 ** (age of the event since POPULARITY_EPOCH / half-life),
+so stored scores only ever grow yet compare exactly like decayed ones;
+current_popularity converts a stored score back to today's value.
+
+Each (city, place_type) keeps a PlaceLeaderboard of its TOP_PLACES_SIZE most
+popular places, updated as boosts are applied, so reading the top places
+costs O(N) however many places and bookings exist.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from .models import Booking, Place, PlaceLeaderboard
+
+HALF_LIFE_DAYS = 30
+POPULARITY_EPOCH = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+
+BOOKING_WEIGHT = 1.0
+PAYMENT_WEIGHT = 2.0
+
+TOP_PLACES_SIZE = 20
+
+
+def growth(when):
+    """Scale of a boost made at `when` relative to one made at the epoch."""
+    return 2 ** ((when - POPULARITY_EPOCH).total_seconds() / (HALF_LIFE_DAYS * 86400))
+
+
+def current_popularity(stored, now=None):
+    return stored / growth(now or timezone.now())
+
+
+def boost(place_id, weight, when=None):
+    """Add `weight` to a place's popularity and update its leaderboard."""
+    amount = weight * growth(when or timezone.now())
+    with transaction.atomic():
+        if not Place.objects.filter(pk=place_id).update(popularity=F('popularity') + amount):
+            return
+        city, place_type, score = Place.objects.values_list('city', 'place_type', 'popularity').get(pk=place_id)
+        board = PlaceLeaderboard.objects.select_for_update().filter(city=city.lower(), place_type=place_type).first()
+        if board is None:
+            rebuild_leaderboard(city, place_type)
+            return
+        # Scores only grow, so a place that doesn't beat the last entry can't belong
+        entries = [entry for entry in board.entries if entry[0] != place_id]
+        if len(entries) >= TOP_PLACES_SIZE and score <= entries[-1][1]:
+            return
+        entries.append([place_id, score])
+        entries.sort(key=lambda entry: (-entry[1], entry[0]))
+        board.entries = entries[:TOP_PLACES_SIZE]
+        board.save(update_fields=['entries', 'updated_at'])
+
+
+def boost_on_commit(place_id, weight):
+    # Count activity only once it's committed, outside the writer's transaction
+    transaction.on_commit(lambda: boost(place_id, weight))
+
+
+def rebuild_leaderboard(city, place_type):
+    """Recompute one leaderboard from the places table."""
+    top = (
+        Place.objects.filter(city__iexact=city, place_type=place_type, popularity__gt=0)
+        .order_by('-popularity', 'id')
+        .values_list('id', 'popularity')[:TOP_PLACES_SIZE]
+    )
+    PlaceLeaderboard.objects.update_or_create(
+        city=city.lower(), place_type=place_type,
+        defaults={'entries': [[place_id, score] for place_id, score in top]},
+    )
+
+
+def rebuild_all_leaderboards():
+    segments = (
+        Place.objects.filter(popularity__gt=0)
+        .annotate(city_key=Lower('city'))
+        .values_list('city_key', 'place_type')
+        .distinct()
+    )
+    PlaceLeaderboard.objects.all().delete()
+    for city, place_type in segments:
+        rebuild_leaderboard(city, place_type)
+
+
+def top_places(city, place_type, limit=TOP_PLACES_SIZE):
+    """The most popular places of a type in a city with their current popularity."""
+    board = PlaceLeaderboard.objects.filter(city=city.lower(), place_type=place_type).first()
+    if board is None:
+        return []
+    entries = board.entries[:limit]
+    places = Place.objects.in_bulk([place_id for place_id, _ in entries])
+    now = timezone.now()
+    return [
+        (places[place_id], current_popularity(score, now))
+        for place_id, score in entries
+        if place_id in places
+    ]
+
+
+# Signal receivers
+
+def booking_created(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        boost_on_commit(instance.place_id, BOOKING_WEIGHT)
+
+
+def remember_payment_status(sender, instance, raw=False, **kwargs):
+    """pre_save: note a payment's stored status so only the change to success counts."""
+    if instance.pk and not raw:
+        instance._previous_status = sender.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+
+
+def payment_saved(sender, instance, raw=False, **kwargs):
+    if raw or instance.status != 'success' or getattr(instance, '_previous_status', None) == 'success':
+        return
+    instance._previous_status = instance.status
+    place_id = getattr(instance, 'place_id', None)
+    if place_id is None and getattr(instance, 'booking_id', None):
+        place_id = Booking.objects.filter(pk=instance.booking_id).values_list('place_id', flat=True).first()
+    # Paystack payments keep the place id as a string
+    try:
+        place_id = int(place_id)
+    except (TypeError, ValueError):
+        return
+    boost_on_commit(place_id, PAYMENT_WEIGHT)
+
+
+def place_deleted(sender, instance, **kwargs):
+    board = PlaceLeaderboard.objects.filter(city=instance.city.lower(), place_type=instance.place_type).first()
+    if board and any(entry[0] == instance.pk for entry in board.entries):
+        transaction.on_commit(lambda: rebuild_leaderboard(instance.city, instance.place_type))
@@ -0,0 +1,105 @@
+"""
+Review rating aggregates.
+
+Each place keeps a running rating_sum and review_count, and its rating is
+their ratio. Every review write adjusts them with one UPDATE built from F()
+expressions, so the database applies concurrent changes on top of each
+other and no write ever reads all of a place's reviews. verify_ratings
+recomputes the aggregates from the reviews table and corrects any drift.
+"""
+from django.db.models import Case, Count, F, Sum, When
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from .cache import bump_places_generation
+from .models import Place, Review
+
+
+def adjust_rating(place_id, delta_sum, delta_count):
+    """Apply a change to a place's review totals and recompute its average.
+
+    SET expressions all read the row's old values, hence the deltas appear
+    again in the average.
+    """
+    new_count = F('review_count') + delta_count
+    Place.objects.filter(pk=place_id).update(
+        rating_sum=F('rating_sum') + delta_sum,
+        review_count=new_count,
+        rating=Case(
+            When(review_count__gt=-delta_count, then=(F('rating_sum') + delta_sum) * 1.0 / new_count),
+            default=F('rating'),
+        ),
+        updated_at=Now(),
+    )
+    bump_places_generation()
+
+
+def booking_completed(booking, today):
+    """A booking can be reviewed once it's confirmed and the stay or visit is over."""
+    if booking.status != 'confirmed':
+        return False
+    finished = booking.check_out or booking.booking_date
+    return finished <= today
+
+
+# Signal receivers
+
+def remember_review(sender, instance, raw=False, **kwargs):
+    """pre_save: note the stored rating so an edit only applies the difference."""
+    if instance.pk and not raw:
+        instance._stored = sender.objects.filter(pk=instance.pk).values_list('place_id', 'rating').first()
+
+
+def review_saved(sender, instance, created=False, raw=False, **kwargs):
+    stored = None if created else getattr(instance, '_stored', None)
+    if stored is None:
+        adjust_rating(instance.place_id, instance.rating, 1)
+    elif stored != (instance.place_id, instance.rating):
+        old_place, old_rating = stored
+        if old_place == instance.place_id:
+            adjust_rating(instance.place_id, instance.rating - old_rating, 0)
+        else:
+            adjust_rating(old_place, -old_rating, -1)
+            adjust_rating(instance.place_id, instance.rating, 1)
+    instance._stored = (instance.place_id, instance.rating)
+
+
+def review_deleted(sender, instance, **kwargs):
+    adjust_rating(instance.place_id, -instance.rating, -1)
+
+
+def verify_ratings(fix=True):
+    """Compare every place's review totals with its reviews; returns the drifted place ids.
+
+    With fix=True the totals are corrected and ratings recomputed. A place
+    left without reviews keeps its last rating.
+    """
+    actual = {
+        row['place']: (row['total'], row['count'])
+        for row in Review.objects.values('place').annotate(total=Sum('rating'), count=Count('id')).order_by()
+    }
+    drifted = []
+    stored = Place.objects.filter(review_count__gt=0).values_list('id', 'rating_sum', 'review_count', 'rating')
+    seen = set()
+    for place_id, rating_sum, review_count, rating in stored.iterator():
+        seen.add(place_id)
+        total, count = actual.get(place_id, (0, 0))
+        expected = total / count if count else rating
+        if (rating_sum, review_count) != (total, count) or abs(rating - expected) > 1e-9:
+            drifted.append((place_id, total, count, expected))
+    for place_id in actual.keys() - seen:
+        total, count = actual[place_id]
+        drifted.append((place_id, total, count, total / count))
+
+    if fix and drifted:
+        now = timezone.now()
+        Place.objects.bulk_update(
+            [
+                Place(pk=place_id, rating_sum=total, review_count=count, rating=rating, updated_at=now)
+                for place_id, total, count, rating in drifted
+            ],
+            ['rating_sum', 'review_count', 'rating', 'updated_at'],
+            batch_size=500,
+        )
+        bump_places_generation()
+    return [place_id for place_id, *_ in drifted]
@@ -0,0 +1,115 @@
+"""
+Indexed place search.
+
+On PostgreSQL, search uses a GIN-indexed tsvector over name, city and type
+for ranked prefix matching, plus a trigram index on the name for typo
+tolerance. On SQLite (local development) it uses an FTS5 table kept in sync
+by triggers. Both indexes are maintained by the database on every write,
+including bulk_create/bulk_update from refresh jobs.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.functions import Upper
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.settings import api_settings
+
+FTS_TABLE = 'places_place_fts'
+
+_SQLITE_FTS_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, city, place_type,
+        content='places_place', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON places_place BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, city, place_type)
+        VALUES (new.id, new.name, new.city, new.place_type);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON places_place BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, city, place_type)
+        VALUES ('delete', old.id, old.name, old.city, old.place_type);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF name, city, place_type ON places_place BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, city, place_type)
+        VALUES ('delete', old.id, old.name, old.city, old.place_type);
+        INSERT INTO {FTS_TABLE}(rowid, name, city, place_type)
+        VALUES (new.id, new.name, new.city, new.place_type);
+    END""",
+]
+
+
+def install_sqlite_search(using='default', **kwargs):
+    """Create the SQLite FTS index and its triggers if any are missing.
+
+    Connected to post_migrate: SQLite migrations that rebuild places_place
+    drop its triggers, so they are restored (and the index rebuilt) after
+    every migrate run. Does nothing on other databases.
+    """
+    from django.db import connections
+
+    conn = connections[using]
+    if conn.vendor != 'sqlite':
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s",
+            [f'{FTS_TABLE}_a_'],
+        )
+        if cursor.fetchone()[0] == 3:
+            return
+        for statement in _SQLITE_FTS_SQL:
+            cursor.execute(statement)
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def search_tokens(term):
+    return re.findall(r'\w+', term or '')
+
+
+def search_places(queryset, term):
+    """Filter a Place queryset to matches for `term`, best matches first."""
+    tokens = search_tokens(term)
+    if not tokens:
+        return queryset
+
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity
+
+        # Must match the expression of place_search_vector_idx
+        vector = SearchVector('name', 'city', 'place_type', config='simple')
+        query = SearchQuery(' & '.join(f"{token}:*" for token in tokens), config='simple', search_type='raw')
+        term = ' '.join(tokens).upper()
+        return queryset.alias(
+            search_vector=vector,
+            name_upper=Upper('name'),
+        ).filter(
+            Q(search_vector=query) | Q(name_upper__trigram_word_similar=term)
+        ).annotate(
+            search_rank=SearchRank(vector, query) + TrigramWordSimilarity(term, Upper('name')),
+        ).order_by('-search_rank', 'id')
+
+    if connection.vendor == 'sqlite':
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = places_place.id', f'{FTS_TABLE} MATCH %s'],
+            params=[match],
+            select={'search_rank': f'bm25({FTS_TABLE})'},
+        ).order_by('search_rank', 'id')
+
+    # Unindexed fallback for other backends
+    for token in tokens:
+        queryset = queryset.filter(
+            Q(name__icontains=token) | Q(city__icontains=token) | Q(place_type__icontains=token)
+        )
+    return queryset
+
+
+class PlaceSearchFilter(BaseFilterBackend):
+    """Ranked, index-backed replacement for SearchFilter on place listings."""
+    search_param = api_settings.SEARCH_PARAM
+
+    def filter_queryset(self, request, queryset, view):
+        return search_places(queryset, request.query_params.get(self.search_param, ''))
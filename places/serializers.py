@@ -1,13 +1,38 @@
 from rest_framework import serializers
-from .models import Place, Booking
+from .models import Place, Booking, PlaceImport, Review
 from decimal import Decimal
 from decimal import InvalidOperation
+from datetime import time
+from .baskets import MAX_BASKET_SIZE
+from .itinerary import DEFAULT_SPEED_KMH, DEFAULT_VISIT_MINUTES
+from .reviews import booking_completed
+from .thumbnails import thumbnail_url
+from django.utils import timezone
 
 class PlaceSerializer(serializers.ModelSerializer):
+    thumbnail_url = serializers.SerializerMethodField()
+
     class Meta:
         model = Place
-        fields = '__all__'
-        read_only_fields = ['created_by', 'created_at']
+        # Popularity changes with every booking and payment, so cached listings
+        # leave it out; /places/top/ reports it from the leaderboards
+        exclude = ['popularity']
+        read_only_fields = ['created_by', 'created_at', 'osm_id', 'external_key', 'rating_sum', 'review_count']
+
+    def get_thumbnail_url(self, obj):
+        return thumbnail_url(obj.image_url)
+
+class PlaceSyncSerializer(serializers.ModelSerializer):
+    """Places as sent by the sync feed, without fields that churn on every booking or refresh."""
+
+    class Meta:
+        model = Place
+        exclude = ['popularity', 'rating_sum', 'last_updated', 'image_checked_at', 'created_by']
+
+class PlaceImportSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PlaceImport
+        exclude = ['checksum', 'created_by']
 
 class BookingSerializer(serializers.ModelSerializer):
     place_name = serializers.CharField(source='place.name', read_only=True)
@@ -17,7 +42,7 @@ class BookingSerializer(serializers.ModelSerializer):
     class Meta:
         model = Booking
         fields = '__all__'
-        read_only_fields = ['user', 'status', 'payment_confirmed']
+        read_only_fields = ['user', 'status', 'payment_confirmed', 'inventory_held', 'payment_reference']
 
     def validate(self, data):
         place = data.get('place')
@@ -26,6 +51,8 @@ class BookingSerializer(serializers.ModelSerializer):
             if place.place_type == 'hotel':
                 if not data.get('check_in') or not data.get('check_out'):
                     raise serializers.ValidationError("Check-in and Check-out are required for hotel bookings.")
+                if data['check_out'] <= data['check_in']:
+                    raise serializers.ValidationError("Check-out must be after check-in.")
             elif place.place_type == 'restaurant':
                 if not data.get('meal_choices'):
                     raise serializers.ValidationError("Meal choices are required for restaurant bookings.")
@@ -50,6 +77,29 @@ class BookingSerializer(serializers.ModelSerializer):
         validated_data['user'] = self.context['request'].user
         return super().create(validated_data)
     
+class BasketPlaceField(serializers.PrimaryKeyRelatedField):
+    """A place id resolved from the places loaded once for the whole basket."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return self.context['places'][int(data)]
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+
+
+class BasketBookingSerializer(BookingSerializer):
+    place = BasketPlaceField(queryset=Place.objects.all())
+
+
+class BookingBasketSerializer(serializers.Serializer):
+    bookings = BasketBookingSerializer(many=True, allow_empty=False, max_length=MAX_BASKET_SIZE)
+    # Start one combined payment for every booking in the basket
+    payment_method = serializers.ChoiceField(choices=Booking.PAYMENT_METHODS, required=False)
+
 class BookingDetailSerializer(serializers.ModelSerializer):
     place_type = serializers.CharField(source='place.place_type', read_only=True)
     place_name = serializers.CharField(source='place.name', read_only=True)
@@ -84,3 +134,71 @@ class AdminBookingSerializer(serializers.ModelSerializer):
             'payment_method', 'payment_confirmed'
         ]
         read_only_fields = ['user_name', 'user_email', 'place_name', 'place_type']  # Mark place_type as read-only
+
+
+class ItineraryStopSerializer(serializers.Serializer):
+    place = serializers.IntegerField()
+    duration = serializers.IntegerField(min_value=0, max_value=12 * 60, default=DEFAULT_VISIT_MINUTES)  # Minutes
+    opens = serializers.TimeField(required=False, allow_null=True)
+    closes = serializers.TimeField(required=False, allow_null=True)
+
+    def validate(self, data):
+        if data.get('opens') and data.get('closes') and data['opens'] >= data['closes']:
+            raise serializers.ValidationError("Opening time must be before closing time.")
+        return data
+
+
+class ItineraryRequestSerializer(serializers.Serializer):
+    MAX_STOPS = 250
+
+    stops = ItineraryStopSerializer(many=True, allow_empty=False, max_length=MAX_STOPS)
+    start_latitude = serializers.FloatField(required=False, min_value=-90, max_value=90)
+    start_longitude = serializers.FloatField(required=False, min_value=-180, max_value=180)
+    start_time = serializers.TimeField(default=time(9, 0))
+    speed_kmh = serializers.FloatField(min_value=1, max_value=120, default=DEFAULT_SPEED_KMH)
+
+    def validate(self, data):
+        if ('start_latitude' in data) != ('start_longitude' in data):
+            raise serializers.ValidationError("Provide both start_latitude and start_longitude, or neither.")
+        return data
+
+
+class HotelAvailabilitySerializer(serializers.Serializer):
+    MAX_NIGHTS = 60
+
+    city = serializers.CharField()
+    check_in = serializers.DateField()
+    check_out = serializers.DateField()
+    room_type = serializers.CharField(required=False)
+    rooms = serializers.IntegerField(min_value=1, max_value=50, default=1)
+
+    def validate(self, data):
+        nights = (data['check_out'] - data['check_in']).days
+        if nights < 1:
+            raise serializers.ValidationError("Check-out must be after check-in.")
+        if nights > self.MAX_NIGHTS:
+            raise serializers.ValidationError(f"Stays are limited to {self.MAX_NIGHTS} nights.")
+        return data
+
+
+class ReviewSerializer(serializers.ModelSerializer):
+    user_name = serializers.CharField(source='user.username', read_only=True)
+
+    class Meta:
+        model = Review
+        fields = ['id', 'booking', 'place', 'user_name', 'rating', 'comment', 'created_at', 'updated_at']
+        read_only_fields = ['place', 'user_name', 'created_at', 'updated_at']
+
+    def validate_booking(self, booking):
+        if self.instance is not None and booking != self.instance.booking:
+            raise serializers.ValidationError("A review can't be moved to another booking.")
+        if booking.user_id != self.context['request'].user.id:
+            raise serializers.ValidationError("You can only review your own bookings.")
+        if not booking_completed(booking, timezone.localdate()):
+            raise serializers.ValidationError("Only completed bookings can be reviewed.")
+        return booking
+
+    def create(self, validated_data):
+        validated_data['user'] = self.context['request'].user
+        validated_data['place'] = validated_data['booking'].place
+        return super().create(validated_data)
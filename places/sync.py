@@ -0,0 +1,157 @@
+"""
+Delta sync feeds.
+
+Clients keep a local copy of places or flights and ask for what changed
+since their last sync. A feed page holds rows whose updated_at moved past
+the client's cursor, in (updated_at, pk) keyset order backed by an index,
+plus tombstones for rows deleted since. The response carries an opaque
+cursor for the next request; the first sync (no cursor) pages through
+everything once.
+
+Rows become visible to the feed PLACES_SYNC_SETTLE_SECONDS (default
+SYNC_SETTLE_SECONDS) after their updated_at, so a transaction that commits
+slightly after a later one can't slip behind a client's cursor. This holds
+only for writes that commit within that window of stamping their rows:
+single-row saves do, and bulk writers whose transactions can run longer
+(imports, refreshes, merges) call stamp_on_commit to move updated_at to the
+moment they commit. Tombstones are kept for TOMBSTONE_RETENTION_DAYS; a
+client whose cursor is older must start over with a full sync.
+"""
+import base64
+import json
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from .models import Tombstone
+from .osm import chunked
+
+SYNC_SETTLE_SECONDS = 30
+TOMBSTONE_RETENTION_DAYS = 90
+
+DEFAULT_SYNC_PAGE = 500
+MAX_SYNC_PAGE = 2000
+
+
+def settle_seconds():
+    return getattr(settings, 'PLACES_SYNC_SETTLE_SECONDS', SYNC_SETTLE_SECONDS)
+
+
+def stamp_on_commit(model, pks):
+    """Set updated_at on rows written in the current transaction to when it commits.
+
+    Rows become visible at commit, not when they were stamped; a transaction
+    that outlasts the settle window would otherwise publish rows clients'
+    cursors have already passed. If the process dies between the commit and
+    the stamp, the rows keep their write time.
+    """
+    pks = list(pks)
+    if not pks:
+        return
+
+    def stamp():
+        now = timezone.now()
+        for batch in chunked(pks, 1000):
+            model._base_manager.filter(pk__in=batch).update(updated_at=now)
+    transaction.on_commit(stamp)
+
+
+def encode_cursor(changes, deletions):
+    payload = {
+        'c': [changes[0].isoformat(), changes[1]] if changes else None,
+        'd': [deletions[0].isoformat(), deletions[1]],
+    }
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode()
+
+
+def decode_cursor(value):
+    """Return (changes position or None, deletions position) from a cursor string."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(value.encode()))
+        changes = payload['c'] and (datetime.fromisoformat(payload['c'][0]), payload['c'][1])
+        deletions = (datetime.fromisoformat(payload['d'][0]), payload['d'][1])
+    except (ValueError, KeyError, TypeError):
+        raise ValidationError({"cursor": "Invalid sync cursor."})
+    return changes, deletions
+
+
+def _after(queryset, field, position):
+    """Rows strictly after a (timestamp, pk) keyset position."""
+    if position is None:
+        return queryset
+    moment, pk = position
+    return queryset.filter(Q(**{f'{field}__gt': moment}) | Q(**{field: moment, 'pk__gt': pk}))
+
+
+def sync_response(request, queryset, kind, serializer_class):
+    """Build one page of the changes feed for `queryset` (a model with updated_at)."""
+    try:
+        limit = min(max(int(request.query_params.get('limit', DEFAULT_SYNC_PAGE)), 1), MAX_SYNC_PAGE)
+    except ValueError:
+        limit = DEFAULT_SYNC_PAGE
+
+    now = timezone.now()
+    settled = now - timedelta(seconds=settle_seconds())
+    cursor = request.query_params.get('cursor')
+    if cursor:
+        changes_position, deletions_position = decode_cursor(cursor)
+        if deletions_position[0] < now - timedelta(days=TOMBSTONE_RETENTION_DAYS):
+            return Response(
+                {"error": "Sync cursor has expired", "full_sync_required": True},
+                status=status.HTTP_410_GONE,
+            )
+    else:
+        # A full sync starts tracking deletions from the moment it begins
+        changes_position, deletions_position = None, (settled, 0)
+
+    rows = list(
+        _after(queryset.filter(updated_at__lt=settled), 'updated_at', changes_position)
+        .order_by('updated_at', 'pk')[:limit + 1]
+    )
+    tombstones = list(
+        _after(Tombstone.objects.filter(kind=kind, deleted_at__lt=settled), 'deleted_at', deletions_position)
+        .order_by('deleted_at', 'pk')
+        .values_list('deleted_at', 'pk', 'object_id')[:limit + 1]
+    )
+    has_more = len(rows) > limit or len(tombstones) > limit
+    rows, tombstones = rows[:limit], tombstones[:limit]
+
+    if rows:
+        changes_position = (rows[-1].updated_at, rows[-1].pk)
+    if tombstones:
+        deletions_position = tombstones[-1][:2]
+
+    return Response({
+        'changes': serializer_class(rows, many=True).data,
+        'deleted': [object_id for _, _, object_id in tombstones],
+        'next_cursor': encode_cursor(changes_position, deletions_position),
+        'has_more': has_more,
+    })
+
+
+# Signal receivers
+
+def record_tombstone(kind):
+    def receiver(sender, instance, **kwargs):
+        Tombstone.objects.create(kind=kind, object_id=str(instance.pk))
+    return receiver
+
+
+def clear_tombstone(kind):
+    """post_save: a re-created row (flights reuse their number) is no longer deleted."""
+    def receiver(sender, instance, created=False, raw=False, **kwargs):
+        if created:
+            Tombstone.objects.filter(kind=kind, object_id=str(instance.pk)).delete()
+    return receiver
+
+
+def prune_tombstones(days=TOMBSTONE_RETENTION_DAYS):
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted, _ = Tombstone.objects.filter(deleted_at__lt=cutoff).delete()
+    return deleted
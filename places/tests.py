@@ -1,3 +1,1395 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import math
+import os
+import random
+import tempfile
+from datetime import date, timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.db.models import Avg, Count, F
+from django.db.models.signals import pre_save
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from bookings.transitions import InvalidTransition, StatusConflict, change_status
+from flights.models import Flight, FlightBooking
+from payments.models import Payment
+from paystack.models import PaystackPayment
+
+from . import imports, refresh, sync
+from .bundles import _write_atomic
+from .cache import places_generation
+from .clusters import add_to_grid, rebuild_grid
+from .dedup import DEDUP_RADIUS_METERS, METERS_PER_DEGREE, find_duplicates, merge_duplicates
+from .facets import MIN_PRICE_BUCKET, compute_facets
+from .geocoding import MISS_RETRY_DAYS, Geocoder, RateLimiter, StubGeocoder, geocode_missing_places
+from .imports import import_places
+from .inventory import RoomsUnavailable, reserve_rooms, set_inventory
+from .itinerary import Itinerary, Stop, optimise_itinerary
+from .models import (
+    Booking, GeocodeResult, Place, PlaceGridCell, PlaceImport, PlaceSegment, Review, RoomInventory, Tombstone,
+)
+from .osm import iter_json_array
+from .popularity import BOOKING_WEIGHT, boost
+from .reviews import verify_ratings
+from .search import FTS_TABLE, search_places
+from .sync import SYNC_SETTLE_SECONDS, TOMBSTONE_RETENTION_DAYS
+from .thumbnails import ThumbnailError, check_source_url, fetch_image, thumbnail_url
+
+
+def make_place(**fields):
+    # Place.created_by defaults to user 1, which tests don't have
+    fields.setdefault('created_by', None)
+    fields.setdefault('city', 'Nairobi')
+    fields.setdefault('place_type', 'hotel')
+    fields.setdefault('name', 'Place')
+    return Place.objects.create(**fields)
+
+
+class BookingQueryCountTests(TestCase):
+    """Booking endpoints cost a fixed number of queries however many bookings a page shows."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.user = User.objects.create_user(username='traveller', email='traveller@example.com', password='x')
+        cls.admin = User.objects.create_user(username='admin', email='admin@example.com', password='x', is_staff=True)
+        cls.places = [
+            Place.objects.create(name=f'Place {i}', city='Nairobi', place_type=place_type,
+                                 image_url=f'https://example.com/{i}.jpg')
+            for i, place_type in enumerate(['hotel', 'restaurant', 'attraction'])
+        ]
+
+    def add_bookings(self, count):
+        Booking.objects.bulk_create([
+            Booking(user=self.user, place=self.places[i % len(self.places)],
+                    booking_date=date(2026, 1, 1) + timedelta(days=i), total_price=100, payment_method='mpesa')
+            for i in range(count)
+        ])
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def assert_flat(self, client, url, queries):
+        # One row and a full page must cost the same
+        for count in (1, 9):
+            self.add_bookings(count)
+            with self.assertNumQueries(queries):
+                response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+
+    def test_user_booking_list(self):
+        # Page count, then the bookings joined to their places
+        self.assert_flat(self.client_for(self.user), '/api/bookings/my/', 2)
+
+    def test_admin_booking_list(self):
+        self.assert_flat(self.client_for(self.admin), '/api/admin/bookings/', 2)
+
+    def test_user_booking_detail(self):
+        self.add_bookings(1)
+        booking = Booking.objects.get()
+        with self.assertNumQueries(1):
+            response = self.client_for(self.user).get(f'/api/bookings/{booking.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['place_name'], booking.place.name)
+
+
+@override_settings(PLACES_REFRESH_WORKER=False)
+class DemandTests(TestCase):
+    """Listing demand only creates refresh segments for cities the app knows."""
+
+    def setUp(self):
+        refresh.flush_demand()  # Drop demand left over from other tests
+        make_place(name='Hotel', city='Dar es Salaam')
+
+    def test_unknown_city_is_dropped(self):
+        refresh.record_demand('dar es')
+        refresh.record_demand('Atlantis', 'hotel')
+        refresh.flush_demand()
+        self.assertFalse(PlaceSegment.objects.exists())
+
+    def test_known_city_keeps_its_spelling(self):
+        refresh.record_demand('  dar  ES salaam ', 'hotel')
+        refresh.flush_demand()
+        segment = PlaceSegment.objects.get()
+        self.assertEqual((segment.city, segment.name, segment.demand), ('dar es salaam', 'Dar es Salaam', 1))
+
+        with mock.patch.object(refresh, 'refresh_place_data', return_value=False) as refresh_place_data:
+            refresh.claim_segment(segment)
+            refresh.refresh_segments([segment])
+        self.assertEqual(refresh_place_data.call_args.args[1], 'Dar es Salaam')
+
+    def test_freshness_finds_segments_as_stored(self):
+        for place_type in refresh.CATEGORY_TAGS:
+            refresh.record_demand('Dar es  Salaam', place_type)
+        refresh.flush_demand()
+        PlaceSegment.objects.update(last_refreshed=timezone.now())
+        self.assertEqual(refresh.get_freshness('  dar ES   salaam', ' Hotel ')[0], 'fresh')
+        self.assertEqual(refresh.get_freshness('Dar es Salaam')[0], 'fresh')
+
+    def test_forced_refresh_creates_new_city(self):
+        refresh.record_demand('Zanzibar', 'hotel', force=True)
+        refresh.flush_demand()
+        segment = PlaceSegment.objects.get()
+        self.assertEqual((segment.city, segment.name, segment.refresh_requested), ('zanzibar', 'Zanzibar', True))
+
+
+
+@override_settings(PLACES_REFRESH_WORKER=False)
+class SegmentLeaseTests(TestCase):
+    """Concurrent refresh requests for a city share one upstream refresh."""
+
+    def setUp(self):
+        refresh.flush_demand()  # Drop demand left over from other tests
+        make_place(name='Hotel', city='Arusha')
+
+    def test_forced_requests_share_one_refresh(self):
+        for _ in range(5):
+            refresh.record_demand('Arusha', force=True)
+        refresh.flush_demand()
+        self.assertEqual(PlaceSegment.objects.filter(refresh_requested=True).count(), len(refresh.CATEGORY_TAGS))
+
+        with mock.patch.object(refresh, 'refresh_place_data', return_value=True) as refresh_place_data, \
+                mock.patch.object(refresh, 'build_city_bundle'):
+            self.assertEqual(refresh.run_stale_refreshes(), len(refresh.CATEGORY_TAGS))
+        refresh_place_data.assert_called_once()
+        self.assertEqual(sorted(refresh_place_data.call_args.args[0]), sorted(refresh.CATEGORY_TAGS))
+        self.assertEqual(
+            set(PlaceSegment.objects.values_list('status', 'refresh_requested', 'lease_owner', 'demand')),
+            {(PlaceSegment.IDLE, False, '', 2)},
+        )
+
+    def test_requests_during_a_refresh_wait_for_it(self):
+        segment = PlaceSegment.objects.create(city='arusha', place_type='hotel', name='Arusha')
+        rival = PlaceSegment.objects.get(pk=segment.pk)
+        self.assertTrue(refresh.claim_segment(segment))
+        self.assertFalse(refresh.claim_segment(rival))
+        self.assertEqual(refresh.get_freshness('Arusha', 'hotel')[0], 'refreshing')
+
+        refresh.record_demand('Arusha', 'hotel', force=True)
+        refresh.flush_demand()
+        with mock.patch.object(refresh, 'refresh_place_data', return_value=True) as refresh_place_data, \
+                mock.patch.object(refresh, 'build_city_bundle'):
+            self.assertEqual(refresh.run_next_refresh(), 0)
+            self.assertTrue(refresh.refresh_segments([segment]))
+        refresh_place_data.assert_called_once()
+        self.assertEqual(
+            PlaceSegment.objects.values_list('status', 'refresh_requested').get(), (PlaceSegment.IDLE, False),
+        )
+
+    def test_expired_lease_passes_to_another_worker(self):
+        segment = PlaceSegment.objects.create(city='arusha', place_type='hotel', name='Arusha')
+        self.assertTrue(refresh.claim_segment(segment))
+        PlaceSegment.objects.update(lease_expires=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(refresh.get_freshness('Arusha', 'hotel')[0], 'unknown')
+
+        rival = PlaceSegment.objects.get()
+        self.assertTrue(refresh.claim_segment(rival))
+        with self.assertRaises(refresh.LeaseLost):
+            refresh.renew_lease([segment])
+        with mock.patch.object(refresh, 'refresh_place_data', return_value=True), \
+                self.assertLogs('places.refresh', 'WARNING'):
+            self.assertFalse(refresh.refresh_segments([segment]))
+        self.assertEqual(
+            PlaceSegment.objects.values_list('status', 'lease_owner').get(), (PlaceSegment.RUNNING, rival.lease_owner),
+        )
+
+class PlaceImageTests(TestCase):
+    """Refreshed places show the default image until a real one is found."""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Refreshed places are attributed to the default created_by user
+        get_user_model().objects.create(id=1, username='owner')
+
+    def test_new_places_get_default_image_and_lookups_rotate(self):
+        records = [
+            {'osm_id': f'node/{i}', 'place_type': 'hotel', 'name': f'Hotel {i}', 'latitude': -1.28 + i * 0.01,
+             'longitude': 36.8, 'address': '', 'cuisine': 'food'}
+            for i in range(3)
+        ]
+        refresh.upsert_places(records, 'Nairobi')
+        self.assertEqual(set(Place.objects.values_list('image_url', flat=True)), {refresh.DEFAULT_PLACE_IMAGE})
+
+        # Pexels has nothing: the default stays, and the next run checks the place skipped this time
+        with mock.patch.object(refresh, 'get_image_url', return_value=refresh.DEFAULT_PLACE_IMAGE) as lookup:
+            refresh.backfill_place_details('Nairobi', ['hotel'], image_budget=2)
+            refresh.backfill_place_details('Nairobi', ['hotel'], image_budget=2)
+        searched = [call.args[0] for call in lookup.call_args_list]
+        self.assertEqual(searched[:3], ['Hotel 0 hotel', 'Hotel 1 hotel', 'Hotel 2 hotel'])
+
+        with mock.patch.object(refresh, 'get_image_url', return_value='https://example.com/real.jpg'):
+            refresh.backfill_place_details('Nairobi', ['hotel'], image_budget=3)
+        self.assertEqual(set(Place.objects.values_list('image_url', flat=True)), {'https://example.com/real.jpg'})
+
+
+class SyncSettleTests(TestCase):
+    """Slow background writes still reach clients that synced while they ran."""
+
+    def test_image_backfill_outlasting_settle_window(self):
+        user = get_user_model().objects.create_user(username='syncer', password='x')
+        client = APIClient()
+        client.force_authenticate(user)
+        start = timezone.now()
+        clock = [start - timedelta(hours=1)]
+        settle = timedelta(seconds=SYNC_SETTLE_SECONDS)
+
+        with mock.patch('django.utils.timezone.now', lambda: clock[0]):
+            slow = make_place(name='Slow', price=100, image_url=refresh.DEFAULT_PLACE_IMAGE)
+            other = make_place(name='Other', price=100, image_url='https://example.com/other.jpg')
+            synced = {}
+
+            def slow_lookup(query, category):
+                # Another place changes, then a client syncs, all while Pexels is answering
+                clock[0] = start + timedelta(seconds=1)
+                other.name = 'Other, renamed'
+                other.save()
+                clock[0] = start + 2 * settle
+                response = client.get('/api/places/sync/')
+                synced['ids'] = [row['id'] for row in response.data['changes']]
+                synced['cursor'] = response.data['next_cursor']
+                return 'https://example.com/slow.jpg'
+
+            clock[0] = start
+            with mock.patch.object(refresh, 'get_image_url', side_effect=slow_lookup):
+                refresh.backfill_place_details('Nairobi', ['hotel'])
+            self.assertIn(other.pk, synced['ids'])
+
+            clock[0] = start + 3 * settle + timedelta(seconds=1)
+            response = client.get('/api/places/sync/', {'cursor': synced['cursor']})
+        changes = {row['id']: row for row in response.data['changes']}
+        self.assertEqual(changes[slow.pk]['image_url'], 'https://example.com/slow.jpg')
+
+
+    def test_long_import_transaction_reaches_clients(self):
+        get_user_model().objects.create(id=1, username='owner')
+        user = get_user_model().objects.create_user(username='syncer', password='x')
+        client = APIClient()
+        client.force_authenticate(user)
+        start = timezone.now()
+        clock = [start]
+        settle = timedelta(seconds=SYNC_SETTLE_SECONDS)
+        record = {
+            'osm_id': 'node/1', 'name': 'Imported', 'latitude': -1.2921, 'longitude': 36.8219,
+            'address': '', 'place_type': 'hotel', 'cuisine': 'food',
+        }
+
+        with mock.patch('django.utils.timezone.now', lambda: clock[0]):
+            with self.captureOnCommitCallbacks(execute=True):
+                with transaction.atomic():
+                    refresh.upsert_places([record], 'Nairobi')
+                    # A client syncs past the write while the batch is still open
+                    clock[0] = start + 2 * settle
+            place = Place.objects.get(osm_id='node/1')
+            self.assertEqual(place.updated_at, start + 2 * settle)
+
+            clock[0] = start + 3 * settle + timedelta(seconds=1)
+            cursor = sync.encode_cursor((start + settle, 0), (start + settle, 0))
+            response = client.get('/api/places/sync/', {'cursor': cursor})
+        self.assertEqual([row['id'] for row in response.data['changes']], [place.pk])
+
+    @override_settings(PLACES_SYNC_SETTLE_SECONDS=600)
+    def test_settle_window_setting(self):
+        user = get_user_model().objects.create_user(username='syncer', password='x')
+        client = APIClient()
+        client.force_authenticate(user)
+        make_place(name='Recent')
+        Place.objects.update(updated_at=timezone.now() - timedelta(seconds=SYNC_SETTLE_SECONDS * 2))
+        self.assertEqual(client.get('/api/places/sync/').data['changes'], [])
+
+
+class SyncFeedTests(TestCase):
+    """Paging the places feed with cursors."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user(username='syncer', password='x'))
+
+    def sync(self, cursor=None, limit=2):
+        params = {'limit': limit}
+        if cursor:
+            params['cursor'] = cursor
+        response = self.client.get('/api/places/sync/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_rows_sharing_a_timestamp_page_without_gaps(self):
+        places = [make_place(name=f'Place {n}') for n in range(5)]
+        Place.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+        seen, cursor = [], None
+        while True:
+            page = self.sync(cursor)
+            seen.extend(row['id'] for row in page['changes'])
+            cursor = page['next_cursor']
+            if not page['has_more']:
+                break
+        self.assertEqual(seen, sorted(place.pk for place in places))
+        self.assertEqual(self.sync(cursor)['changes'], [])
+
+    def test_deleted_places_come_back_as_tombstones(self):
+        make_place(name='Kept')
+        gone = make_place(name='Gone')
+        now = timezone.now()
+        Place.objects.update(updated_at=now - timedelta(hours=2))
+        with mock.patch('django.utils.timezone.now', lambda: now - timedelta(minutes=90)):
+            cursor = self.sync(limit=10)['next_cursor']
+
+        gone_id = gone.pk
+        gone.delete()
+        Tombstone.objects.update(deleted_at=now - timedelta(hours=1))
+        page = self.sync(cursor, limit=10)
+        self.assertEqual(page['deleted'], [str(gone_id)])
+        self.assertEqual(page['changes'], [])
+
+    def test_cursor_older_than_tombstone_retention_expires(self):
+        expired = timezone.now() - timedelta(days=TOMBSTONE_RETENTION_DAYS + 1)
+        response = self.client.get('/api/places/sync/', {'cursor': sync.encode_cursor((expired, 1), (expired, 0))})
+        self.assertEqual(response.status_code, 410)
+        self.assertTrue(response.data['full_sync_required'])
+
+
+class StatusTransitionTests(TestCase):
+    """Status changes are conditional on the version read and follow STATUS_TRANSITIONS."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.user = User.objects.create_user(username='payer', email='payer@example.com', password='x')
+        cls.admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='x')
+        cls.place = make_place(name='Popular')
+
+    def make_payment(self, **fields):
+        fields.setdefault('reference', 'ref-1')
+        return Payment.objects.create(
+            user=self.user, email=self.user.email, amount=100, payment_method='card', **fields
+        )
+
+    def make_paystack_payment(self, **fields):
+        return PaystackPayment.objects.create(
+            user=self.user, amount=100, reference='ps-1', place_id=str(self.place.pk), **fields
+        )
+
+    def test_stale_version_conflicts(self):
+        payment = self.make_payment()
+        Payment.objects.filter(pk=payment.pk).update(version=1)
+        with self.assertRaises(StatusConflict) as caught:
+            change_status(payment, 'success')
+        self.assertEqual(caught.exception.current, {'status': 'pending', 'version': 1})
+
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.patch(f'/api/payments/{payment.pk}/status/', {'status': 'success', 'version': 0})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['current'], {'status': 'pending', 'version': 1})
+        self.assertEqual(Payment.objects.get(pk=payment.pk).status, 'pending')
+
+    def test_disallowed_move_is_refused(self):
+        payment = self.make_payment(status='success')
+        with self.assertRaises(InvalidTransition):
+            change_status(payment, 'pending')
+        self.assertEqual(Payment.objects.values_list('status', 'version').get(), ('success', 0))
+
+    def test_payment_maps_share_final_states(self):
+        self.assertEqual(Payment.STATUS_TRANSITIONS, PaystackPayment.STATUS_TRANSITIONS)
+        payment = self.make_payment(status='failed')
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.patch(f'/api/payments/{payment.pk}/status/', {'status': 'pending'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Payment.objects.values_list('status', 'version').get(), ('failed', 0))
+
+    def test_conflict_leaves_the_transaction_usable(self):
+        payment = self.make_payment()
+        Payment.objects.filter(pk=payment.pk).update(version=1)
+        with transaction.atomic():
+            with self.assertRaises(StatusConflict):
+                change_status(payment, 'failed')
+            self.assertEqual((payment.status, payment.version), ('pending', 0))
+            payment.refresh_from_db()
+            self.assertTrue(change_status(payment, 'failed'))
+        self.assertEqual(Payment.objects.values_list('status', 'version').get(), ('failed', 2))
+
+    def post_webhook(self, reference):
+        return self.client.post(
+            '/api/webhook/',
+            {'event': 'charge.success', 'data': {'reference': reference, 'amount': 10000, 'metadata': {}}},
+            content_type='application/json',
+        )
+
+    def test_webhook_retries_once_after_a_conflict(self):
+        payment = self.make_paystack_payment()
+        calls = []
+
+        def racing_change(instance, *args, conflicts=1, **kwargs):
+            calls.append(instance.version)
+            if len(calls) <= conflicts:
+                # Another writer bumps the row between our read and write
+                PaystackPayment.objects.filter(pk=instance.pk).update(version=F('version') + 1)
+            return change_status(instance, *args, **kwargs)
+
+        with mock.patch('paystack.views.change_status', side_effect=racing_change):
+            response = self.post_webhook(payment.reference)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(calls, [0, 1])
+        self.assertEqual(PaystackPayment.objects.values_list('status', 'verified').get(), ('success', True))
+
+        calls.clear()
+        PaystackPayment.objects.filter(pk=payment.pk).update(status='pending')
+        with mock.patch('paystack.views.change_status', side_effect=lambda *a, **k: racing_change(*a, conflicts=2, **k)):
+            response = self.post_webhook(payment.reference)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(PaystackPayment.objects.get().status, 'pending')
+
+    def test_status_check_keeps_a_final_status(self):
+        payment = self.make_paystack_payment(status='failed')
+        client = APIClient()
+        client.force_authenticate(self.user)
+        for reported in ('pending', 'abandoned'):
+            answer = mock.Mock(status_code=200)
+            answer.json.return_value = {'status': True, 'data': {'status': reported, 'amount': 50000, 'metadata': {}}}
+            with mock.patch('paystack.views.requests.get', return_value=answer):
+                response = client.get(f'/api/status/{payment.reference}/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(PaystackPayment.objects.values_list('status', 'amount', 'version').get(), ('failed', 100, 0))
+
+    def test_change_status_fires_save_signals(self):
+        booking = Booking.objects.create(
+            user=self.user, place=self.place, booking_date=date(2030, 1, 1), total_price=100,
+            payment_method='visa', payment_reference='basket-abc',
+        )
+        payment = self.make_payment(reference='basket-abc', place=self.place)
+        self.place.refresh_from_db()
+        before = self.place.popularity
+
+        seen = []
+        def record(sender, instance, update_fields, **kwargs):
+            seen.append(sorted(update_fields))
+        pre_save.connect(record, sender=Payment)
+        self.addCleanup(pre_save.disconnect, record, sender=Payment)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(change_status(payment, 'success'))
+        self.assertEqual(seen, [['status', 'version']])
+        self.assertTrue(Booking.objects.get(pk=booking.pk).payment_confirmed)
+        self.place.refresh_from_db()
+        self.assertGreater(self.place.popularity, before)
+
+        # Counted once: re-sending the same status writes nothing
+        after = self.place.popularity
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertFalse(change_status(payment, 'success'))
+        self.place.refresh_from_db()
+        self.assertEqual(self.place.popularity, after)
+
+
+class RoomInventoryTests(TestCase):
+    """Hotel rooms are taken per night and given back once."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.user = User.objects.create_user(username='guest', email='guest@example.com', password='x')
+        cls.admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='x')
+        cls.hotel = make_place(name='Hotel')
+        cls.check_in = date(2030, 3, 1)
+
+    def available(self):
+        return list(RoomInventory.objects.filter(place=self.hotel).order_by('night').values_list('available', flat=True))
+
+    def test_last_room_goes_once(self):
+        set_inventory(self.hotel, 'Deluxe', 1, self.check_in, self.check_in + timedelta(days=1))
+        self.assertTrue(reserve_rooms(self.hotel, 'deluxe ', self.check_in, self.check_in + timedelta(days=1)))
+        self.assertEqual(self.available(), [0])
+        with self.assertRaises(RoomsUnavailable):
+            reserve_rooms(self.hotel, 'Deluxe', self.check_in, self.check_in + timedelta(days=1))
+        self.assertEqual(self.available(), [0])
+
+    def test_stay_with_a_full_night_takes_nothing(self):
+        set_inventory(self.hotel, 'standard', 2, self.check_in, self.check_in + timedelta(days=3))
+        RoomInventory.objects.filter(night=self.check_in + timedelta(days=2)).update(available=0)
+        with self.assertRaises(RoomsUnavailable):
+            reserve_rooms(self.hotel, None, self.check_in, self.check_in + timedelta(days=3))
+        self.assertEqual(self.available(), [2, 2, 0])
+
+        # Nights past the offered range count as full too
+        with self.assertRaises(RoomsUnavailable):
+            reserve_rooms(self.hotel, None, self.check_in, self.check_in + timedelta(days=5))
+        self.assertEqual(self.available(), [2, 2, 0])
+
+    def test_untracked_hotel_keeps_booking(self):
+        self.assertFalse(reserve_rooms(self.hotel, None, self.check_in, self.check_in + timedelta(days=2)))
+
+    def book(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post('/api/bookings/', {
+            'place': self.hotel.pk, 'booking_date': '2030-02-01', 'check_in': '2030-03-01',
+            'check_out': '2030-03-03', 'room_type': 'standard', 'total_price': '200.00', 'payment_method': 'visa',
+        })
+        self.assertEqual(response.status_code, 201, response.data)
+        booking = Booking.objects.get(pk=response.data['id'])
+        self.assertTrue(booking.inventory_held)
+        return booking
+
+    def test_admin_cancel_and_delete_give_rooms_back_once(self):
+        set_inventory(self.hotel, 'standard', 3, self.check_in, self.check_in + timedelta(days=2))
+        booking = self.book()
+        self.assertEqual(self.available(), [2, 2])
+
+        admin = APIClient()
+        admin.force_authenticate(self.admin)
+        for _ in range(2):
+            response = admin.patch(f'/api/admin/bookings/{booking.pk}/', {'status': 'cancelled'})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(self.available(), [3, 3])
+        self.assertFalse(Booking.objects.get(pk=booking.pk).inventory_held)
+
+        response = admin.delete(f'/api/admin/bookings/{booking.pk}/delete/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.available(), [3, 3])
+
+        booking = self.book()
+        self.assertEqual(self.available(), [2, 2])
+        admin.delete(f'/api/admin/bookings/{booking.pk}/delete/')
+        self.assertEqual(self.available(), [3, 3])
+
+
+class ReviewRatingTests(TestCase):
+    """A place's stored rating follows its reviews through every write."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.guests = [User.objects.create_user(username=f'guest{n}', password='x') for n in range(3)]
+        cls.place = make_place(name='Reviewed')
+
+    def assert_rating_matches(self):
+        place = Place.objects.annotate(average=Avg('reviews__rating'), reviews_total=Count('reviews')).get(pk=self.place.pk)
+        self.assertEqual(place.review_count, place.reviews_total)
+        if place.average is not None:
+            self.assertAlmostEqual(place.rating, place.average)
+        self.assertEqual(verify_ratings(fix=False), [])
+
+    def review(self, guest, rating):
+        booking = Booking.objects.create(
+            user=guest, place=self.place, booking_date=date(2024, 1, 1), check_in=date(2024, 1, 1),
+            check_out=date(2024, 1, 2), status='confirmed', total_price=100, payment_method='visa',
+        )
+        client = APIClient()
+        client.force_authenticate(guest)
+        response = client.post('/api/reviews/', {'booking': booking.pk, 'rating': rating})
+        self.assertEqual(response.status_code, 201, response.data)
+        return client, response.data['id']
+
+    def test_create_edit_and_delete(self):
+        reviews = [self.review(guest, rating) for guest, rating in zip(self.guests, (5, 4, 2))]
+        self.assert_rating_matches()
+
+        client, review_id = reviews[2]
+        self.assertEqual(client.patch(f'/api/reviews/{review_id}/', {'rating': 5}).status_code, 200)
+        self.assert_rating_matches()
+        self.assertEqual(client.patch(f'/api/reviews/{review_id}/', {'comment': 'Same score'}).status_code, 200)
+        self.assert_rating_matches()
+
+        for client, review_id in reviews[:2]:
+            self.assertEqual(client.delete(f'/api/reviews/{review_id}/').status_code, 204)
+            self.assert_rating_matches()
+        self.place.refresh_from_db()
+        self.assertEqual((self.place.rating_sum, self.place.review_count, self.place.rating), (5, 1, 5))
+
+
+class BasketTests(TestCase):
+    """Baskets book everything or nothing and are confirmed by one payment."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='group', email='group@example.com', password='x')
+        cls.open_hotel = make_place(name='Open')
+        cls.full_hotel = make_place(name='Full')
+        cls.restaurant = make_place(name='Diner', place_type='restaurant')
+        cls.check_in = date(2030, 5, 1)
+        set_inventory(cls.open_hotel, 'standard', 2, cls.check_in, cls.check_in + timedelta(days=2))
+        set_inventory(cls.full_hotel, 'standard', 1, cls.check_in, cls.check_in + timedelta(days=2))
+        RoomInventory.objects.filter(place=cls.full_hotel).update(available=0)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def item(self, place, **fields):
+        fields.update(place=place.pk, booking_date='2030-04-01', total_price='150.00', payment_method='visa')
+        if place.place_type == 'hotel':
+            fields.update(check_in='2030-05-01', check_out='2030-05-03', room_type='standard')
+        else:
+            fields.update(meal_choices='Lunch')
+        return fields
+
+    def post_basket(self, *items, **extra):
+        return self.client.post('/api/bookings/basket/', {'bookings': list(items), **extra}, format='json')
+
+    def test_unavailable_hotel_books_nothing(self):
+        response = self.post_basket(self.item(self.open_hotel), self.item(self.restaurant), self.item(self.full_hotel))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['bookings'][1], {})
+        self.assertIn('room_type', response.data['bookings'][2])
+        self.assertFalse(Booking.objects.exists())
+        self.assertEqual(
+            list(RoomInventory.objects.filter(place=self.open_hotel).values_list('available', flat=True)), [2, 2]
+        )
+
+    def test_paid_basket_confirms_every_booking(self):
+        response = self.post_basket(self.item(self.open_hotel), self.item(self.restaurant), payment_method='mpesa')
+        self.assertEqual(response.status_code, 201, response.data)
+        payment = Payment.objects.get(pk=response.data['payment']['id'])
+        self.assertEqual(payment.amount, 300)
+        self.assertEqual(Booking.objects.filter(payment_reference=payment.reference).count(), 2)
+        self.assertFalse(Booking.objects.filter(payment_confirmed=True).exists())
+
+        payment.status = 'success'
+        payment.save()
+        self.assertEqual(list(Booking.objects.values_list('payment_confirmed', flat=True)), [True, True])
+
+
+class TimelineTests(TestCase):
+    """The merged activity feed pages through ties between sources."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='traveller', email='t@example.com', password='x')
+        other = get_user_model().objects.create_user(username='other', password='x')
+        place = make_place(name='Hotel')
+        flight = Flight.objects.create(flight_number='KQ100', airline='KQ', origin='NBO', destination='MBA')
+        for owner in (cls.user, other):
+            for n in range(3):
+                FlightBooking.objects.create(user=owner, flight=flight, seat_number=f'{n}A')
+                Booking.objects.create(
+                    user=owner, place=place, booking_date=date(2030, 1, 1), total_price=100, payment_method='visa',
+                )
+                Payment.objects.create(
+                    user=owner, email='t@example.com', amount=100, payment_method='card', reference=f'{owner.pk}-{n}',
+                )
+                PaystackPayment.objects.create(user=owner, amount=100, reference=f'ps-{owner.pk}-{n}')
+
+        # Most rows share one timestamp, a few are older
+        moment = timezone.now().replace(microsecond=0)
+        FlightBooking.objects.update(created_at=moment)
+        Booking.objects.update(created_at=moment)
+        Payment.objects.update(timestamp=moment)
+        PaystackPayment.objects.update(created_at=moment)
+        Payment.objects.filter(reference__endswith='-0').update(timestamp=moment - timedelta(hours=1))
+        Booking.objects.filter(pk=Booking.objects.order_by('pk').first().pk).update(created_at=moment - timedelta(days=1))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_pages_skip_and_repeat_nothing(self):
+        seen, cursor = [], None
+        while True:
+            params = {'limit': 3, **({'cursor': cursor} if cursor else {})}
+            response = self.client.get('/api/timeline/', params)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 3)
+            seen.extend((entry['type'], str(entry['item']['id']), entry['timestamp']) for entry in response.data['results'])
+            cursor = response.data['next_cursor']
+            if not response.data['has_more']:
+                break
+        self.assertIsNone(cursor)
+
+        expected = (
+            [('flight_booking', str(pk)) for pk in FlightBooking.objects.filter(user=self.user).values_list('pk', flat=True)]
+            + [('booking', str(pk)) for pk in Booking.objects.filter(user=self.user).values_list('pk', flat=True)]
+            + [('payment', str(pk)) for pk in Payment.objects.filter(user=self.user).values_list('pk', flat=True)]
+            + [('paystack_payment', str(pk)) for pk in PaystackPayment.objects.filter(user=self.user).values_list('pk', flat=True)]
+        )
+        entries = [(kind, pk) for kind, pk, _ in seen]
+        self.assertEqual(len(entries), len(set(entries)))
+        self.assertEqual(sorted(entries), sorted(expected))
+        timestamps = [moment for _, _, moment in seen]
+        self.assertEqual(timestamps, sorted(timestamps, reverse=True))
+
+    def test_malformed_cursor_is_rejected(self):
+        for cursor in ('not-a-cursor', 'bm90IGpzb24=', 'WzEsMl0='):
+            response = self.client.get('/api/timeline/', {'cursor': cursor})
+            self.assertEqual(response.status_code, 400, cursor)
+
+
+@override_settings(PLACES_REFRESH_WORKER=False)
+class PlaceCacheTests(TestCase):
+    """Cached listings and facets never outlive a place write."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='browser', password='x')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.place = make_place(name='Cached', price=100)
+
+    def listing(self):
+        return {row['id']: row for row in self.client.get('/api/places/', {'city': 'Nairobi'}).data}
+
+    def facets(self):
+        return self.client.get('/api/places/facets/', {'city': 'Nairobi'}).data['place_types']
+
+    def test_place_writes_invalidate_cached_responses(self):
+        self.assertEqual(self.listing()[self.place.pk]['name'], 'Cached')
+        self.assertEqual(self.facets(), [{'value': 'hotel', 'count': 1}])
+        generation = places_generation()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.place.name = 'Renamed'
+            self.place.place_type = 'restaurant'
+            self.place.save()
+        self.assertGreater(places_generation(), generation)
+        self.assertEqual(self.listing()[self.place.pk]['name'], 'Renamed')
+        self.assertEqual(self.facets(), [{'value': 'restaurant', 'count': 1}])
+
+        generation = places_generation()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.place.delete()
+        self.assertGreater(places_generation(), generation)
+        self.assertEqual(self.listing(), {})
+        self.assertEqual(self.facets(), [])
+
+    def test_popularity_boost_keeps_cached_listings(self):
+        self.assertNotIn('popularity', self.listing()[self.place.pk])
+        generation = places_generation()
+        with self.captureOnCommitCallbacks(execute=True):
+            boost(self.place.pk, BOOKING_WEIGHT)
+        self.assertEqual(places_generation(), generation)
+
+        top = self.client.get('/api/places/top/', {'city': 'Nairobi', 'type': 'hotel'}).data
+        self.assertEqual([row['id'] for row in top], [self.place.pk])
+        self.assertAlmostEqual(top[0]['popularity'], BOOKING_WEIGHT, places=3)
+
+
+class PlaceImportTests(TestCase):
+    """Imports resume after an interruption and never create a place twice."""
+
+    ROWS = [f'key-{n},Place {n},Nairobi,hotel' for n in range(5)]
+
+    def csv_file(self, rows):
+        return io.BytesIO('\n'.join(['external_key,name,city,place_type', *rows]).encode())
+
+    def test_interrupted_import_resumes(self):
+        make_place(name='Already here', external_key='key-3')
+        chunks = []
+
+        def failing_grid(places):
+            chunks.append(len(places))
+            if len(chunks) == 2:
+                raise RuntimeError("worker killed")
+
+        with mock.patch('places.imports.add_to_grid', side_effect=failing_grid):
+            with self.assertRaises(RuntimeError):
+                import_places(self.csv_file(self.ROWS), 'places.csv', chunk_size=2)
+        job = PlaceImport.objects.get()
+        self.assertEqual((job.status, job.rows_done, job.created, job.skipped), (PlaceImport.RUNNING, 2, 2, 0))
+        self.assertEqual(Place.objects.filter(external_key__startswith='key-').count(), 3)
+
+        job = import_places(self.csv_file(self.ROWS), 'places.csv', chunk_size=2)
+        self.assertEqual((job.status, job.rows_done, job.created, job.skipped), (PlaceImport.DONE, 5, 4, 1))
+        self.assertEqual(PlaceImport.objects.count(), 1)
+        keys = list(Place.objects.filter(external_key__startswith='key-').values_list('external_key', flat=True))
+        self.assertEqual(sorted(keys), [f'key-{n}' for n in range(5)])
+
+    def test_gzip_upload_through_the_api(self):
+        admin = get_user_model().objects.create_superuser(username='admin', email='admin@example.com', password='x')
+        client = APIClient()
+        client.force_authenticate(admin)
+        upload = SimpleUploadedFile('places.csv.gz', gzip.compress(self.csv_file(self.ROWS).getvalue()))
+        response = client.post('/api/admin/places/import/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual((response.data['created'], response.data['error_count']), (5, 0))
+
+        broken = SimpleUploadedFile('broken.csv.gz', b'not gzip at all')
+        response = client.post('/api/admin/places/import/', {'file': broken}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+
+    def test_number_columns(self):
+        check = imports.COLUMNS['rating']
+        self.assertEqual(check(['4.5', ' 3 ', 2, None, '']), ([4.5, 3.0, 2.0, 4.0, 4.0], {}))
+        values, errors = check(['4.5', 'great', '7', 'nan', 'inf', [1]])
+        self.assertEqual(values[0], 4.5)
+        self.assertEqual(errors, {
+            1: "Not a number", 2: "Must be between 0 and 5", 3: "Must be between 0 and 5",
+            4: "Must be between 0 and 5", 5: "Not a number",
+        })
+
+    def test_rows_stored_by_an_overlapping_import_are_skipped(self):
+        real_prepare = imports.prepare_chunk
+
+        def racing_prepare(*args, **kwargs):
+            prepared = real_prepare(*args, **kwargs)
+            # Another import commits one of these keys before this chunk is written
+            if not Place.objects.filter(external_key='key-1').exists():
+                make_place(name='From the other import', external_key='key-1')
+            return prepared
+
+        with mock.patch('places.imports.prepare_chunk', side_effect=racing_prepare):
+            job = import_places(self.csv_file(self.ROWS), 'places.csv', chunk_size=3)
+        self.assertEqual((job.rows_done, job.created, job.skipped, job.error_count), (5, 4, 1, 0))
+        self.assertEqual(Place.objects.get(external_key='key-1').name, 'From the other import')
+        self.assertEqual(Place.objects.filter(external_key__startswith='key-').count(), 5)
+
+
+class DuplicatePlaceTests(TestCase):
+    """Places stored twice are found by distance and name and merged into one."""
+
+    LATITUDE, LONGITUDE = -1.2921, 36.8219
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='reviewer', password='x')
+
+    def near(self, metres_east=0, **fields):
+        return make_place(
+            latitude=self.LATITUDE,
+            longitude=self.LONGITUDE + metres_east / (METERS_PER_DEGREE * math.cos(math.radians(self.LATITUDE))),
+            **fields,
+        )
+
+    def test_groups_by_distance_and_name(self):
+        kept = self.near(name='Java House')
+        same = self.near(20, name='Java House.')
+        accented = self.near(40, name='Jàva  House')
+        self.near(DEDUP_RADIUS_METERS * 3, name='Java House')  # Too far
+        self.near(10, name='Carnivore')  # Different name
+        self.near(10, name='Java House', place_type='restaurant')  # Different type
+        self.assertEqual(find_duplicates(), [[kept.pk, same.pk, accented.pk]])
+
+    def test_conflicting_identifiers_are_not_grouped(self):
+        self.near(name='Sarova', osm_id='node/1')
+        self.near(5, name='Sarova', osm_id='node/2')
+        self.near(500, name='Tribe', external_key='partner-1')
+        self.near(505, name='Tribe', external_key='partner-2')
+        self.assertEqual(find_duplicates(), [])
+
+        matched = self.near(1000, name='Ibis', osm_id='node/3')
+        imported = self.near(1005, name='Ibis', external_key='partner-3')
+        self.assertEqual(find_duplicates(), [[matched.pk, imported.pk]])
+        self.assertEqual(merge_duplicates(find_duplicates()), 1)
+        matched.refresh_from_db()
+        self.assertEqual((matched.osm_id, matched.external_key), ('node/3', 'partner-3'))
+
+    def review(self, place, rating):
+        booking = Booking.objects.create(
+            user=self.user, place=place, booking_date=date(2024, 1, 1), status='confirmed',
+            total_price=100, payment_method='visa',
+        )
+        return Review.objects.create(booking=booking, place=place, user=self.user, rating=rating)
+
+    def test_merge_sums_reviews_and_keeps_booked_rooms(self):
+        kept, duplicate = self.near(name='Hilton'), self.near(5, name='Hilton')
+        for place, rating in ((kept, 5), (kept, 4), (duplicate, 3)):
+            self.review(place, rating)
+        night = date(2030, 6, 1)
+        set_inventory(kept, 'standard', 5, night, night + timedelta(days=1))
+        set_inventory(duplicate, 'standard', 5, night, night + timedelta(days=2))
+        reserve_rooms(kept, 'standard', night, night + timedelta(days=1))
+        for _ in range(2):
+            reserve_rooms(duplicate, 'standard', night, night + timedelta(days=2))
+
+        self.assertEqual(merge_duplicates([[kept.pk, duplicate.pk]]), 1)
+        kept.refresh_from_db()
+        self.assertEqual((kept.rating_sum, kept.review_count, kept.rating), (12, 3, 4))
+        self.assertEqual(Review.objects.filter(place=kept).count(), 3)
+        self.assertEqual(verify_ratings(fix=False), [])
+        # One room booked at the kept hotel and two at the duplicate on the shared night
+        self.assertEqual(
+            list(RoomInventory.objects.filter(place=kept).order_by('night').values_list('total', 'available')),
+            [(5, 2), (5, 3)],
+        )
+        self.assertFalse(RoomInventory.objects.exclude(place=kept).exists())
+
+    def test_group_whose_kept_place_is_gone_is_left_alone(self):
+        kept, duplicate = self.near(name='Serena'), self.near(5, name='Serena')
+        self.review(duplicate, 4)
+        groups = find_duplicates()
+        kept.delete()
+
+        self.assertEqual(merge_duplicates(groups), 0)
+        self.assertTrue(Place.objects.filter(pk=duplicate.pk).exists())
+        self.assertEqual(Review.objects.get().place_id, duplicate.pk)
+
+
+class ThumbnailSourceTests(TestCase):
+    """The thumbnail proxy only fetches public http(s) images."""
+
+    def resolve_to(self, *addresses):
+        return mock.patch(
+            'places.thumbnails.socket.getaddrinfo',
+            return_value=[(None, None, None, '', (address, 0)) for address in addresses],
+        )
+
+    def test_internal_addresses_are_refused(self):
+        for address in ('127.0.0.1', '10.0.0.5', '192.168.1.1', '169.254.169.254', '::1', 'fd00::1', '0.0.0.0'):
+            with self.resolve_to('93.184.216.34', address), mock.patch('places.thumbnails.requests.get') as get:
+                with self.assertRaises(ThumbnailError):
+                    fetch_image('https://images.example.com/a.jpg')
+                get.assert_not_called()
+
+    def test_only_http_and_https(self):
+        for url in ('file:///etc/passwd', 'ftp://example.com/a.jpg', 'gopher://example.com/', 'https:///a.jpg'):
+            with self.assertRaises(ThumbnailError):
+                check_source_url(url)
+
+    @override_settings(PLACES_THUMBNAIL_HOSTS=['pexels.com'])
+    def test_host_allowlist(self):
+        with self.resolve_to('93.184.216.34'):
+            check_source_url('https://images.pexels.com/photos/1.jpg')
+            with self.assertRaises(ThumbnailError):
+                check_source_url('https://notpexels.com/photos/1.jpg')
+
+    def test_redirects_are_checked_hop_by_hop(self):
+        redirect = mock.MagicMock(is_redirect=True, headers={'Location': 'http://169.254.169.254/latest/meta-data/'})
+        redirect.__enter__.return_value = redirect
+        def resolve(host, *args, **kwargs):
+            address = host if host == '169.254.169.254' else '93.184.216.34'
+            return [(None, None, None, '', (address, 0))]
+
+        with mock.patch('places.thumbnails.socket.getaddrinfo', side_effect=resolve), \
+                mock.patch('places.thumbnails.requests.get', return_value=redirect) as get:
+            with self.assertRaises(ThumbnailError):
+                fetch_image('https://images.example.com/a.jpg')
+        self.assertEqual(get.call_count, 1)
+        self.assertFalse(get.call_args.kwargs['allow_redirects'])
+
+    def test_failed_fetch_redirects_to_the_placeholder(self):
+        url = thumbnail_url('http://127.0.0.1:8000/admin/')
+        with self.resolve_to('127.0.0.1'):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response['Location'], refresh.DEFAULT_PLACE_IMAGE)
+
+
+class CountingGeocoder(StubGeocoder):
+    name = 'counting'
+
+    def __init__(self):
+        super().__init__()
+        self.queries = []
+
+    def geocode(self, query):
+        self.queries.append(query)
+        if 'outage' in query:
+            raise ConnectionError("provider down")
+        return super().geocode(query)
+
+
+class GeocodingTests(TestCase):
+    """Places without coordinates are geocoded once per distinct address."""
+
+    def test_cache_hit_skips_the_provider(self):
+        first = make_place(name='Java House', address='Mama Ngina St')
+        make_place(name='Java House 2', address='  mama ngina  st ')
+        geocoder = CountingGeocoder()
+        self.assertEqual(geocode_missing_places(geocoder=geocoder), (2, 0))
+        self.assertEqual(geocoder.queries, ['mama ngina st, nairobi'])
+        first.refresh_from_db()
+        self.assertEqual((first.latitude, first.longitude), StubGeocoder().geocode('mama ngina st, nairobi'))
+        self.assertTrue(PlaceGridCell.objects.exists())
+
+        Place.objects.update(latitude=0, longitude=0)
+        geocoder = CountingGeocoder()
+        self.assertEqual(geocode_missing_places(geocoder=geocoder), (2, 0))
+        self.assertEqual(geocoder.queries, [])
+
+    def test_misses_are_cached_until_the_retry_window(self):
+        make_place(address='Nowhere Lane')
+        geocoder = CountingGeocoder()
+        self.assertEqual(geocode_missing_places(geocoder=geocoder), (0, 1))
+        self.assertEqual(geocode_missing_places(geocoder=geocoder), (0, 1))
+        self.assertEqual(len(geocoder.queries), 1)
+        self.assertIsNone(GeocodeResult.objects.get().latitude)
+
+        later = timezone.now() + timedelta(days=MISS_RETRY_DAYS + 1)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            geocode_missing_places(geocoder=geocoder)
+        self.assertEqual(len(geocoder.queries), 2)
+
+    def test_provider_errors_are_retried_next_run(self):
+        make_place(address='Outage Road')
+        geocoder = CountingGeocoder()
+        with self.assertLogs('places.geocoding', 'ERROR'):
+            self.assertEqual(geocode_missing_places(geocoder=geocoder), (0, 1))
+        self.assertFalse(GeocodeResult.objects.exists())
+        with self.assertLogs('places.geocoding', 'ERROR'):
+            geocode_missing_places(geocoder=geocoder)
+        self.assertEqual(len(geocoder.queries), 2)
+
+    def test_rate_limiter_spaces_calls(self):
+        clock = [100.0]
+        with mock.patch('places.geocoding.time.monotonic', side_effect=lambda: clock[0]), \
+                mock.patch('places.geocoding.time.sleep', side_effect=lambda seconds: clock.__setitem__(0, clock[0] + seconds)):
+            limiter = RateLimiter(4)
+            calls = []
+            for _ in range(5):
+                limiter.wait()
+                calls.append(clock[0])
+                clock[0] += 0.05  # The call itself takes a little time
+        self.assertEqual(calls, [100.0, 100.25, 100.5, 100.75, 101.0])
+
+    def test_geocoder_must_implement_geocode(self):
+        with self.assertRaises(TypeError):
+            Geocoder()
+
+
+class UpsertPlacesTests(TestCase):
+    """Refresh batches survive places disappearing under them."""
+
+    def record(self, osm_id, name, latitude=-1.2921):
+        return {
+            'osm_id': osm_id, 'name': name, 'latitude': latitude, 'longitude': 36.8219,
+            'address': '', 'place_type': 'hotel', 'cuisine': 'food',
+        }
+
+    def test_place_deleted_after_matching_is_skipped(self):
+        get_user_model().objects.create(id=1, username='owner')
+        gone = make_place(name='Gone', osm_id='node/1', latitude=-1.2921, longitude=36.8219)
+        kept = make_place(name='Kept', osm_id='node/2', latitude=-1.3, longitude=36.8219)
+        matcher = refresh.PlaceMatcher.for_area(['hotel'], -1.31, 36.8, -1.28, 36.83)
+        gone.delete()
+
+        created, updated = refresh.upsert_places(
+            [self.record('node/1', 'Gone, renamed'), self.record('node/2', 'Kept, renamed', -1.3),
+             self.record('node/3', 'New', -1.25)],
+            'Nairobi', matcher,
+        )
+        self.assertEqual((created, updated), (1, 1))
+        kept.refresh_from_db()
+        self.assertEqual(kept.name, 'Kept, renamed')
+        self.assertFalse(Place.objects.filter(osm_id='node/1').exists())
+        self.assertTrue(Place.objects.filter(osm_id='node/3', name='New').exists())
+
+
+class BundleWriteTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name)
+
+    def test_concurrent_writes_keep_their_own_temp_files(self):
+        path = self.root / 'pointer.json'
+        replace = os.replace
+        calls = []
+
+        def racing_replace(src, dst):
+            calls.append(src)
+            if len(calls) == 1:
+                # Another rebuild writes the same file before this one is renamed
+                _write_atomic(path, b'second')
+            replace(src, dst)
+
+        with mock.patch('places.bundles.os.replace', side_effect=racing_replace):
+            _write_atomic(path, b'first')
+        self.assertNotEqual(calls[0], calls[1])
+        self.assertEqual(path.read_bytes(), b'first')
+        self.assertEqual([p.name for p in self.root.iterdir()], ['pointer.json'])
+
+    def test_failed_write_leaves_no_temp_file(self):
+        with mock.patch('places.bundles.os.replace', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                _write_atomic(self.root / 'v1.json.gz', b'data')
+        self.assertEqual(list(self.root.iterdir()), [])
+
+
+
+def split(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class JsonArrayStreamTests(TestCase):
+    def collect(self, chunks, key='elements'):
+        """The items read before the stream ended or failed, and the error if any."""
+        items = []
+        try:
+            for item in iter_json_array(chunks, key):
+                items.append(item)
+        except ValueError as e:
+            return items, e
+        return items, None
+
+    def test_items_match_a_full_parse_at_any_chunk_size(self):
+        elements = [
+            {'type': 'node', 'id': 1, 'tags': {'name': 'A ] b', 'note': '{"elements": [1]}'}},
+            {'type': 'way', 'id': 22, 'nodes': [1, 2, [3, [4]]], 'geometry': [{'lat': -1.5, 'lon': 36.8}]},
+            12345, -0.5e3, 'text, with ] and }', [], {}, True, None,
+        ]
+        document = json.dumps({'elements': elements, 'remark': 'after the array'}, indent=1)
+        for size in (1, 2, 3, 7, 64, len(document)):
+            with self.subTest(size=size):
+                self.assertEqual(self.collect(split(document, size)), (elements, None))
+
+    def test_key_inside_items_is_not_the_array(self):
+        document = '{"features": [{"properties": {"features": "x"}, "id": 1}, {"id": 2}]}'
+        for size in (1, 5, len(document)):
+            items, _ = self.collect(split(document, size), 'features')
+            self.assertEqual(items, [{'properties': {'features': 'x'}, 'id': 1}, {'id': 2}])
+
+    def test_truncated_input_fails_after_the_complete_items(self):
+        document = '{"elements": [{"id": 1}, {"id": 2}, {"id": 3, "tags": {"na'
+        for size in (1, 4, len(document)):
+            items, error = self.collect(split(document, size))
+            self.assertEqual(items, [{'id': 1}, {'id': 2}])
+            self.assertIsInstance(error, ValueError)
+
+    def test_number_split_across_chunks(self):
+        self.assertEqual(self.collect(['{"elements": [1, 2', '3]}']), ([1, 23], None))
+        items, error = self.collect(['{"elements": [1, 2', '3'])
+        self.assertEqual(items, [1])
+        self.assertIsInstance(error, ValueError)
+
+    def test_missing_or_empty_array(self):
+        self.assertEqual(self.collect(split('{"remark": "none"}', 3)), ([], None))
+        self.assertEqual(self.collect(split('{"elements": [ ]}', 3)), ([], None))
+
+
+class SearchIndexTests(TestCase):
+    """The SQLite FTS index follows every kind of write to places_place."""
+
+    def found(self, term):
+        return sorted(search_places(Place.objects.all(), term).values_list('name', flat=True))
+
+    def assert_index_matches_places(self):
+        with connection.cursor() as cursor:
+            # Compares the index with places_place; raises on any difference
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('integrity-check', 1)")
+
+    def test_updates_move_the_indexed_text(self):
+        place = make_place(name='Savanna Lodge')
+        other = make_place(name='Acacia Camp', city='Mombasa')
+        self.assertEqual(self.found('savan'), ['Savanna Lodge'])
+
+        place.name = 'Baobab Lodge'
+        place.save()
+        Place.objects.filter(pk=other.pk).update(city='Kisumu')
+        self.assertEqual(self.found('savan'), [])
+        self.assertEqual(self.found('baob'), ['Baobab Lodge'])
+        self.assertEqual(self.found('mombasa'), [])
+        self.assertEqual(self.found('kisumu'), ['Acacia Camp'])
+
+        place.name, other.place_type = 'Mangrove Lodge', 'restaurant'
+        Place.objects.bulk_update([place, other], ['name', 'place_type'])
+        # Writes to unindexed columns leave the index alone
+        Place.objects.filter(pk=place.pk).update(price=120)
+        self.assertEqual(self.found('lodge'), ['Mangrove Lodge'])
+        self.assertEqual(self.found('restaurant kisumu'), ['Acacia Camp'])
+        self.assert_index_matches_places()
+
+    def test_deletes_leave_the_index(self):
+        places = [make_place(name=f'Coral Reef {n}') for n in range(3)]
+        places[0].delete()
+        self.assertEqual(self.found('coral'), ['Coral Reef 1', 'Coral Reef 2'])
+        Place.objects.filter(name='Coral Reef 1').delete()
+        self.assertEqual(self.found('coral'), ['Coral Reef 2'])
+        self.assert_index_matches_places()
+
+
+@override_settings(PLACES_REFRESH_WORKER=False)
+class FacetCountTests(TestCase):
+    places = [
+        # city, place_type, price, rating
+        ('Nairobi', 'hotel', 0, 0.0),
+        ('Nairobi', 'hotel', 499.99, 3.9),
+        ('Nairobi', 'hotel', 500, 4.0),
+        ('Nairobi', 'restaurant', 1250, 5.0),
+        ('Mombasa', 'hotel', 999, 4.5),
+        ('Mombasa', 'attraction', 20000, 2.2),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='browser', password='x')
+        for n, (city, place_type, price, rating) in enumerate(cls.places):
+            make_place(name=f'Place {n}', city=city, place_type=place_type, price=price, rating=rating)
+
+    def expected(self, rows, bucket):
+        """The facets counted one place at a time."""
+        def counts(values):
+            return sorted({value: values.count(value) for value in values}.items())
+        prices = [int(price // bucket) for _, _, price, _ in rows]
+        return {
+            'total': len(rows),
+            'place_types': counts([place_type for _, place_type, _, _ in rows]),
+            'cities': counts([city for city, _, _, _ in rows]),
+            'prices': [(b * bucket, (b + 1) * bucket, count) for b, count in counts(prices)],
+            'ratings': [(b, b + 1, count) for b, count in counts([min(int(rating), 4) for *_, rating in rows])],
+        }
+
+    def summary(self, facets):
+        return {
+            'total': facets['total'],
+            'place_types': sorted((f['value'], f['count']) for f in facets['place_types']),
+            'cities': sorted((f['value'], f['count']) for f in facets['cities']),
+            'prices': [(f['min'], f['max'], f['count']) for f in facets['price_histogram']['buckets']],
+            'ratings': [(f['min'], f['max'], f['count']) for f in facets['ratings']],
+        }
+
+    def test_counts_match_counting_each_place(self):
+        for bucket in (500, 1000, MIN_PRICE_BUCKET):
+            with self.subTest(bucket=bucket):
+                facets = compute_facets(Place.objects.all(), bucket)
+                self.assertEqual(facets['price_histogram']['bucket_size'], bucket)
+                self.assertEqual(self.summary(facets), self.expected(self.places, bucket))
+        # Sorted most common first
+        self.assertEqual(compute_facets(Place.objects.all())['place_types'][0], {'value': 'hotel', 'count': 4})
+
+    def test_endpoint_counts_the_filtered_places(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get('/api/places/facets/', {'city': 'nairobi', 'minPrice': 1, 'priceBucket': 1})
+        self.assertEqual(response.status_code, 200)
+        nairobi = [row for row in self.places if row[0] == 'Nairobi' and row[2] >= 1]
+        # Buckets narrower than MIN_PRICE_BUCKET are widened
+        self.assertEqual(self.summary(response.data), self.expected(nairobi, MIN_PRICE_BUCKET))
+
+        response = client.get('/api/places/facets/', {'city': 'nowhere'})
+        self.assertEqual(self.summary(response.data), {
+            'total': 0, 'place_types': [], 'cities': [], 'prices': [], 'ratings': [],
+        })
+
+
+@override_settings(PLACES_REFRESH_WORKER=False)
+class PlaceGridTests(TestCase):
+    """Incremental grid upkeep ends where a rebuild from scratch would."""
+
+    def grid(self):
+        return {
+            (cell.level, cell.x, cell.y, cell.place_type): (cell.count, round(cell.lat_sum, 6), round(cell.lon_sum, 6))
+            for cell in PlaceGridCell.objects.filter(count__gt=0)
+        }
+
+    def assert_grid_rebuilds_the_same(self):
+        incremental = self.grid()
+        rebuild_grid()
+        self.assertEqual(incremental, self.grid())
+
+    def test_saves_moves_and_deletes(self):
+        nairobi = [make_place(name=f'N{n}', latitude=-1.28 + n * 0.001, longitude=36.82) for n in range(3)]
+        mombasa = make_place(name='M', city='Mombasa', latitude=-4.04, longitude=39.66, place_type='restaurant')
+        unplaced = make_place(name='Nowhere')
+        self.assertEqual(PlaceGridCell.objects.get(level=0, place_type='hotel').count, 3)
+        self.assert_grid_rebuilds_the_same()
+
+        # Moved across the country, retyped, given a position, deleted
+        nairobi[0].latitude, nairobi[0].longitude = -0.09, 34.77
+        nairobi[0].save()
+        mombasa.place_type = 'attraction'
+        mombasa.save()
+        unplaced.latitude, unplaced.longitude = 0.52, 35.27
+        unplaced.save()
+        nairobi[1].delete()
+        Place.objects.filter(pk=nairobi[2].pk).delete()
+        self.assert_grid_rebuilds_the_same()
+        self.assertEqual(
+            sorted(PlaceGridCell.objects.filter(level=0, count__gt=0).values_list('place_type', 'count')),
+            [('attraction', 1), ('hotel', 2)],
+        )
+
+    def test_bulk_created_places(self):
+        places = Place.objects.bulk_create([
+            Place(name=f'B{n}', city='Kisumu', place_type='hotel', latitude=-0.1 + n * 0.01, longitude=34.75,
+                  created_by=None)
+            for n in range(5)
+        ])
+        add_to_grid(places)
+        self.assert_grid_rebuilds_the_same()
+
+    def test_clusters_follow_removals(self):
+        user = get_user_model().objects.create_user(username='mapper', password='x')
+        client = APIClient()
+        client.force_authenticate(user)
+        places = [make_place(name=f'C{n}', latitude=-1.28, longitude=36.8 + n * 0.001) for n in range(4)]
+        params = {'bbox': '-1.5,36.5,-1.0,37.0', 'zoom': 5}
+
+        clusters = client.get('/api/places/clusters/', params).data['clusters']
+        self.assertEqual([c['count'] for c in clusters], [4])
+        self.assertAlmostEqual(clusters[0]['longitude'], 36.8015)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            places[0].delete()
+            places[3].delete()
+        clusters = client.get('/api/places/clusters/', params).data['clusters']
+        self.assertEqual([(c['count'], c['types']) for c in clusters], [(2, {'hotel': 2})])
+        self.assertAlmostEqual(clusters[0]['longitude'], 36.8015)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Place.objects.all().delete()
+        self.assertEqual(client.get('/api/places/clusters/', params).data['clusters'], [])
+
+
+class ItineraryTests(TestCase):
+    def route_km(self, itinerary, route):
+        return sum(itinerary.distances[a, b] for a, b in zip(route, route[1:]))
+
+    def random_stops(self, rng, n, windows=False):
+        stops = []
+        for _ in range(n):
+            opens = closes = None
+            if windows and rng.random() < 0.5:
+                opens = rng.randrange(9 * 60, 15 * 60)
+                closes = opens + rng.randrange(60, 240)
+            stops.append(Stop(-1.35 + rng.random() * 0.2, 36.7 + rng.random() * 0.25, opens=opens, closes=closes))
+        return stops
+
+    def test_two_opt_untangles_nearest_neighbour(self):
+        # Along a road through the start, nearest first doubles back: 1 km east,
+        # 2.5 km west, then 5.5 km east again, where 1.5 west then 5.5 east will do
+        stops = [Stop(0.0, km / 111.195) for km in (1.0, -1.5, 4.0)]
+        itinerary = Itinerary(stops, start=(0.0, 0.0))
+        greedy = itinerary.nearest_neighbour()
+        self.assertEqual(list(greedy[1:-1]), [0, 1, 2])
+        improved = itinerary.two_opt(greedy)
+        self.assertEqual(list(improved[1:-1]), [1, 0, 2])
+        self.assertAlmostEqual(self.route_km(itinerary, greedy), 9.0, places=2)
+        self.assertAlmostEqual(self.route_km(itinerary, improved), 7.0, places=2)
+
+        visits, total_km, _ = optimise_itinerary(stops, start=(0.0, 0.0))
+        self.assertEqual([visit['stop'] for visit in visits], [stops[1], stops[0], stops[2]])
+        self.assertAlmostEqual(total_km, 7.0, places=2)
+
+    def test_two_opt_never_lengthens_and_leaves_no_improving_reversal(self):
+        rng = random.Random(7)
+        gains = []
+        for n in (5, 20, 60):
+            itinerary = Itinerary(self.random_stops(rng, n), start=(-1.28, 36.82))
+            greedy = itinerary.nearest_neighbour()
+            route = itinerary.two_opt(greedy)
+            self.assertEqual(sorted(route[1:-1]), list(range(n)))
+            self.assertEqual((route[0], route[-1]), (greedy[0], greedy[-1]))
+            length = self.route_km(itinerary, route)
+            gains.append(self.route_km(itinerary, greedy) - length)
+            for i in range(1, len(route) - 2):
+                for j in range(i + 1, len(route) - 1):
+                    reversed_route = np.concatenate([route[:i], route[i:j + 1][::-1], route[j + 1:]])
+                    self.assertGreaterEqual(self.route_km(itinerary, reversed_route), length - 1e-6)
+        self.assertTrue(all(gain >= -1e-9 for gain in gains))
+        self.assertGreater(max(gains), 0)
+
+    def test_time_windows_are_not_made_later(self):
+        rng = random.Random(11)
+        for n in (10, 40):
+            itinerary = Itinerary(self.random_stops(rng, n, windows=True), start=(-1.28, 36.82))
+            greedy = itinerary.nearest_neighbour()
+            route = itinerary.two_opt(greedy)
+            self.assertLessEqual(itinerary.timeline(route)[1][-1], itinerary.timeline(greedy)[1][-1] + 1e-6)
+            self.assertLessEqual(self.route_km(itinerary, route), self.route_km(itinerary, greedy) + 1e-9)
+
+    def test_small_itineraries(self):
+        self.assertEqual(Itinerary([]).optimise(), [])
+        self.assertEqual(Itinerary([Stop(-1.28, 36.82)]).optimise(), [0])
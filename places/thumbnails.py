@@ -0,0 +1,226 @@
+"""
+Place image thumbnails.
+
+Listings link to /api/thumbnails/<size>/<token>.webp instead of hotlinking
+full-size third-party images. The token is the image URL, signed so the
+endpoint only fetches URLs this server handed out. The first request for
+an image fetches it once, resizes it with Pillow and stores a WebP under
+MEDIA_ROOT/thumbnails; later requests are served from disk without a
+database query, with year-long cache headers since a URL's thumbnail
+never changes.
+
+Only http(s) images on public addresses are fetched: the host is resolved
+and refused if any of its addresses is private, loopback, link-local or
+otherwise not globally routable, and redirects are followed by hand, each
+hop checked the same way. PLACES_THUMBNAIL_HOSTS optionally narrows this to
+an allowlist of image hosts (and their subdomains).
+
+The directory is an LRU cache bounded by PLACES_THUMBNAIL_CACHE_MB: serving
+a thumbnail refreshes its file's mtime (at most hourly), and once the total
+size passes the bound the least recently used files are removed.
+"""
+import hashlib
+import io
+import ipaddress
+import logging
+import os
+import socket
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urljoin, urlsplit
+
+import requests
+from django.conf import settings
+from django.core import signing
+from django.urls import reverse
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_DIR = 'thumbnails'
+THUMBNAIL_SIZES = {'small': 160, 'medium': 480}  # Longest side, in pixels
+DEFAULT_THUMBNAIL_SIZE = 'medium'
+THUMBNAIL_QUALITY = 80
+
+DEFAULT_CACHE_MB = 512
+EVICT_TO = 0.9  # Eviction trims the cache to this fraction of its bound
+TOUCH_INTERVAL_SECONDS = 3600
+MAX_SOURCE_BYTES = 10 << 20
+FETCH_TIMEOUT_SECONDS = 10
+MAX_REDIRECTS = 3
+FETCH_SCHEMES = ('http', 'https')
+
+_SALT = 'places.thumbnail'
+_locks = {}
+_locks_guard = threading.Lock()
+_cache_bytes = None
+
+
+class ThumbnailError(Exception):
+    pass
+
+
+def thumbnail_token(image_url):
+    # No timestamp, so an image keeps one URL and client caches keep working
+    return signing.Signer(salt=_SALT).sign_object(image_url, compress=True)
+
+
+def thumbnail_url(image_url, size=DEFAULT_THUMBNAIL_SIZE):
+    """Path of the proxied thumbnail for an image URL, or None without an image."""
+    if not image_url:
+        return None
+    return reverse('place-thumbnail', kwargs={'size': size, 'token': thumbnail_token(image_url)})
+
+
+def image_url_from_token(token):
+    """The image URL a token was signed for; raises signing.BadSignature if forged."""
+    return signing.Signer(salt=_SALT).unsign_object(token)
+
+
+def cache_root():
+    return Path(settings.MEDIA_ROOT) / THUMBNAIL_DIR
+
+
+def thumbnail_path(image_url, size):
+    key = hashlib.sha256(image_url.encode()).hexdigest()
+    return cache_root() / key[:2] / f'{key}-{size}.webp'
+
+
+def get_thumbnail(image_url, size):
+    """Path to the cached thumbnail of an image, making it first if needed.
+
+    Raises ThumbnailError if the image can't be fetched or decoded.
+    """
+    path = thumbnail_path(image_url, size)
+    try:
+        touch(path)
+        return path
+    except FileNotFoundError:
+        pass
+
+    # Requests for the same missing thumbnail in this process wait for one fetch
+    with _locks_guard:
+        lock = _locks.setdefault(path, threading.Lock())
+    with lock:
+        try:
+            if not path.exists():
+                try:
+                    data = render_thumbnail(fetch_image(image_url), THUMBNAIL_SIZES[size])
+                except ThumbnailError as e:
+                    logger.warning("%s", e)
+                    raise
+                store(path, data)
+        finally:
+            with _locks_guard:
+                _locks.pop(path, None)
+    return path
+
+
+def touch(path):
+    """Mark a cached file as recently used; raises FileNotFoundError if it's gone."""
+    mtime = path.stat().st_mtime
+    if time.time() - mtime > TOUCH_INTERVAL_SECONDS:
+        os.utime(path)
+
+
+def check_source_url(url):
+    """Raise ThumbnailError unless `url` is http(s) on an allowed, public host."""
+    parts = urlsplit(url)
+    host = (parts.hostname or '').lower()
+    if parts.scheme not in FETCH_SCHEMES or not host:
+        raise ThumbnailError(f"Not fetching {url}: only http and https images are proxied")
+    allowed = getattr(settings, 'PLACES_THUMBNAIL_HOSTS', None)
+    if allowed and not any(host == name or host.endswith(f'.{name}') for name in allowed):
+        raise ThumbnailError(f"Not fetching {url}: {host} isn't an allowed image host")
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, parts.port or None, proto=socket.IPPROTO_TCP)}
+    except (socket.gaierror, UnicodeError, ValueError) as e:
+        raise ThumbnailError(f"Not fetching {url}: can't resolve {host}: {e}")
+    for address in addresses:
+        if not ipaddress.ip_address(address.split('%')[0]).is_global:
+            raise ThumbnailError(f"Not fetching {url}: {host} resolves to the non-public address {address}")
+
+
+def fetch_image(image_url):
+    url = image_url
+    try:
+        for _ in range(MAX_REDIRECTS + 1):
+            check_source_url(url)
+            with requests.get(url, timeout=FETCH_TIMEOUT_SECONDS, stream=True, allow_redirects=False) as res:
+                if res.is_redirect:
+                    url = urljoin(url, res.headers['Location'])
+                    continue
+                res.raise_for_status()
+                data = bytearray()
+                for chunk in res.iter_content(1 << 16):
+                    data += chunk
+                    if len(data) > MAX_SOURCE_BYTES:
+                        raise ThumbnailError(f"{image_url} is larger than {MAX_SOURCE_BYTES} bytes")
+                return bytes(data)
+    except requests.RequestException as e:
+        raise ThumbnailError(f"Fetching {image_url} failed: {e}")
+    raise ThumbnailError(f"Fetching {image_url} failed: more than {MAX_REDIRECTS} redirects")
+
+
+def render_thumbnail(data, longest_side):
+    """Resize image bytes to fit a square of `longest_side` pixels, as WebP bytes."""
+    try:
+        image = Image.open(io.BytesIO(data))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((longest_side, longest_side), Image.Resampling.LANCZOS)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        out = io.BytesIO()
+        image.save(out, 'WEBP', quality=THUMBNAIL_QUALITY, method=4)
+        return out.getvalue()
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise ThumbnailError(f"Can't make a thumbnail: {e}")
+
+
+def store(path, data):
+    global _cache_bytes
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+    if _cache_bytes is None:
+        _cache_bytes = sum(size for _, _, size in _cached_files())
+    else:
+        _cache_bytes += len(data)
+    limit = getattr(settings, 'PLACES_THUMBNAIL_CACHE_MB', DEFAULT_CACHE_MB) << 20
+    if _cache_bytes > limit:
+        evict(int(limit * EVICT_TO), keep=str(path))
+
+
+def _cached_files():
+    for entry in os.scandir(cache_root()):
+        if entry.is_dir():
+            for file in os.scandir(entry.path):
+                if file.name.endswith('.webp'):
+                    stat = file.stat()
+                    yield stat.st_mtime, file.path, stat.st_size
+
+
+def evict(target_bytes, keep=None):
+    """Remove the least recently used thumbnails until the cache is at most target_bytes.
+
+    `keep` is a path that is about to be served and must stay.
+    """
+    global _cache_bytes
+    files = sorted(_cached_files())
+    total = sum(size for _, _, size in files)
+    removed = 0
+    for _, path, size in files:
+        if total <= target_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    _cache_bytes = total
+    logger.info("Evicted %d thumbnails, %d bytes left", removed, total)
@@ -0,0 +1,103 @@
+"""
+Per-user activity timeline.
+
+One newest-first feed of a user's flight bookings, place bookings, payments
+and Paystack payments, so a dashboard needs one request instead of four.
+
+Each source is read in keyset order (timestamp, pk) descending, limit + 1
+rows past the cursor, with its related rows joined in; the pages are merged
+in Python and cut at `limit`. A page therefore costs one query per source
+however deep the user scrolls. Rows with the same timestamp are ordered by
+source, then pk, so the cursor (timestamp, source, pk) is a total order
+and nothing is skipped or repeated between pages.
+"""
+import base64
+import json
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from flights.models import FlightBooking
+from flights.serializers import FlightBookingSerializer
+from payments.models import Payment
+from payments.serializers import PaymentSerializer
+from paystack.models import PaystackPayment
+from paystack.serializers import PaystackPaymentSerializer
+
+from .models import Booking
+from .serializers import BookingSerializer
+
+DEFAULT_TIMELINE_PAGE = 20
+MAX_TIMELINE_PAGE = 100
+
+
+def timeline_sources(user):
+    """(kind, queryset, timestamp field, serializer) per source, in tie-break order."""
+    return [
+        ('flight_booking', FlightBooking.objects.filter(user=user).select_related('user'),
+         'created_at', FlightBookingSerializer),
+        ('booking', Booking.objects.filter(user=user).select_related('place'), 'created_at', BookingSerializer),
+        ('payment', Payment.objects.filter(user=user).select_related('place', 'user', 'booking'),
+         'timestamp', PaymentSerializer),
+        ('paystack_payment', PaystackPayment.objects.filter(user=user), 'created_at', PaystackPaymentSerializer),
+    ]
+
+
+def encode_cursor(moment, rank, pk):
+    payload = [moment.isoformat(), rank, pk if isinstance(pk, int) else str(pk)]
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode()
+
+
+def decode_cursor(value):
+    try:
+        moment, rank, pk = json.loads(base64.urlsafe_b64decode(value.encode()))
+        return datetime.fromisoformat(moment), int(rank), pk
+    except (ValueError, TypeError):
+        raise ValidationError({"cursor": "Invalid timeline cursor."})
+
+
+def _before(queryset, field, rank, position):
+    """Rows of the source ranked `rank` that come after `position` in newest-first order."""
+    if position is None:
+        return queryset
+    moment, position_rank, pk = position
+    if rank < position_rank:
+        return queryset.filter(**{f'{field}__lte': moment})
+    if rank > position_rank:
+        return queryset.filter(**{f'{field}__lt': moment})
+    return queryset.filter(Q(**{f'{field}__lt': moment}) | Q(**{field: moment, 'pk__lt': pk}))
+
+
+def timeline_response(request):
+    try:
+        limit = min(max(int(request.query_params.get('limit', DEFAULT_TIMELINE_PAGE)), 1), MAX_TIMELINE_PAGE)
+    except ValueError:
+        limit = DEFAULT_TIMELINE_PAGE
+    cursor = request.query_params.get('cursor')
+    position = decode_cursor(cursor) if cursor else None
+
+    sources = timeline_sources(request.user)
+    entries = []
+    for rank, (kind, queryset, field, _) in enumerate(sources):
+        rows = _before(queryset, field, rank, position).order_by(f'-{field}', '-pk')[:limit + 1]
+        entries.extend((getattr(row, field), rank, row.pk, row) for row in rows)
+    entries.sort(key=lambda entry: entry[:3], reverse=True)
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    # Serialize each source's rows together, then put them back in feed order
+    data = {}
+    for rank, (kind, _, _, serializer_class) in enumerate(sources):
+        rows = [entry[3] for entry in entries if entry[1] == rank]
+        data.update(zip(((rank, row.pk) for row in rows), serializer_class(rows, many=True).data))
+
+    return Response({
+        'results': [
+            {'type': sources[rank][0], 'timestamp': moment, 'item': data[rank, pk]}
+            for moment, rank, pk, _ in entries
+        ],
+        'next_cursor': encode_cursor(*entries[-1][:3]) if has_more else None,
+        'has_more': has_more,
+    })
@@ -1,30 +1,62 @@
 from django.urls import path
 from .views import (
     PlaceListView,
+    PlaceFacetsView,
+    PlaceClusterView,
+    TopPlacesView,
+    PlaceSyncView,
+    CityBundleView,
+    PlaceImportView,
+    ThumbnailView,
+    ItineraryView,
+    HotelAvailabilityView,
     PlaceDetailView,
     BookingCreateView,
+    BookingBasketView,
+    UserTimelineView,
     UserBookingsListAPIView,
     AdminBookingListUpdateView,
     AdminBookingUpdateView,
     UserBookingDetailAPIView,
     AdminBookingDeleteView,
-    PlaceListCreateView
+    PlaceListCreateView,
+    ReviewCreateView,
+    ReviewDetailView,
+    PlaceReviewListView,
 )
 
 urlpatterns = [
     # Public place views
     path('places/', PlaceListView.as_view(), name='place-list'),
+    path('places/facets/', PlaceFacetsView.as_view(), name='place-facets'),
+    path('places/clusters/', PlaceClusterView.as_view(), name='place-clusters'),
+    path('places/top/', TopPlacesView.as_view(), name='place-top'),
+    path('places/sync/', PlaceSyncView.as_view(), name='place-sync'),
+    path('places/bundles/<str:city>/', CityBundleView.as_view(), name='place-bundle'),
     path('places/<int:pk>/', PlaceDetailView.as_view(), name='place-detail'),
+    path('places/<int:pk>/reviews/', PlaceReviewListView.as_view(), name='place-reviews'),
+    path('itinerary/', ItineraryView.as_view(), name='itinerary'),
+    path('thumbnails/<str:size>/<str:token>.webp', ThumbnailView.as_view(), name='place-thumbnail'),
     path("place/", PlaceListCreateView.as_view(), name="place-list-create"),
     #path('places/search/', PlaceSearchView.as_view(), name='place-search'),
 
     # Booking endpoints for users
     path('bookings/', BookingCreateView.as_view(), name='create-booking'),
+    path('bookings/basket/', BookingBasketView.as_view(), name='booking-basket'),
+    path('hotels/availability/', HotelAvailabilityView.as_view(), name='hotel-availability'),
     path('bookings/my/', UserBookingsListAPIView.as_view(), name='user-bookings'),
+    path('timeline/', UserTimelineView.as_view(), name='user-timeline'),
     path('bookings/<int:pk>/', UserBookingDetailAPIView.as_view(), name='booking-detail'),
 
+    # Reviews of completed bookings
+    path('reviews/', ReviewCreateView.as_view(), name='create-review'),
+    path('reviews/<int:pk>/', ReviewDetailView.as_view(), name='review-detail'),
+
     # Admin-only booking management
     path('admin/bookings/', AdminBookingListUpdateView.as_view(), name='admin-booking-list'),
     path('admin/bookings/<int:pk>/', AdminBookingUpdateView.as_view(), name='admin-booking-update'),
     path('admin/bookings/<int:pk>/delete/', AdminBookingDeleteView.as_view(), name='admin-booking-delete'),
+
+    # Admin-only place imports
+    path('admin/places/import/', PlaceImportView.as_view(), name='admin-place-import'),
 ]
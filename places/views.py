@@ -1,167 +1,80 @@
-from rest_framework import generics, permissions, filters
+from rest_framework import generics, permissions, filters, status
+from rest_framework.filters import BaseFilterBackend
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.generics import RetrieveUpdateDestroyAPIView
 from django_filters.rest_framework import DjangoFilterBackend
-from django.utils import timezone
-from datetime import timedelta
-import requests
-import random
-import math
 import django_filters
 from rest_framework import generics, permissions
-from .models import Place, Booking
-from .serializers import PlaceSerializer, BookingSerializer, AdminBookingSerializer, BookingDetailSerializer
+from .models import Place, Booking, Review
+from .serializers import (
+    PlaceSerializer, BookingSerializer, AdminBookingSerializer, BookingDetailSerializer,
+    ItineraryRequestSerializer, HotelAvailabilitySerializer, ReviewSerializer, PlaceSyncSerializer,
+    PlaceImportSerializer, BookingBasketSerializer,
+)
 from rest_framework.generics import ListCreateAPIView
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from .refresh import DEFAULT_PLACE_IMAGE, get_freshness, record_demand
+from .search import PlaceSearchFilter, search_places
+from .facets import DEFAULT_PRICE_BUCKET, MIN_PRICE_BUCKET, compute_facets
+from .cache import LISTING_CACHE_SECONDS, cache_key
+from .clusters import clusters_in_bbox
+from .itinerary import Stop, optimise_itinerary
+from .inventory import RoomsUnavailable, available_hotels, release_rooms, reserve_rooms
+from .popularity import TOP_PLACES_SIZE, top_places
+from .sync import sync_response
+from .bundles import city_dir, city_slug, read_pointer
+from .imports import ImportFormatError, import_places, open_upload
+from .baskets import MAX_BASKET_SIZE, BasketUnavailable, create_basket
+from .timeline import timeline_response
+from .thumbnails import THUMBNAIL_SIZES, ThumbnailError, get_thumbnail, image_url_from_token, thumbnail_url
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+from django.core.cache import cache
+from rest_framework.settings import api_settings
+from rest_framework.parsers import MultiPartParser
+from payments.serializers import PaymentSerializer
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from django.http import FileResponse, HttpResponseNotModified, HttpResponseRedirect
+from django.core import signing
+from django.utils.http import parse_etags
+import gzip
 
-import os
-from dotenv import load_dotenv
-
-# Load environment variables from the .env file
-load_dotenv()
-
-# Access the Pexels API key from the environment
-PEXELS_API_KEY = os.getenv('PEXELS_API_KEY')
-
-CACHE_EXPIRY_DAYS = 7
-
-# Default image for consistent fallback
-DEFAULT_PLACE_IMAGE = 'https://images.pexels.com/photos/6267/menu-restaurant-vintage-table.jpg'
-
-# Category tags for OSM queries
-CATEGORY_TAGS = {
-    'hotel': [('tourism', 'hotel'), ('building', 'hotel')],
-    'restaurant': [('amenity', 'restaurant'), ('tourism', 'restaurant')],
-    'attraction': [('tourism', 'attraction'), ('leisure', 'park')],
-}
-
-# Price range configuration by place type (in KES - Kenyan Shillings)
-PRICE_RANGES = {
-    'hotel': (2500, 10000),      # Hotels: KES 6,500 - KES 65,000 per night
-    'restaurant': (800, 5000),   # Restaurants: KES 800 - KES 8,000 per meal
-    'attraction': (200, 2000),   # Attractions: KES 200 - KES 5,000 per entry
-    'default': (500, 10000)      # Default range for any other type
-}
-
-# Helper functions
-def haversine(lat1, lon1, lat2, lon2):
-    """Calculate the great circle distance between two points on Earth."""
-    R = 6371  # Earth radius in kilometers
-    phi1, phi2 = math.radians(lat1), math.radians(lat2)
-    delta_phi = math.radians(lat2 - lat1)
-    delta_lambda = math.radians(lon2 - lon1)
-
-    a = math.sin(delta_phi / 2)**2 + math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda / 2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
-
-def generate_random_price(place_type):
-    """Generate a random price based on place type in KES."""
-    min_price, max_price = PRICE_RANGES.get(place_type.lower(), PRICE_RANGES['default'])
-    return round(random.uniform(min_price, max_price), 0)  # Round to whole KES
-
-def generate_random_rating():
-    """Generate a random rating between 1.0 and 5.0."""
-    # Skew towards higher ratings (more realistic)
-    # Higher probability for ratings between 3.5-4.8
-    base_rating = random.uniform(2.5, 5.0)
-    # Apply some variance, but keep within 1-5 range
-    final_rating = min(5.0, max(1.0, base_rating + random.uniform(-0.5, 0.3)))
-    return round(final_rating, 1)
-
-def get_image_url(query, category='travel'):
-    """Get an image URL from Pexels API with fallback options."""
-    # Try Pexels API for category
-    headers = {"Authorization": PEXELS_API_KEY}
-    params = {"query": query, "per_page": 1}
-    print(f"📸 Querying Pexels for: {query} | Category: {category}")
-
-    # First, check if we should use default image to reduce API calls
-    if not PEXELS_API_KEY or random.random() < 0.2:  # 20% chance to use default to reduce API load
-        return DEFAULT_PLACE_IMAGE
-
-    try:
-        res = requests.get("https://api.pexels.com/v1/search", headers=headers, params=params, timeout=3)
-        if res.status_code == 200:
-            data = res.json()
-            if data.get('photos'):
-                return data['photos'][0]['src']['medium']
-            print(f"⚠️ No photos found for query: {query}")
-        else:
-            print(f"⚠️ Pexels API returned status code {res.status_code}")
-    except requests.exceptions.Timeout:
-        print(f"⚠️ Pexels API timeout for query: {query}")
-        return DEFAULT_PLACE_IMAGE
-    except Exception as e:
-        print(f"⚠️ Primary Pexels error: {e}")
-        return DEFAULT_PLACE_IMAGE  # Return default immediately on any error
-
-    # Use simpler fallback approach to reduce API calls
-    fallback_keywords = {
-        'hotel': ['luxury hotel', 'hotel room'],
-        'restaurant': ['restaurant', 'dining'],
-        'attraction': ['attraction', 'landmark'],
-        'travel': ['travel', 'vacation']
-    }
-    
-    # Only try one fallback with short timeout
-    try:
-        fallback_query = random.choice(fallback_keywords.get(category, ['travel']))
-        print(f"🔄 Trying fallback query: {fallback_query}")
-        
-        res = requests.get("https://api.pexels.com/v1/search", 
-                          headers=headers, 
-                          params={"query": fallback_query, "per_page": 1}, 
-                          timeout=2)  # Shorter timeout for fallback
-        
-        if res.status_code == 200:
-            fallback_data = res.json()
-            if fallback_data.get('photos'):
-                return fallback_data['photos'][0]['src']['medium']
-    except Exception:
-        pass  # Silently fail on fallback
-    
-    # Last resort placeholder
-    return DEFAULT_PLACE_IMAGE
-
-def get_city_bbox_from_nominatim(city_name):
-    """Get bounding box coordinates for a city using Nominatim."""
-    try:
-        res = requests.get("https://nominatim.openstreetmap.org/search", params={
-            "q": city_name,
-            "format": "json",
-            "limit": 1
-        }, headers={"User-Agent": "TravelCompanionApp/1.0"})
-        res.raise_for_status()
-        data = res.json()
-
-        if data:
-            bbox = data[0]["boundingbox"]
-            return {
-                "south": float(bbox[0]),
-                "north": float(bbox[1]),
-                "west": float(bbox[2]),
-                "east": float(bbox[3])
-            }
-    except Exception as e:
-        print(f"❌ Error getting city bounding box: {e}")
-
-    return None
 
 # Filter definitions
 class PlaceFilter(django_filters.FilterSet):
     city = django_filters.CharFilter(field_name='city', lookup_expr='icontains')
-    place_type = django_filters.CharFilter(field_name='place_type', lookup_expr='exact')
-    type = django_filters.CharFilter(field_name='place_type', lookup_expr='exact')  # Alias for place_type
+    place_type = django_filters.CharFilter(field_name='place_type', lookup_expr='iexact')
+    type = django_filters.CharFilter(field_name='place_type', lookup_expr='iexact')  # Alias for place_type
     name = django_filters.CharFilter(field_name='name', lookup_expr='icontains')
 
     class Meta:
         model = Place
         fields = ['city', 'place_type', 'name']
 
+class PlacePriceFilter(BaseFilterBackend):
+    """Apply the minPrice/maxPrice query parameters, ignoring invalid values."""
+
+    def filter_queryset(self, request, queryset, view):
+        filters_min_price = request.query_params.get('minPrice')
+        filters_max_price = request.query_params.get('maxPrice')
+
+        if filters_min_price:
+            try:
+                queryset = queryset.filter(price__gte=float(filters_min_price))
+            except ValueError:
+                pass
+
+        if filters_max_price:
+            try:
+                queryset = queryset.filter(price__lte=float(filters_max_price))
+            except ValueError:
+                pass
+
+        return queryset
+
 # Pagination classes
 class PlaceResultsPagination(PageNumberPagination):
     page_size = 10
@@ -172,129 +85,22 @@ class PlaceResultsPagination(PageNumberPagination):
 class PlaceListView(generics.ListAPIView):
     serializer_class = PlaceSerializer
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = (DjangoFilterBackend, filters.SearchFilter)
+    filter_backends = (DjangoFilterBackend, PlaceSearchFilter, PlacePriceFilter, filters.OrderingFilter)
     filterset_class = PlaceFilter
-    search_fields = ['name', 'city', 'place_type']
+    ordering_fields = ['rating', 'review_count', 'price']
     pagination_class = None
 
     def get_queryset(self):
-        """Apply filters and ensure consistent ordering."""
-        # Start with ordered base queryset
-        queryset = Place.objects.all().order_by('id')
-
-        # Handle both 'type' and 'place_type' parameters
-        place_type = self.request.query_params.get('type') or self.request.query_params.get('place_type')
-        if place_type:
-            print(f"Filtering by place_type: {place_type}")
-            queryset = queryset.filter(place_type__iexact=place_type)
-
-        # Apply city filter if provided
-        city = self.request.query_params.get('city')
-        if city:
-            print(f"Filtering by city: {city}")
-            queryset = queryset.filter(city__icontains=city)
-
-        # Check if we need to refresh data
-        refresh = self.request.query_params.get('refresh', 'false').lower() == 'true'
-        if refresh and (place_type or city or self.request.query_params.get('lat')):
-            try:
-                if place_type:
-                    self._refresh_place_data(place_type, city)
-                else:
-                    for pt in CATEGORY_TAGS.keys():
-                        self._refresh_place_data(pt, city)
-                
-                queryset = Place.objects.all().order_by('id')
-                if place_type:
-                    queryset = queryset.filter(place_type__iexact=place_type)
-                if city:
-                    queryset = queryset.filter(city__icontains=city)
-            except Exception as e:
-                print(f"Error refreshing data: {e}")
-
-        # For places with no price or rating, generate and save them
-        for place in queryset.all():  # Use .all() to evaluate the query once
-            updated = False
-            if place.price is None or place.price == 0:
-                place.price = generate_random_price(place.place_type)
-                updated = True
-            if place.rating is None or place.rating == 0:
-                place.rating = generate_random_rating()
-                updated = True
-            if place.image_url is None or place.image_url == "":
-                if place.place_type == 'restaurant':
-                    cuisine = getattr(place, 'cuisine', 'food')
-                    search_term = f"{cuisine} restaurant food"
-                else:
-                    search_term = f"{place.name} {place.place_type}"
-                place.image_url = get_image_url(search_term, place.place_type)
-                updated = True
-            if updated:
-                place.save()
-
-        # Get count for logging
-        result_count = queryset.count()
-        print(f"Query returned {result_count} places")
-        
-        # Apply price filters in memory to preserve the QuerySet
-        filters_min_price = self.request.query_params.get('minPrice')
-        filters_max_price = self.request.query_params.get('maxPrice')
-        
-        # We'll store need_filter flag to know if we need client-side filtering
-        need_filter = False
-        min_price = None
-        max_price = None
-        
-        if filters_min_price:
-            try:
-                min_price = float(filters_min_price)
-                need_filter = True
-            except ValueError:
-                pass
-                
-        if filters_max_price:
-            try:
-                max_price = float(filters_max_price)
-                need_filter = True
-            except ValueError:
-                pass
-
-        # Log the limit (but don't apply it yet)
-        limit = self.request.query_params.get('limit')
-        try:
-            limit = int(limit) if limit is not None else 10
-            print(f"Will limit results to {limit} places")
-        except ValueError:
-            limit = 10
-            print("Invalid limit parameter, defaulting to 10.")
-        
+        """Return the ordered base queryset; PlaceFilter applies type and city."""
         # Return the queryset (still a QuerySet object, not a list)
         # This will be further processed by the filter backends
-        return queryset
+        return Place.objects.all().order_by('id')
 
     def filter_queryset(self, queryset):
-        """Override filter_queryset to handle price filtering and limiting after other filters"""
+        """Override filter_queryset to apply the limit after all filter backends"""
         # Apply standard filter backends first (will preserve QuerySet)
         queryset = super().filter_queryset(queryset)
-        
-        # Now apply manual price filtering if needed
-        filters_min_price = self.request.query_params.get('minPrice')
-        filters_max_price = self.request.query_params.get('maxPrice')
-        
-        if filters_min_price:
-            try:
-                min_price = float(filters_min_price)
-                queryset = queryset.filter(price__gte=min_price)
-            except ValueError:
-                pass
-                
-        if filters_max_price:
-            try:
-                max_price = float(filters_max_price)
-                queryset = queryset.filter(price__lte=max_price)
-            except ValueError:
-                pass
-        
+
         # Apply limit at the very end, only for the final result
         limit = self.request.query_params.get('limit')
         try:
@@ -305,143 +111,296 @@ class PlaceListView(generics.ListAPIView):
         # Now we can safely slice, as this is the last operation
         return queryset[:limit]
 
-    def _refresh_place_data(self, place_type, city=None):
-        """Internal method to refresh place data from external sources."""
-        print(f"Attempting to refresh {place_type} data for {city or 'unknown location'}")
-
-        # Limit refreshes to prevent overload
-        MAX_RECORDS_TO_PROCESS = 15  # Process max 15 places per request
-        
-        # City bounding box overrides (centered downtown areas)
-        CITY_BBOX_OVERRIDES = {
-            "new york": {"south": 40.70, "north": 40.75, "west": -74.01, "east": -73.97},
-            "toronto": {"south": 43.64, "north": 43.66, "west": -79.39, "east": -79.37},
-        }
+    def list(self, request, *args, **kwargs):
+        # Handle both 'type' and 'place_type' parameters
+        place_type = request.query_params.get('type') or request.query_params.get('place_type')
+        city = request.query_params.get('city')
 
-        bbox = None
+        # Record demand for this segment; stale or explicitly refreshed data is
+        # fetched by the background worker, never inside the request. Only a
+        # signed-in caller can ask for a city nobody has listed before.
+        refresh = request.query_params.get('refresh', 'false').lower() == 'true' and request.user.is_authenticated
         if city:
-            city_lower = city.strip().lower()
-            if city_lower in CITY_BBOX_OVERRIDES:
-                bbox = CITY_BBOX_OVERRIDES[city_lower]
-                print(f"Using custom bounding box for {city}")
-            else:
-                try:
-                    bbox = get_city_bbox_from_nominatim(city)
-                except Exception as e:
-                    print(f"Error getting city bbox: {e}")
-                    return
-                    
-                if not bbox:
-                    print(f"Could not get bbox for city: {city}")
-                    return
+            record_demand(city, place_type, force=refresh)
+
+        # Serve hot listings straight from the cache; any place write bumps
+        # the generation in the key
+        key = cache_key('list', request.query_params)
+        cached = cache.get(key)
+        if cached is None:
+            response = super().list(request, *args, **kwargs)
+
+            # Tell clients how current the listing is so they can show a hint
+            # while the background refresh catches up
+            freshness, last_refreshed = get_freshness(city, place_type)
+            headers = {'X-Data-Freshness': freshness}
+            if last_refreshed:
+                headers['X-Data-Last-Refreshed'] = last_refreshed.isoformat()
+            cached = (list(response.data), headers)
+            cache.set(key, cached, LISTING_CACHE_SECONDS)
+
+        data, headers = cached
+        return Response(data, headers=headers)
+
+
+class PlaceFacetsView(generics.GenericAPIView):
+    """
+    Facet counts for the current place filters: per type, per city, a price
+    histogram and rating buckets, computed in one grouped query.
+    Accepts the same filters as PlaceListView plus priceBucket (KES).
+    """
+    queryset = Place.objects.all()
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = (DjangoFilterBackend, PlacePriceFilter)
+    filterset_class = PlaceFilter
 
-                # Shrink large bounding boxes to reduce Overpass load
-                lat_range = float(bbox["north"]) - float(bbox["south"])
-                lon_range = float(bbox["east"]) - float(bbox["west"])
-                if lat_range > 0.3 or lon_range > 0.3:
-                    print("Shrinking large bounding box")
-                    shrink_factor = 0.05
-                    bbox["south"] = float(bbox["south"]) + shrink_factor
-                    bbox["north"] = float(bbox["north"]) - shrink_factor
-                    bbox["west"] = float(bbox["west"]) + shrink_factor
-                    bbox["east"] = float(bbox["east"]) - shrink_factor
-        else:
-            return  # No location info
+    CACHE_SECONDS = 300
+
+    def get(self, request, *args, **kwargs):
+        try:
+            price_bucket = max(int(request.query_params.get('priceBucket', DEFAULT_PRICE_BUCKET)), MIN_PRICE_BUCKET)
+        except ValueError:
+            price_bucket = DEFAULT_PRICE_BUCKET
+
+        key = cache_key(f'facets:{price_bucket}', request.query_params, ignore={'limit', 'priceBucket'})
+        data = cache.get(key)
+        if data is None:
+            queryset = self.filter_queryset(self.get_queryset())
+            term = request.query_params.get(api_settings.SEARCH_PARAM)
+            if term:
+                queryset = queryset.filter(pk__in=search_places(Place.objects.all(), term).values('pk'))
+            data = compute_facets(queryset, price_bucket)
+            cache.set(key, data, self.CACHE_SECONDS)
+        return Response(data)
+
+
+class TopPlacesView(APIView):
+    """
+    The most popular places of a type in a city, by decayed booking and payment activity.
+    Query params: city, type (or place_type), limit (at most TOP_PLACES_SIZE).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        city = request.query_params.get('city')
+        place_type = (request.query_params.get('type') or request.query_params.get('place_type') or '').lower()
+        if not city or place_type not in dict(Place.PLACE_TYPES):
+            return Response({"error": "city and a valid type are required"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), TOP_PLACES_SIZE)
+        except ValueError:
+            limit = 10
 
-        tags = CATEGORY_TAGS.get(place_type, [('tourism', place_type)])
+        results = []
+        for place, popularity in top_places(city, place_type, limit):
+            data = PlaceSerializer(place).data
+            # Stored scores are epoch-scaled; report today's decayed value
+            data['popularity'] = round(popularity, 3)
+            results.append(data)
+        return Response(results)
+
+
+class CityBundleView(APIView):
+    """
+    Download a city's offline bundle: every place and its image metadata as one
+    gzip-compressed JSON file. Served from disk with a strong ETag, so a
+    download (or a 304 revalidation) runs no database queries.
+    """
+    # Validate the token without loading the user row
+    authentication_classes = [JWTStatelessUserAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
 
-        # Build Overpass query
-        query_parts = []
-        for key, value in tags:
-            query_parts.append(f"""
-                node["{key}"="{value}"]({bbox['south']},{bbox['west']},{bbox['north']},{bbox['east']});
-                way["{key}"="{value}"]({bbox['south']},{bbox['west']},{bbox['north']},{bbox['east']});
-            """)
-        query = f"[out:json];({''.join(query_parts)});out center;"
+    def get(self, request, city, *args, **kwargs):
+        pointer = read_pointer(city)
+        if pointer is None:
+            return Response({"error": "No offline bundle for this city"}, status=status.HTTP_404_NOT_FOUND)
+
+        # Clients that can't take gzip get the same bundle decompressed, under its own ETag
+        compressed = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+        etag = f'"{pointer["etag"]}"' if compressed else f'"{pointer["etag"]}-identity"'
+        headers = {
+            'ETag': etag,
+            'Cache-Control': 'private, no-cache',
+            'Vary': 'Accept-Encoding, Authorization',
+            'X-Bundle-Version': str(pointer['version']),
+        }
+        if_none_match = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+        if etag in if_none_match or '*' in if_none_match:
+            response = HttpResponseNotModified()
+        else:
+            try:
+                body = open(city_dir(city_slug(city)) / pointer['file'], 'rb')
+            except FileNotFoundError:
+                return Response({"error": "No offline bundle for this city"}, status=status.HTTP_404_NOT_FOUND)
+            if compressed:
+                response = FileResponse(body, content_type='application/json')
+                response['Content-Encoding'] = 'gzip'
+                response['Content-Length'] = pointer['size']
+            else:
+                response = FileResponse(gzip.GzipFile(fileobj=body), content_type='application/json')
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+
+class ThumbnailView(APIView):
+    """
+    Resized WebP thumbnail of a place image, from the URLs listings hand out
+    (see places.thumbnails). Cached on disk after the first fetch; if the
+    image can't be fetched the client is redirected to the placeholder image.
+    """
+    # Image tags send no credentials; the signed token is what's checked
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, size, token, *args, **kwargs):
+        if size not in THUMBNAIL_SIZES:
+            return Response({"error": "Unknown thumbnail size"}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            image_url = image_url_from_token(token)
+        except signing.BadSignature:
+            return Response({"error": "Unknown image"}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            path = get_thumbnail(image_url, size)
+        except ThumbnailError:
+            # Never redirect to the stored URL itself, it may point anywhere
+            return HttpResponseRedirect(DEFAULT_PLACE_IMAGE)
+
+        response = FileResponse(open(path, 'rb'), content_type='image/webp')
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+        return response
+
+
+class PlaceClusterView(APIView):
+    """
+    Pre-aggregated map clusters for a viewport.
+    Query params: bbox=south,west,north,east (degrees), zoom (web map zoom
+    level) and optionally type. Returns one cluster per non-empty grid cell
+    with its count, centroid and per-type breakdown.
+    """
+    permission_classes = [permissions.IsAuthenticated]
 
+    def get(self, request, *args, **kwargs):
         try:
-            osm_res = requests.get("https://overpass-api.de/api/interpreter", params={"data": query}, timeout=10)
-            osm_res.raise_for_status()
-            elements = osm_res.json().get("elements", [])
-            print(f"Found {len(elements)} OSM elements")
-
-            # Limit processing to prevent timeout
-            if len(elements) > MAX_RECORDS_TO_PROCESS:
-                print(f"Limiting processing to {MAX_RECORDS_TO_PROCESS} elements")
-                elements = elements[:MAX_RECORDS_TO_PROCESS]
-
-            now = timezone.now()
-            created_count = 0
-            updated_count = 0
-
-            for el in elements:
-                tags = el.get("tags", {})
-                name = tags.get("name", "Unnamed")
-                lat = el.get("lat") or el.get("center", {}).get("lat")
-                lon = el.get("lon") or el.get("center", {}).get("lon")
-                address = tags.get("addr:full") or tags.get("addr:street", "")
-
-                if not lat or not lon:
-                    continue
-
-                existing_places = Place.objects.filter(
-                    place_type=place_type,
-                    latitude__range=(lat - 0.0001, lat + 0.0001),
-                    longitude__range=(lon - 0.0001, lon + 0.0001)
-                )
-
-                cuisine = tags.get("cuisine", "food")
-                search_term = f"{name} {cuisine} {place_type}"
-                
-                # Generate random price and rating first
-                price = generate_random_price(place_type)
-                rating = generate_random_rating()
-                
-                # Only fetch new image if we don't have one already
-                image_url = DEFAULT_PLACE_IMAGE
-                if not existing_places.exists() or not existing_places.first().image_url:
-                    image_url = get_image_url(search_term, place_type)
-
-                if existing_places.exists():
-                    place = existing_places.first()
-                    if place.name != name and name != "Unnamed":
-                        place.name = name
-                    if place.address != address and address:
-                        place.address = address
-                    place.last_updated = now
-                    # Only update image if we don't have one or it's default
-                    if not place.image_url or place.image_url == DEFAULT_PLACE_IMAGE:
-                        place.image_url = image_url
-                    place.price = price
-                    place.rating = rating
-                    place.save()
-                    updated_count += 1
-                else:
-                    Place.objects.create(
-                        name=name,
-                        latitude=lat,
-                        longitude=lon,
-                        address=address,
-                        place_type=place_type,
-                        city=city,
-                        image_url=image_url,
-                        last_updated=now,
-                        price=price,
-                        rating=rating
-                    )
-                    created_count += 1
+            south, west, north, east = (float(v) for v in request.query_params.get('bbox', '').split(','))
+            zoom = int(request.query_params.get('zoom', ''))
+        except ValueError:
+            return Response(
+                {"error": "bbox=south,west,north,east and an integer zoom are required"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180):
+            return Response({"error": "Invalid bbox"}, status=status.HTTP_400_BAD_REQUEST)
+
+        place_type = request.query_params.get('type') or request.query_params.get('place_type')
+        key = cache_key('clusters', request.query_params)
+        data = cache.get(key)
+        if data is None:
+            data = clusters_in_bbox(south, west, north, east, zoom, [place_type.lower()] if place_type else None)
+            cache.set(key, data, LISTING_CACHE_SECONDS)
+        return Response(data)
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute if value is not None else None
+
+
+def _clock(minutes):
+    minutes = int(round(minutes))
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+class ItineraryView(APIView):
+    """
+    Order a day's stops to keep travel short, respecting optional opening times.
+    POST {"stops": [{"place": id, "duration": 60, "opens": "10:00", "closes": "17:00"}, ...],
+          "start_latitude": .., "start_longitude": .., "start_time": "09:00", "speed_kmh": 25}
+    """
+    permission_classes = [permissions.IsAuthenticated]
 
-            print(f"Created {created_count} new places, updated {updated_count} existing places")
+    def post(self, request, *args, **kwargs):
+        serializer = ItineraryRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        places = Place.objects.in_bulk({stop['place'] for stop in data['stops']})
+        missing = sorted({stop['place'] for stop in data['stops']} - places.keys())
+        if missing:
+            return Response({"error": "Unknown places", "places": missing}, status=status.HTTP_400_BAD_REQUEST)
+
+        stops = [
+            Stop(
+                places[stop['place']].latitude, places[stop['place']].longitude,
+                duration=stop['duration'], opens=_minutes(stop.get('opens')),
+                closes=_minutes(stop.get('closes')), ref=places[stop['place']],
+            )
+            for stop in data['stops']
+        ]
+        start = (data['start_latitude'], data['start_longitude']) if 'start_latitude' in data else None
+        visits, total_km, total_late = optimise_itinerary(
+            stops, start, start_minutes=_minutes(data['start_time']), speed_kmh=data['speed_kmh']
+        )
+
+        return Response({
+            'stops': [
+                {
+                    'place': visit['stop'].ref.id,
+                    'name': visit['stop'].ref.name,
+                    'place_type': visit['stop'].ref.place_type,
+                    'latitude': visit['stop'].latitude,
+                    'longitude': visit['stop'].longitude,
+                    'distance_km': visit['distance_km'],
+                    'arrival': _clock(visit['arrival']),
+                    'wait_minutes': visit['wait_minutes'],
+                    'departure': _clock(visit['departure']),
+                    'late_minutes': visit['late_minutes'],
+                }
+                for visit in visits
+            ],
+            'total_distance_km': round(total_km, 3),
+            'total_late_minutes': round(total_late),
+            'finish': _clock(visits[-1]['departure']),
+        })
+
+
+class PlaceSyncView(APIView):
+    """
+    Places created, changed or deleted since a sync cursor.
+    Query params: cursor (from the previous response; omit for a full sync), limit.
+    """
+    permission_classes = [permissions.IsAuthenticated]
 
-        except requests.exceptions.Timeout:
-            print("Timeout error when fetching OSM data")
-        except Exception as e:
-            print(f"Error fetching/processing OSM data: {e}")
+    def get(self, request, *args, **kwargs):
+        return sync_response(request, Place.objects.all(), 'place', PlaceSyncSerializer)
+
+
+class PlaceImportView(APIView):
+    """
+    Bulk-import places from an uploaded CSV or JSONL file (multipart field "file").
+    Rows need external_key, name, city and place_type; existing external keys are
+    skipped, and re-uploading a file resumes or repeats its import harmlessly.
+    Optional field: format (csv or jsonl, otherwise taken from the file name).
+    Uploads named .gz or .bz2 are decompressed.
+    """
+    permission_classes = [IsAdminUser]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request, *args, **kwargs):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"error": "Upload the import as a 'file' field"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            job = import_places(open_upload(upload), upload.name, request.data.get('format'), user=request.user)
+        except ImportFormatError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(PlaceImportSerializer(job).data)
 
 
 class PlaceListCreateView(ListCreateAPIView):
     serializer_class = PlaceSerializer
     permission_classes = [IsAdminUser]  
+    filter_backends = [filters.OrderingFilter]
+    ordering_fields = ['rating', 'review_count', 'price']
     
     def get_queryset(self):
         queryset = Place.objects.all()
@@ -452,7 +411,7 @@ class PlaceListCreateView(ListCreateAPIView):
         if city:
             queryset = queryset.filter(city__iexact=city)
         if type_:
-            queryset = queryset.filter(type__iexact=type_)
+            queryset = queryset.filter(place_type__iexact=type_)
         if local_only:
             queryset = queryset.filter(osm_id__isnull=True)  
             
@@ -472,29 +431,155 @@ class BookingCreateView(generics.CreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        place = serializer.validated_data['place']
+        with transaction.atomic():
+            held = False
+            if place.place_type == 'hotel':
+                # Take the rooms in the booking's transaction so a failed save
+                # gives them back
+                try:
+                    held = reserve_rooms(
+                        place, serializer.validated_data.get('room_type'),
+                        serializer.validated_data['check_in'], serializer.validated_data['check_out'],
+                    )
+                except RoomsUnavailable:
+                    raise ValidationError({"room_type": "No rooms of this type are free for the selected dates."})
+            serializer.save(user=self.request.user, inventory_held=held)
+
+class BookingBasketView(APIView):
+    """
+    Book several places at once, all or nothing.
+    Body: {"bookings": [booking, ...], "payment_method": "mpesa" | "visa"}.
+    With a payment_method, one pending payment covers the whole basket.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        # Load every referenced place once; items are validated against these rows
+        place_ids = set()
+        items = request.data.get('bookings')
+        if isinstance(items, list):
+            for item in items[:MAX_BASKET_SIZE]:
+                try:
+                    place_ids.add(int(item.get('place')))
+                except (AttributeError, TypeError, ValueError):
+                    pass
+        serializer = BookingBasketSerializer(
+            data=request.data, context={'request': request, 'places': Place.objects.in_bulk(place_ids)}
+        )
+        serializer.is_valid(raise_exception=True)
+        try:
+            bookings, payment = create_basket(
+                request.user, serializer.validated_data['bookings'], serializer.validated_data.get('payment_method')
+            )
+        except BasketUnavailable as e:
+            raise ValidationError({'bookings': e.errors})
+        data = {'bookings': BookingSerializer(bookings, many=True).data}
+        if payment:
+            data['payment'] = PaymentSerializer(payment).data
+        return Response(data, status=status.HTTP_201_CREATED)
+
+class UserTimelineView(APIView):
+    """
+    The user's flight bookings, place bookings and payments as one newest-first feed.
+    Query params: limit, cursor (next_cursor of the previous page).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        return timeline_response(request)
+
+class HotelAvailabilityView(APIView):
+    """
+    Hotels in a city with rooms free for every night of a stay.
+    Query params: city, check_in, check_out (YYYY-MM-DD), room_type, rooms.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        serializer = HotelAvailabilitySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        results = available_hotels(
+            data['city'], data['check_in'], data['check_out'], data.get('room_type'), data['rooms']
+        )
+        return Response([
+            {
+                'place': row['place_id'],
+                'name': row['place__name'],
+                'address': row['place__address'],
+                'image_url': row['place__image_url'],
+                'thumbnail_url': thumbnail_url(row['place__image_url']),
+                'price': row['place__price'],
+                'rating': row['place__rating'],
+                'room_type': row['room_type'],
+                'available': row['available'],
+            }
+            for row in results
+        ])
+
+# Booking serializers read a few place and user columns through source=
+# lookups; load those with the booking in one joined query, and nothing else
+BOOKING_COLUMNS = [field.name for field in Booking._meta.concrete_fields]
+ADMIN_BOOKING_RELATED = ['user__username', 'user__email', 'place__name', 'place__place_type']
+USER_BOOKING_RELATED = ['place__name', 'place__location', 'place__place_type']
+BOOKING_DETAIL_RELATED = ['place__name', 'place__place_type', 'place__image_url']
+
+
+def bookings_with(related_columns):
+    """Bookings joined to exactly the related columns a serializer reads."""
+    relations = {column.split('__')[0] for column in related_columns}
+    return Booking.objects.select_related(*relations).only(*BOOKING_COLUMNS, *related_columns)
+
 
 class AdminBookingListUpdateView(generics.ListAPIView):
-    queryset = Booking.objects.all().order_by('-booking_date')
+    queryset = bookings_with(ADMIN_BOOKING_RELATED).order_by('-booking_date', '-id')
     serializer_class = AdminBookingSerializer
     permission_classes = [permissions.IsAdminUser]
 
 class AdminBookingUpdateView(generics.RetrieveUpdateAPIView):
-    queryset = Booking.objects.all()
+    queryset = bookings_with(ADMIN_BOOKING_RELATED)
     serializer_class = AdminBookingSerializer
     permission_classes = [permissions.IsAdminUser]
 
+    def perform_update(self, serializer):
+        booking, data = serializer.instance, serializer.validated_data
+        cancelled = data.get('status', booking.status) == 'cancelled'
+        stay_changed = any(
+            field in data and data[field] != getattr(booking, field) for field in ('room_type', 'check_in', 'check_out')
+        )
+        with transaction.atomic():
+            if booking.inventory_held and (cancelled or stay_changed):
+                # Give back the old stay's rooms; a changed stay takes its new nights
+                release_rooms(booking)
+                if not cancelled:
+                    try:
+                        held = reserve_rooms(
+                            booking.place, data.get('room_type', booking.room_type),
+                            data.get('check_in', booking.check_in), data.get('check_out', booking.check_out),
+                        )
+                    except RoomsUnavailable:
+                        raise ValidationError({"room_type": "No rooms of this type are free for the selected dates."})
+                    serializer.save(inventory_held=held)
+                    return
+            serializer.save()
+
 class AdminBookingDeleteView(generics.DestroyAPIView):
     queryset = Booking.objects.all()
     serializer_class = AdminBookingSerializer
     permission_classes = [permissions.IsAdminUser]
 
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            release_rooms(instance)
+            instance.delete()
+
 class UserBookingsListAPIView(generics.ListAPIView):
     serializer_class = BookingSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Booking.objects.filter(user=self.request.user).order_by('-booking_date')
+        return bookings_with(USER_BOOKING_RELATED).filter(user=self.request.user).order_by('-booking_date', '-id')
 
 class UserBookingDetailAPIView(generics.RetrieveAPIView):
     serializer_class = BookingDetailSerializer
@@ -502,4 +587,24 @@ class UserBookingDetailAPIView(generics.RetrieveAPIView):
 
     def get_queryset(self):
         # Ensures user can only retrieve their own bookings
-        return Booking.objects.filter(user=self.request.user)
\ No newline at end of file
+        return bookings_with(BOOKING_DETAIL_RELATED).filter(user=self.request.user)
+
+class ReviewCreateView(generics.CreateAPIView):
+    serializer_class = ReviewSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+class ReviewDetailView(RetrieveUpdateDestroyAPIView):
+    serializer_class = ReviewSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        # Users can only change their own reviews
+        return Review.objects.filter(user=self.request.user).select_related('user')
+
+class PlaceReviewListView(generics.ListAPIView):
+    serializer_class = ReviewSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = PlaceResultsPagination
+
+    def get_queryset(self):
+        return Review.objects.filter(place_id=self.kwargs['pk']).select_related('user').order_by('-created_at', '-id')